@@ -0,0 +1,140 @@
+"""
+Benchmark: translate.clean_duplicate_parentheses on realistic and pathological
+translations, against the previous regex implementation.
+
+Inputs are long Arabic, Hindi, Malayalam and Cyrillic texts built to hit the old
+worst cases: a long paren-free run before a non-matching parenthesis (the
+backreference pattern retried every start position), many unclosed "(" and deep
+nesting. For every input the script asserts that the output equals the legacy
+output (where the legacy version is still fast enough to run), that the runtime
+stays under --budget-ms, and that growing the input 8x grows the runtime by at
+most --max-growth (i.e. roughly linear).
+
+Usage: python benchmarks/bench_clean_parentheses.py [--size 20000] [--budget-ms 50] [--max-growth 16]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline.translate import clean_duplicate_parentheses
+
+LEGACY_MAX_SIZE = 4000  # the legacy version is quadratic; only compare outputs below this size
+
+WORDS = {
+    "arabic": ["رئيس", "الوزراء", "محمد", "بن", "سلمان", "الرياض", "المملكة", "الاقتصاد", "النفط", "أوبك"],
+    "hindi": ["प्रधानमंत्री", "नरेंद्र", "मोदी", "भारत", "सरकार", "नई", "दिल्ली", "चुनाव", "संसद", "भाजपा"],
+    "malayalam": ["പ്രധാനമന്ത്രി", "കേരളം", "സർക്കാർ", "തിരുവനന്തപുരം", "മുഖ്യമന്ത്രി", "നിയമസഭ", "വാർത്ത"],
+    "cyrillic": ["Президент", "Владимир", "Путин", "Москва", "Госдума", "правительство", "Кремль", "ЦБ"],
+}
+
+
+def legacy_clean(text):
+    """The regex implementation this module replaced (logging removed)"""
+    if not text:
+        return text
+    text = re.sub(r'\((\w+)\(\1\)\)', r'(\1)', text)
+    text = re.sub(r'([^\s()]+(?:\s+[^\s()]+)*)\s*\(\1\)', r'\1', text)
+    seen_terms = set()
+
+    def track_duplicates(match):
+        term = match.group(1).strip().lower()
+        if term in seen_terms:
+            return ''
+        seen_terms.add(term)
+        return match.group(0)
+
+    return re.sub(r'\(([^\)]+)\)', track_duplicates, text)
+
+
+def sentence(rng, words, length):
+    return " ".join(rng.choice(words) for _ in range(length))
+
+
+def realistic(rng, words, size):
+    """Translated prose with names glossed in parentheses, some of them duplicated"""
+    parts = []
+    while sum(map(len, parts)) < size:
+        name = sentence(rng, words, rng.randint(1, 3))
+        parts.append(sentence(rng, words, rng.randint(5, 15)))
+        parts.append(rng.choice([f"{name}({name})", f"{name} ({name})", f"({name}({name}))", f"({name})",
+                                 f"{name} (Latin Name)"]))
+    return " ".join(parts)[:size]
+
+
+def long_run_mismatch(rng, words, size):
+    """One long paren-free run followed by a parenthesis that never matches it"""
+    return sentence(rng, words, size // 6)[:size] + " (" + rng.choice(words) + ")"
+
+
+def unclosed(rng, words, size):
+    """Many "(" and no ")" at all"""
+    return "".join(f"({rng.choice(words)} " for _ in range(size // 8))[:size]
+
+
+def deep_nesting(rng, words, size):
+    """(w(w(w(...))) and repeated nested duplicates"""
+    word = rng.choice(words).split()[0]
+    depth = size // (len(word) + 2) // 2
+    return "(" * depth + f"{word}(" * depth + ")" * depth * 2 + f" ({word}({word}))" * 10
+
+
+SHAPES = {
+    "realistic": realistic,
+    "long_run_mismatch": long_run_mismatch,
+    "unclosed": unclosed,
+    "deep_nesting": deep_nesting,
+}
+
+
+def timed(fn, text, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=20000, help="characters per input")
+    parser.add_argument("--budget-ms", type=float, default=50.0, help="max runtime per input at --size")
+    parser.add_argument("--max-growth", type=float, default=16.0, help="max runtime ratio for an 8x larger input")
+    args = parser.parse_args()
+
+    rng = random.Random(20)
+    failures = []
+    print(f"{'script':<10} {'shape':<18} {'chars':>7} {'new ms':>8} {'8x ms':>8} {'growth':>7} {'legacy ms':>10}")
+    for script, words in WORDS.items():
+        for shape, build in SHAPES.items():
+            text = build(rng, words, args.size)
+            large = build(rng, words, args.size * 8)
+            _, seconds = timed(clean_duplicate_parentheses, text)
+            _, large_seconds = timed(clean_duplicate_parentheses, large)
+            growth = large_seconds / max(seconds, 1e-6)
+
+            small = build(rng, words, min(args.size, LEGACY_MAX_SIZE))
+            expected, legacy_seconds = timed(legacy_clean, small, repeat=1)
+            if clean_duplicate_parentheses(small) != expected:
+                failures.append(f"{script}/{shape}: output differs from the legacy implementation")
+            if seconds * 1000 > args.budget_ms:
+                failures.append(f"{script}/{shape}: {seconds * 1000:.1f} ms over the {args.budget_ms} ms budget")
+            if growth > args.max_growth:
+                failures.append(f"{script}/{shape}: 8x input took {growth:.1f}x longer")
+
+            print(f"{script:<10} {shape:<18} {len(text):>7} {seconds * 1000:>8.2f} {large_seconds * 1000:>8.2f} "
+                  f"{growth:>6.1f}x {legacy_seconds * 1000:>9.1f} ({len(small)} chars)")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Micro-benchmark: per-call overhead of a fresh genai.Client() per request (the old
+pattern, including the os.environ mutation) versus the shared pooled client.
+
+Runs against a local keep-alive HTTP stub so only client construction and connection
+setup are measured. Against the real endpoint the pooled client additionally skips a
+TLS handshake per call, so the gap there is larger.
+
+Usage: python benchmarks/bench_gemini_client.py [calls]
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google import genai
+
+from pipeline.gemini import build_http_options, get_client, reset_clients
+
+RESPONSE = json.dumps({
+    "candidates": [{"content": {"role": "model", "parts": [{"text": "ok"}]}}],
+    "usageMetadata": {"promptTokenCount": 1, "candidatesTokenCount": 1, "totalTokenCount": 2}
+}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    connections = set()
+
+    def do_POST(self):
+        self.connections.add(self.client_address)
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(RESPONSE)))
+        self.end_headers()
+        self.wfile.write(RESPONSE)
+
+    def log_message(self, *args):
+        pass
+
+
+def per_call_client(api_key, config):
+    """The pre-pooling pattern: mutate the environment and build a client per call"""
+    if "GOOGLE_API_KEY" in os.environ and os.environ["GOOGLE_API_KEY"] != api_key:
+        del os.environ["GOOGLE_API_KEY"]
+    os.environ["GOOGLE_API_KEY"] = api_key
+    return genai.Client(http_options=build_http_options(config))
+
+
+def run(label, make_client, calls, config):
+    StubHandler.connections = set()
+    start = time.perf_counter()
+    for _ in range(calls):
+        client = make_client("bench-key", config)
+        client.models.generate_content(model="gemini-2.5-flash-lite", contents="ping")
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {elapsed / calls * 1000:8.3f} ms/call   connections opened: {len(StubHandler.connections)}")
+    return elapsed / calls
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    config = {"gemini_base_url": f"http://127.0.0.1:{server.server_address[1]}/"}
+
+    print(f"{calls} sequential generate_content calls against a local stub")
+    before = run("per-call genai.Client", per_call_client, calls, config)
+    reset_clients()
+    after = run("pooled get_client", get_client, calls, config)
+    print(f"overhead saved: {(before - after) * 1000:.3f} ms/call ({before / after:.1f}x)")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
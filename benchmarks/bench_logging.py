@@ -0,0 +1,111 @@
+"""
+Benchmark: pipeline run time and log volume per logging mode.
+
+Runs the hot paths that used to print on every call (top selection over a large
+pool, clean_duplicate_parentheses on every translation, process_article for a
+batch of articles) with Gemini replaced by an instant fake, in a child process
+whose stdout is piped back like a CI runner captures it. Modes:
+  debug-all  LOG_LEVEL=DEBUG, no sampling (roughly the old print volume)
+  debug      LOG_LEVEL=DEBUG with the default 1-in-N sampling
+  info       default production level
+  quiet      LOG_QUIET=1 (warnings and run summaries only)
+
+Usage: python benchmarks/bench_logging.py [--articles 200] [--pool 2000] [--repeat 3]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = {
+    "debug-all": {"LOG_LEVEL": "DEBUG", "LOG_DEBUG_SAMPLE_EVERY": "1"},
+    "debug": {"LOG_LEVEL": "DEBUG"},
+    "info": {},
+    "quiet": {"LOG_QUIET": "1"},
+}
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def fake_generate_content(config, contents, stage, **kwargs):
+    if stage == "select":
+        ids = [line.split(": ", 1)[1] for line in contents.splitlines() if line.startswith("Article ID: ")]
+        return FakeResponse("\n".join(ids[::10]))
+    if stage == "translate":
+        return FakeResponse("Title: 올라프 숄츠(Olaf Scholz) 총리(총리)\n"
+                            "Content: 사회민주당(SPD(SPD)) 대표 올라프 숄츠(Olaf Scholz)는 (SPD) 회의에서 " * 3)
+    return FakeResponse("Category: Politics\nContent: " + "The chancellor met party leaders. " * 8)
+
+
+def workload(articles, pool):
+    from pipeline import summarize, translate, util
+    from pipeline.news_pipeline import process_article
+
+    util.generate_content = summarize.generate_content = translate.generate_content = fake_generate_content
+    config = {
+        "country": "Bench",
+        "api_key": "bench",
+        "base_lang": "en",
+        "lang_list": ["ko", "de", "ar", "ru"],
+        "top_prompt": lambda top_n: f"Select exactly {top_n} articles.",
+        "summarization_prompt": "Summarize:\n{content}",
+        "translation_prompt": lambda lang: f"Translate to {lang}.",
+        "batch_size": 1,
+    }
+    candidates = [{"article_id": f"id{i:06d}", "title": f"Minister announces budget item {i}"} for i in range(pool)]
+
+    start = time.perf_counter()
+    util.select_top_articles(candidates, pool // 10, config)
+    for i in range(articles):
+        process_article({"article_id": f"a{i}", "title": f"Headline {i}",
+                         "content": "<p>Chancellor Olaf Scholz met SPD leaders on Monday.</p>" * 40}, config, "bench")
+    return time.perf_counter() - start
+
+
+def run_child(mode, args):
+    env = {**os.environ, **MODES[mode], "LLM_CACHE_DISABLED": "1"}
+    for key in ("LOG_LEVEL", "LOG_QUIET", "LOG_DEBUG_SAMPLE_EVERY"):
+        if key not in MODES[mode]:
+            env.pop(key, None)
+    command = [sys.executable, os.path.abspath(__file__), "--child", "--articles", str(args.articles),
+               "--pool", str(args.pool)]
+    started = time.perf_counter()
+    process = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output = process.stdout.read()
+    process.wait()
+    wall = time.perf_counter() - started
+    lines = output.decode("utf-8", "replace").splitlines()
+    seconds = float(next(line for line in reversed(lines) if line.startswith("WORKLOAD ")).split()[1])
+    return seconds, wall, len(output), len(lines) - 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--articles", type=int, default=200)
+    parser.add_argument("--pool", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", action="store_true")
+    args = parser.parse_args()
+
+    if args.child:
+        seconds = workload(args.articles, args.pool)
+        sys.stdout.write(f"WORKLOAD {seconds:.4f}\n")
+        return
+
+    print(f"articles={args.articles} pool={args.pool} repeat={args.repeat} (best of)")
+    for mode in MODES:
+        best = min((run_child(mode, args) for _ in range(args.repeat)), key=lambda result: result[0])
+        seconds, wall, size, lines = best
+        print(f"  {mode:<10} workload={seconds * 1000:8.1f} ms  process={wall * 1000:8.1f} ms  "
+              f"lines={lines:<7} bytes={size}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+End-to-end throughput benchmark: runs the unchanged entry points
+(news_pipeline.main, push_notification_pipeline.main, daily_popular_pipeline.main)
+against local stand-ins from fakes.py, without Gemini, Firestore or the news API.
+
+Each engine configuration runs in a fresh interpreter (clean limiters, caches and
+peak memory). Gemini is an in-process fake with log-normal latency (--llm-median-ms,
+--llm-p95-ms) and injected 500 / 429 errors; Firestore is an in-memory store with
+a fixed per-RPC latency; the news feed and push functions are a local HTTP server.
+The LLM cache is disabled so every run does the full work.
+
+Reported per configuration: wall time, articles (uploaded for the news pipeline,
+articles read for push / daily popular), articles per minute, Gemini requests
+(retries and hedges included) and logical calls per article, Firestore RPCs and
+peak RSS.
+
+Usage: python benchmarks/bench_pipeline.py [--configs news-thread,news-async,...] [--articles 500]
+       [--llm-median-ms 400] [--llm-p95-ms 1500] [--llm-error-rate 0.01] [--llm-429-rate 0.02]
+"""
+import argparse
+import importlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fakes
+
+# name: (pipeline, extra argv, config overrides)
+CONFIGURATIONS = {
+    "news-thread": ("news", [], {}),
+    "news-thread-unstreamed": ("news", [], {"stream_writes": False}),
+    "news-thread-fused": ("news", [], {"fused_generation": True}),
+    "news-thread-batch": ("news", [], {"batch_size": 8}),
+    "news-async": ("news", ["--engine", "async"], {}),
+    "news-async-unstreamed": ("news", ["--engine", "async"], {"stream_writes": False}),
+    "news-async-fused": ("news", ["--engine", "async"], {"fused_generation": True}),
+    "push": ("push", [], {}),
+    "daily": ("daily", [], {}),
+}
+ENTRY_POINTS = {
+    "news": "pipeline.news_pipeline",
+    "push": "pipeline.push_notification_pipeline",
+    "daily": "pipeline.daily_popular_pipeline",
+}
+
+
+def run_child(args):
+    """Run one configuration in this process and print a RESULT line"""
+    pipeline, extra_argv, overrides = CONFIGURATIONS[args.child]
+    gemini = fakes.FakeGemini(args.llm_median_ms, args.llm_p95_ms, args.llm_error_rate, args.llm_429_rate)
+    store = fakes.MemoryFirestore(args.firestore_latency_ms, args.firestore_error_rate)
+    fakes.install(gemini, store)
+
+    config = importlib.import_module(f"configs.{args.country}").config
+    config.update(overrides)
+    if pipeline != "news":
+        store.seed_articles(config["firestore_collection"], args.articles, config["timezone"])
+
+    entry = importlib.import_module(ENTRY_POINTS[pipeline])
+    sys.argv = [entry.__file__, args.country] + extra_argv
+    start = time.perf_counter()
+    entry.main()
+    seconds = time.perf_counter() - start
+
+    from pipeline.usage import build_run_report
+    calls = build_run_report()["totals"]["calls"]
+    if pipeline == "news":
+        articles = store.count(config["firestore_collection"])
+    elif pipeline == "daily":
+        daily = store.docs.items()
+        articles = sum(len(data.get("articles", [])) for path, data in daily if path[0].endswith("_daily_popular"))
+    else:
+        articles = 1
+    print("RESULT " + json.dumps({
+        "seconds": seconds,
+        "articles": articles,
+        "llm_requests": gemini.requests,
+        "llm_errors": gemini.errors,
+        "llm_calls": calls,
+        "firestore_rpcs": store.rpcs,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }), flush=True)
+
+
+def run_configuration(name, args, server, report_dir):
+    env = {
+        **os.environ,
+        "GEMINI_API_KEY": "bench",
+        "FIREBASE_CREDENTIAL_PATH": os.devnull,
+        "NEWS_API_URL": f"{server.url}/api/1/latest?apikey=bench&language=en",
+        "FIREBASE_FUNCTION_URL": f"{server.url}/push",
+        "LLM_CACHE_DISABLED": "1",
+        "RUN_REPORT_PATH": os.path.join(report_dir, f"{name}.json"),
+    }
+    if not args.verbose:
+        env["LOG_QUIET"] = "1"
+    command = [sys.executable, os.path.abspath(__file__), "--child", name] + [
+        f"--{key.replace('_', '-')}={value}" for key, value in vars(args).items()
+        if key not in ("child", "configs", "verbose", "page_size", "feed_latency_ms")
+    ]
+    process = subprocess.run(command, env=env, capture_output=True, text=True)
+    if args.verbose:
+        print(process.stdout)
+    lines = [line for line in process.stdout.splitlines() if line.startswith("RESULT ")]
+    if process.returncode or not lines:
+        print(f"  {name}: failed (exit {process.returncode})\n{process.stdout[-2000:]}{process.stderr[-2000:]}")
+        return None
+    return json.loads(lines[-1][len("RESULT "):])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--configs", default=",".join(CONFIGURATIONS))
+    parser.add_argument("--country", default="canada")
+    parser.add_argument("--articles", type=int, default=500, help="feed size (or seeded articles for push/daily)")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--feed-latency-ms", type=float, default=150.0)
+    parser.add_argument("--llm-median-ms", type=float, default=400.0)
+    parser.add_argument("--llm-p95-ms", type=float, default=1500.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.01)
+    parser.add_argument("--llm-429-rate", type=float, default=0.02)
+    parser.add_argument("--firestore-latency-ms", type=float, default=10.0)
+    parser.add_argument("--firestore-error-rate", type=float, default=0.0)
+    parser.add_argument("--verbose", action="store_true", help="show pipeline logs")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    server = fakes.NewsServer(fakes.make_articles(args.articles), args.page_size, args.feed_latency_ms)
+    print(f"country={args.country} feed={args.articles} articles, llm median/p95={args.llm_median_ms:.0f}/"
+          f"{args.llm_p95_ms:.0f} ms, llm errors={args.llm_error_rate:.0%} 429s={args.llm_429_rate:.0%}, "
+          f"firestore rpc={args.firestore_latency_ms:.0f} ms")
+    print(f"  {'configuration':<22} {'wall s':>7} {'articles':>8} {'art/min':>8} {'requests':>8} "
+          f"{'calls/art':>9} {'fs rpcs':>7} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory() as report_dir:
+        for name in args.configs.split(","):
+            result = run_configuration(name, args, server, report_dir)
+            if result is None:
+                continue
+            articles = max(result["articles"], 1)
+            print(f"  {name:<22} {result['seconds']:>7.1f} {result['articles']:>8} "
+                  f"{result['articles'] / result['seconds'] * 60:>8.0f} {result['llm_requests']:>8} "
+                  f"{result['llm_calls'] / articles:>9.2f} {result['firestore_rpcs']:>7} "
+                  f"{result['peak_rss_mb']:>8.0f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
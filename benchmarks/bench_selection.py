@@ -0,0 +1,129 @@
+"""
+Benchmark: single-prompt top selection versus the map-reduce tournament
+(util.select_top_articles_tournament) across article pool sizes.
+
+Gemini is replaced by a simulated model whose latency grows with the prompt
+(time to first token + prefill per input token + decode per output token) and
+which always picks the highest scoring IDs it is shown, so recall against the
+global top-K measures how much the tournament loses by only seeing shards.
+Sleeps are scaled down by --time-scale; reported latencies are scaled back up.
+
+An idle run (nothing new in the pool) is checked first: util.select_articles
+must return no articles without any selection call.
+
+Usage: python benchmarks/bench_selection.py [--sizes 200,1000,5000,20000] [--time-scale 0.02]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import util
+from pipeline.batching import estimate_tokens
+
+TTFT = 0.35  # seconds before the first output token
+PREFILL_TOKENS_PER_SECOND = 20000
+DECODE_SECONDS_PER_TOKEN = 0.004
+CONTEXT_LIMIT = 1_048_576  # input tokens accepted by the model
+
+
+class SimulatedSelector:
+    def __init__(self, scores, time_scale):
+        self.scores = scores
+        self.time_scale = time_scale
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.max_prompt_tokens = 0
+
+    def generate_content(self, config, contents, stage, **kwargs):
+        top_n = int(re.search(r"Select exactly (\d+)", contents).group(1))
+        ids = re.findall(r"Article ID: (\S+)", contents)
+        text = "\n".join(sorted(ids, key=lambda article_id: self.scores[article_id], reverse=True)[:top_n])
+
+        prompt_tokens, answer_tokens = estimate_tokens(contents), estimate_tokens(text)
+        with self.lock:
+            self.calls += 1
+            self.input_tokens += prompt_tokens
+            self.output_tokens += answer_tokens
+            self.max_prompt_tokens = max(self.max_prompt_tokens, prompt_tokens)
+        latency = TTFT + prompt_tokens / PREFILL_TOKENS_PER_SECOND + answer_tokens * DECODE_SECONDS_PER_TOKEN
+        time.sleep(latency * self.time_scale)
+        return type("Response", (), {"text": text})()
+
+
+def make_pool(size, rng):
+    articles = [{
+        "article_id": "%032x" % rng.getrandbits(128),
+        "title": " ".join(rng.choice(["Minister", "announces", "new", "budget", "storm", "hits", "coast", "talks",
+                                      "election", "market", "rally", "after", "court", "ruling"])
+                          for _ in range(rng.randint(8, 14)))
+    } for _ in range(size)]
+    scores = {article["article_id"]: rng.random() for article in articles}
+    return articles, scores
+
+
+def run(mode, articles, scores, top_n, config, time_scale):
+    selector = SimulatedSelector(scores, time_scale)
+    util.generate_content = selector.generate_content
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == "single":
+            selected = util.select_top_articles(articles, top_n, config)
+        else:
+            selected = util.select_top_articles_tournament(articles, top_n, config)
+    elapsed = (time.perf_counter() - start) / time_scale
+
+    best = set(sorted(scores, key=scores.get, reverse=True)[:top_n])
+    recall = len(best & set(selected)) / top_n
+    over_limit = " (over context limit)" if selector.max_prompt_tokens > CONTEXT_LIMIT else ""
+    print(f"  {mode:<10} {elapsed:8.2f}s  calls={selector.calls:<4} in_tokens={selector.input_tokens:<8} "
+          f"out_tokens={selector.output_tokens:<6} max_prompt={selector.max_prompt_tokens}{over_limit} "
+          f"recall={recall:.2f}")
+
+
+def check_idle_run(config):
+    """An empty pool (every article already known) must not reach Gemini"""
+    selector = SimulatedSelector({}, 0)
+    util.generate_content = selector.generate_content
+    idle_config = {**config, "select_all": False, "top_article_ratio": 0.12, "skip_known_articles": False}
+    selected = util.select_articles([], "bench", idle_config)
+    assert selected == [] and selector.calls == 0, f"idle run made {selector.calls} selection calls"
+    print("idle run: no articles, no selection calls")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="200,1000,5000,20000")
+    parser.add_argument("--time-scale", type=float, default=0.02)
+    parser.add_argument("--ratio", type=float, default=0.12)
+    parser.add_argument("--chunk-size", type=int, default=util.SELECTION_CHUNK_SIZE)
+    parser.add_argument("--fan-out", type=int, default=util.SELECTION_FAN_OUT)
+    args = parser.parse_args()
+
+    config = {
+        "api_key": "bench",
+        "top_prompt": lambda top_n: f"Select exactly {top_n} articles.",
+        "selection_chunk_size": args.chunk_size,
+        "selection_fan_out": args.fan_out
+    }
+    check_idle_run(config)
+    rng = random.Random(7)
+    for size in (int(size) for size in args.sizes.split(",")):
+        articles, scores = make_pool(size, rng)
+        top_n = max(1, round(size * args.ratio))
+        print(f"pool={size} top_n={top_n} chunk_size={args.chunk_size} fan_out={args.fan_out}")
+        run("single", articles, scores, top_n, config, args.time_scale)
+        run("tournament", articles, scores, top_n, config, args.time_scale)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Cold-start benchmark for the three pipeline entry points.
+
+Each entry point is started in a fresh interpreter with no arguments, so it imports
+its modules and exits at the usage message before touching the network. Wall time
+is the median over several runs; the import profile comes from `python -X importtime`
+and lists the heaviest top-level imports. Heavy libraries (firebase_admin,
+google.genai, requests, pytz, numpy) are imported on first use, so they should not show up.
+
+Exits non-zero when an entry point's median import time exceeds its budget or a
+heavy module is imported at startup (at any depth).
+
+Usage: python benchmarks/bench_startup.py [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Median import time budget per entry point, milliseconds (measured ~35-70 ms)
+BUDGET_MS = {
+    "pipeline/news_pipeline.py": 150,
+    "pipeline/push_notification_pipeline.py": 120,
+    "pipeline/daily_popular_pipeline.py": 120,
+}
+HEAVY_MODULES = ("firebase_admin", "google.genai", "google.cloud.firestore", "requests", "httpx", "pytz",
+                 "numpy")
+
+
+def run_once(*args):
+    """Return (wall seconds, {top-level module: cumulative us}, every imported module) for one cold start"""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=ROOT,
+                          capture_output=True, text=True)
+    wall = time.perf_counter() - start
+
+    imports = {}
+    modules = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name[1:]  # nesting is shown as two spaces per level
+        modules.add(name.strip())
+        if not name.startswith(" "):  # level 0: imported directly by the entry point
+            imports[name] = int(cumulative)
+    return wall, imports, modules
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    # Modules a bare interpreter imports anyway (site, encodings, ...) are not counted
+    _, interpreter_imports, _ = run_once("-c", "pass")
+    failed = []
+    print(f"{'entry point':42} {'wall ms':>8} {'import ms':>10} {'budget':>7}")
+    for script, budget in BUDGET_MS.items():
+        samples = []
+        for _ in range(runs):
+            wall, imports, modules = run_once(script)
+            samples.append((wall, {name: us for name, us in imports.items() if name not in interpreter_imports}))
+        wall_ms = statistics.median(wall for wall, _ in samples) * 1000
+        import_ms = statistics.median(sum(imports.values()) for _, imports in samples) / 1000
+        status = "ok" if import_ms <= budget else "OVER"
+        print(f"{script:42} {wall_ms:8.1f} {import_ms:10.1f} {budget:7} {status}")
+
+        imports = samples[-1][1]
+        heaviest = sorted(imports.items(), key=lambda item: item[1], reverse=True)[:5]
+        print("    heaviest: " + ", ".join(f"{name} {us / 1000:.1f}ms" for name, us in heaviest))
+        # Heavy modules count at any depth (numpy pulled in by pipeline.util -> prerank, ...)
+        eager = [name for name in HEAVY_MODULES if name in modules]
+        if eager:
+            print(f"    eagerly imported heavy modules: {', '.join(eager)}")
+        if import_ms > budget or eager:
+            failed.append(script)
+
+    if failed:
+        print(f"\nOver budget or eager heavy imports: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,472 @@
+"""
+Local stand-ins for the pipelines' external services, used by bench_pipeline.py.
+
+- FakeGemini: in-process replacement for google.genai.Client with a log-normal
+  latency distribution and configurable error / 429 rates. Responses follow the
+  shape each prompt asks for (selection IDs, "Category:/Content:", "Title:/Content:",
+  briefing lines) and JSON schemas are filled in generically.
+- MemoryFirestore: in-memory store covering the client surface the pipelines use
+  (documents, subcollections, set/create/get, merge and Increment, get_all,
+  where/order_by/limit queries and a BulkWriter with error callbacks).
+- NewsServer: local paginated news API (newsdata.io response shape) that also
+  answers the push notification functions.
+
+install() patches google.genai and firebase_admin so the unchanged entry points
+talk to these stand-ins.
+"""
+import asyncio
+import copy
+import gzip
+import json
+import math
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+WORDS = ("minister announces budget storm hits coast talks election market rally court ruling police "
+         "hospital strike festival airport energy housing wildfire trade tariff school union council "
+         "province city bank rates inflation jobs report football hockey museum bridge port").split()
+
+
+# --- Gemini -----------------------------------------------------------------
+
+class FakeAPIError(Exception):
+    """Shaped like google.genai.errors.APIError: the retry and limiter code look at .code"""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeGemini:
+    """Counts every request (retries and hedges included) and fakes its latency and errors"""
+
+    def __init__(self, median_ms=400.0, p95_ms=1500.0, error_rate=0.0, throttle_rate=0.0, seed=1):
+        self.median = median_ms / 1000
+        self.sigma = math.log(max(p95_ms, median_ms) / median_ms) / 1.645 if median_ms > 0 else 0.0
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def _plan(self, contents, config):
+        with self.lock:
+            self.requests += 1
+            latency = self.median * math.exp(self.sigma * self.rng.gauss(0, 1)) if self.median else 0.0
+            roll = self.rng.random()
+            if roll < self.throttle_rate:
+                self.errors += 1
+                return latency / 4, FakeAPIError(429, "RESOURCE_EXHAUSTED")
+            if roll < self.throttle_rate + self.error_rate:
+                self.errors += 1
+                return latency, FakeAPIError(500, "INTERNAL")
+            return latency, None
+
+    def respond(self, contents, config):
+        schema = getattr(config, "response_json_schema", None)
+        text = json.dumps(fill_schema(schema, contents), ensure_ascii=False) if schema else answer(contents)
+        usage = SimpleNamespace(prompt_token_count=len(contents) // 4, candidates_token_count=len(text) // 4,
+                                thoughts_token_count=None, cached_content_token_count=None)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    def client_class(self):
+        fake = self
+
+        class Models:
+            def generate_content(self, model, contents, config=None):
+                latency, error = fake._plan(contents, config)
+                time.sleep(latency)
+                if error:
+                    raise error
+                return fake.respond(contents, config)
+
+        class AsyncModels:
+            async def generate_content(self, model, contents, config=None):
+                latency, error = fake._plan(contents, config)
+                await asyncio.sleep(latency)
+                if error:
+                    raise error
+                return fake.respond(contents, config)
+
+        class Client:
+            def __init__(self, *args, **kwargs):
+                self.models = Models()
+                self.aio = SimpleNamespace(models=AsyncModels())
+
+        return Client
+
+
+def answer(prompt):
+    """Plain-text answer in the format the prompt asks for"""
+    if "Return ONLY the article IDs" in prompt:
+        ids = [line.split(": ", 1)[1] for line in prompt.splitlines() if line.startswith("Article ID: ")]
+        return "\n".join(ids[::4])
+    if "Category: <one of above>" in prompt:
+        return "Category: politics\nContent: " + "The minister announced a new budget for the province. " * 3
+    if "Title: <translated title>" in prompt:
+        return "Title: 총리(Prime Minister) 예산 발표\nContent: " + "총리(Prime Minister)는 새 예산을 발표했다. " * 3
+    if "shortened phrases" in prompt:
+        return "Budget announced\nStorm hits coast\nCourt rules on tariffs"
+    if "these languages:" in prompt:
+        languages = prompt.split("these languages:", 1)[1].splitlines()[0]
+        return json.dumps({lang.strip(): "1. 예산, 2. 폭풍, 3. 법원" for lang in languages.split(",")})
+    return "OK"
+
+
+def fill_schema(schema, prompt, item_id=None):
+    """Instance of a JSON schema; arrays get one element per "=== ... ID: x ===" block"""
+    kind = schema.get("type")
+    if kind == "array":
+        ids = [line.split("ID:", 1)[1].strip(" =") for line in prompt.splitlines()
+               if line.startswith("===") and "ID:" in line]
+        return [fill_schema(schema["items"], prompt, item) for item in ids]
+    if kind == "object":
+        return {key: (item_id if key == "id" else fill_schema(value, prompt, item_id))
+                for key, value in schema.get("properties", {}).items()}
+    if kind == "boolean":
+        return False
+    if "enum" in schema:
+        return schema["enum"][0]
+    return "총리(Prime Minister)는 새 예산(budget)을 발표했다. The minister announced a new budget."
+
+
+# --- Firestore --------------------------------------------------------------
+
+def _increment_type():
+    from google.cloud.firestore_v1.transforms import Increment
+    return Increment
+
+
+def _apply(target, data, merge):
+    increment = _increment_type()
+    for key, value in data.items():
+        if isinstance(value, increment):
+            current = target.get(key)
+            target[key] = (current if isinstance(current, (int, float)) else 0) + value.value
+        elif isinstance(value, dict) and merge and isinstance(target.get(key), dict):
+            _apply(target[key], value, merge)
+        elif isinstance(value, dict):
+            target[key] = {}
+            _apply(target[key], value, merge)
+        else:
+            target[key] = copy.deepcopy(value)
+
+
+class MemorySnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+
+class MemoryDocument:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+        self.id = path[-1]
+
+    def collection(self, name):
+        return MemoryCollection(self.db, self.path + (name,))
+
+    def get(self, field_paths=None):
+        self.db.rpc()
+        with self.db.lock:
+            return MemorySnapshot(self, copy.deepcopy(self.db.docs.get(self.path)))
+
+    def set(self, data, merge=False):
+        self.db.rpc()
+        self.db.write(self.path, data, merge)
+
+    def create(self, data):
+        self.db.rpc()
+        self.db.write(self.path, data, merge=False, create=True)
+
+
+class MemoryQuery:
+    OPERATORS = {
+        "==": lambda a, b: a == b, ">=": lambda a, b: a >= b, "<=": lambda a, b: a <= b,
+        ">": lambda a, b: a > b, "<": lambda a, b: a < b,
+    }
+
+    def __init__(self, db, path, filters=(), order=None, count=None, fields=None):
+        self.db = db
+        self.path = path
+        self.filters = tuple(filters)
+        self.order = order
+        self.count = count
+        self.fields = fields
+
+    def _copy(self, **changes):
+        query = MemoryQuery(self.db, self.path, self.filters, self.order, self.count, self.fields)
+        query.__dict__.update(changes)
+        return query
+
+    def where(self, field, op, value):
+        return self._copy(filters=self.filters + ((field, op, value),))
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._copy(order=(field, direction))
+
+    def limit(self, count):
+        return self._copy(count=count)
+
+    def select(self, field_paths):
+        return self._copy(fields=list(field_paths))
+
+    def stream(self):
+        self.db.rpc()
+        with self.db.lock:
+            rows = [(path, copy.deepcopy(data)) for path, data in self.db.docs.items()
+                    if path[:-1] == self.path]
+        for field, op, value in self.filters:
+            rows = [(path, data) for path, data in rows if field in data and self.OPERATORS[op](data[field], value)]
+        if self.order:
+            field, direction = self.order
+            rows = [(path, data) for path, data in rows if field in data]
+            rows.sort(key=lambda row: row[1][field], reverse=direction == "DESCENDING")
+        if self.count is not None:
+            rows = rows[:self.count]
+        for path, data in rows:
+            if self.fields is not None:
+                data = {field: data[field] for field in self.fields if field in data}
+            yield MemorySnapshot(MemoryDocument(self.db, path), data)
+
+
+class MemoryCollection(MemoryQuery):
+    def __init__(self, db, path):
+        super().__init__(db, path)
+        self.id = path[-1]
+
+    def document(self, doc_id):
+        return MemoryDocument(self.db, self.path + (doc_id,))
+
+
+class MemoryBulkWriter:
+    """Batches writes like BulkWriter and reports each one through the callbacks"""
+
+    def __init__(self, db):
+        self.db = db
+        self.batch_size = 20
+        self.pending = []
+        self.result_callback = lambda reference, result, writer: None
+        self.error_callback = lambda failure, writer: False
+
+    def on_write_result(self, callback):
+        self.result_callback = callback
+
+    def on_write_error(self, callback):
+        self.error_callback = callback
+
+    def create(self, reference, data):
+        self._enqueue(SimpleNamespace(reference=reference, data=data, create=True, merge=False, attempts=0))
+
+    def set(self, reference, data, merge=False):
+        self._enqueue(SimpleNamespace(reference=reference, data=data, create=False, merge=merge, attempts=0))
+
+    def _enqueue(self, operation):
+        self.pending.append(operation)
+        if len(self.pending) >= self.batch_size:
+            self._send()
+
+    def _send(self):
+        from google.api_core.exceptions import AlreadyExists
+
+        while self.pending:
+            batch, self.pending = self.pending[:self.batch_size], self.pending[self.batch_size:]
+            self.db.rpc()
+            for operation in batch:
+                try:
+                    self.db.maybe_fail()
+                    self.db.write(operation.reference.path, operation.data, operation.merge, operation.create)
+                except (AlreadyExists, FakeWriteError) as e:
+                    code = e.code if isinstance(e, FakeWriteError) else 6
+                    failure = SimpleNamespace(operation=operation, code=code, message=str(e),
+                                              attempts=operation.attempts)
+                    if self.error_callback(failure, self):
+                        operation.attempts += 1
+                        self.pending.append(operation)
+                    continue
+                self.result_callback(operation.reference, SimpleNamespace(update_time=datetime.now()), self)
+
+    def flush(self):
+        self._send()
+
+    def close(self):
+        self._send()
+
+
+class FakeWriteError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class MemoryFirestore:
+    """Thread-safe in-memory document store with a fixed per-RPC latency"""
+
+    def __init__(self, latency_ms=10.0, error_rate=0.0, seed=2):
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.docs = {}
+        self.lock = threading.Lock()
+        self.rpcs = 0
+
+    def rpc(self):
+        with self.lock:
+            self.rpcs += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def maybe_fail(self):
+        with self.lock:
+            failed = self.rng.random() < self.error_rate
+        if failed:
+            raise FakeWriteError(14, "UNAVAILABLE")
+
+    def write(self, path, data, merge=False, create=False):
+        with self.lock:
+            if create and path in self.docs:
+                from google.api_core.exceptions import AlreadyExists
+                raise AlreadyExists(f"Document already exists: {'/'.join(path)}")
+            target = self.docs.setdefault(path, {}) if merge else {}
+            _apply(target, data, merge)
+            self.docs[path] = target
+
+    def collection(self, name):
+        return MemoryCollection(self, (name,))
+
+    def get_all(self, references, field_paths=None):
+        self.rpc()
+        with self.lock:
+            return [MemorySnapshot(reference, copy.deepcopy(self.docs.get(reference.path)))
+                    for reference in references]
+
+    def bulk_writer(self, options=None):
+        return MemoryBulkWriter(self)
+
+    def count(self, collection):
+        with self.lock:
+            return sum(1 for path in self.docs if path[:-1] == (collection,))
+
+    def seed_articles(self, collection, count, timezone, days=7, seed=3):
+        """Published articles spread over the past `days` days with random click counts"""
+        import pytz
+        rng = random.Random(seed)
+        now = datetime.now(pytz.timezone(timezone)).replace(tzinfo=None)
+        with self.lock:
+            for index in range(count):
+                article_id = f"seed{index:06d}"
+                self.docs[(collection, article_id)] = {
+                    "article_id": article_id,
+                    "title": headline(rng),
+                    "pubDate": (now - timedelta(minutes=rng.randrange(days * 24 * 60))).strftime("%Y-%m-%d %H:%M:%S"),
+                    "clicked_cnt": rng.randrange(500),
+                }
+
+
+# --- News API and push functions --------------------------------------------
+
+def headline(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(7, 13))).capitalize()
+
+
+def make_articles(count, seed=4, paragraphs=12):
+    """Feed articles, newest first; every tenth one is a reworded copy of the previous"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    articles = []
+    for index in range(count):
+        title = headline(rng)
+        if index % 10 == 9:
+            title = articles[-1]["title"] + " - update"
+        body = "".join(f"<p>{' '.join(rng.choice(WORDS) for _ in range(rng.randint(25, 60)))}.</p>"
+                       for _ in range(paragraphs))
+        articles.append({
+            "article_id": f"{rng.getrandbits(128):032x}",
+            "title": title,
+            "description": title,
+            "content": body + "<p>Read more: subscribe to our newsletter</p>",
+            "pubDate": (now - timedelta(seconds=30 * index)).strftime("%Y-%m-%d %H:%M:%S"),
+            "link": f"https://news.example/{index}",
+            "source_id": rng.choice(["wire", "globe", "star", "post"]),
+            "language": "english",
+        })
+    return articles
+
+
+class NewsServer:
+    """newsdata.io-style pagination (?page=<token>) plus POST endpoints for push functions"""
+
+    def __init__(self, articles, page_size=50, latency_ms=150.0):
+        self.articles = articles
+        self.page_size = page_size
+        self.latency = latency_ms / 1000
+        self.pushes = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                time.sleep(server.latency)
+                page = int(parse_qs(urlparse(self.path).query).get("page", ["0"])[0])
+                start = page * server.page_size
+                results = server.articles[start:start + server.page_size]
+                has_next = start + server.page_size < len(server.articles)
+                self.reply({"status": "success", "totalResults": len(server.articles), "results": results,
+                            "nextPage": str(page + 1) if has_next else None})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                server.pushes += 1
+                self.reply({"successCount": 100, "failureCount": 0, "ignoredUsers": 0})
+
+            def reply(self, payload):
+                body = json.dumps(payload).encode()
+                if "gzip" in self.headers.get("Accept-Encoding", ""):
+                    body = gzip.compress(body)
+                    encoding = "gzip"
+                else:
+                    encoding = "identity"
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Encoding", encoding)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def shutdown(self):
+        self.httpd.shutdown()
+
+
+# --- Wiring -----------------------------------------------------------------
+
+def install(gemini, store):
+    """Route google.genai.Client and firebase_admin's Firestore client to the fakes"""
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+    from google import genai
+
+    genai.Client = gemini.client_class()
+    firebase_admin.initialize_app = lambda *args, **kwargs: None
+    credentials.Certificate = lambda *args, **kwargs: None
+    firestore.client = lambda *args, **kwargs: store
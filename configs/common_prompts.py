@@ -2,23 +2,25 @@
 Common prompts shared across all country configurations
 """
 
+CATEGORIES = [
+    "crime",
+    "politics",
+    "business",
+    "culture",
+    "technology",
+    "sports",
+    "health",
+    "other"
+]
+
 def summarization_prompt_with_category(language):
     """
     Generate summarization prompt with category classification
     Args:
         language: Target language for the summary (e.g., 'English', 'German', 'Arabic')
     """
-    categories = [
-        "crime",
-        "politics", 
-        "business",
-        "culture",
-        "technology",
-        "sports",
-        "health",
-        "other"
-    ]
-    
+    categories = CATEGORIES
+
     return f"""You're a news editor and categorization assistant. Summarize and categorize the following article.
 - Write a concise summary in plain {language} that captures the key points and important facts
 - Adjust the length based on the article's content (1-4 lines maximum)
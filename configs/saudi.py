@@ -109,10 +109,36 @@ config = {
     "base_lang": "ar",
     "lang_list": ["ur", "hi", "bn", "en"],
     "select_all": False,
+    "skip_known_articles": True,
+    "firestore_write_batch_size": 20,
+    "firestore_write_parallelism": 2,
+    "stream_writes": True,
+    "stream_batch_size": 5,
+    "stream_max_wait": 1.0,
+    "stats_shards": 0,
+    "crawl_watermark": True,
     "top_article_ratio": 0.12,
+    "near_duplicate_threshold": 0.6,
+    "selection_chunk_size": 200,
+    "selection_fan_out": 8,
+    "prerank_top_k": 150,
+    "relevance_terms": ["السعودي", "سعودي", "المملكة", "الرياض", "جدة", "مكة", "الدمام", "نيوم", "الخليج", "الشرق الأوسط", "إقامة", "الإقامة", "العمالة", "الوافدين"],
     "timezone": "Asia/Riyadh",
     "daily_popular_days": 2,
     "daily_popular_limit": 10,
+    "daily_popular_finalize_after": 3,
+    "extract_content": True,
+    "content_token_budget": 1500,
+    "fused_generation": False,
+    "translation_attempts": 2,
+    "translation_backfill_limit": 20,
+    "translation_backfill_attempts": 3,
+    "batch_size": 1,
+    "batch_max_wait": 2.0,
+    "async_concurrency": 100,
+    "gemini_rpm": 2000,
+    "llm_cache": True,
+    "usage_stats_to_firestore": True,
     "summarization_prompt": summarization_prompt,
     "translation_prompt": translation_prompt,
     "top_prompt": top_prompt
@@ -0,0 +1,176 @@
+import asyncio
+
+from pipeline.summarize import generate_ai_summary_async, generate_fused_summary_async
+from pipeline.translate import DEFAULT_TRANSLATION_ATTEMPTS, translate_ai_summary_async
+from pipeline.firestore import ArticleStream, save_article, update_meta
+from pipeline.util import fetch_all_articles, select_articles
+from pipeline.journal import record, record_persisted, record_summary, restored_selection
+from pipeline.processing import (prompt_content, restore, accept_fused, missing_languages, journal_translation,
+                                 summary_content, build_article, processing_failed)
+from pipeline.log import get_logger, log_context
+
+# asyncio engine for news_pipeline.py --engine async.
+# Every Gemini request in the run shares one semaphore, so a single runner can keep
+# hundreds of requests in flight without a thread per request. Journal records are
+# fsynced, so they are written from a worker thread, never on the event loop.
+
+DEFAULT_ASYNC_CONCURRENCY = 100
+
+logger = get_logger("async")
+
+
+async def limited(semaphore, coro):
+    """Await coro while holding one slot of the global concurrency limit"""
+    async with semaphore:
+        return await coro
+
+
+def _call_each(on_result, results):
+    """on_result(lang, result) for every result of a translation round"""
+    for lang, result in results.items():
+        on_result(lang, result)
+
+
+async def translate_languages_async(title, content, langs, config, article_id, semaphore, on_result=None):
+    """
+    Async counterpart of translate.translate_languages (bounded retries of the failed languages only).
+    on_result runs in a worker thread, once per round for the languages that succeeded.
+    """
+    attempts = max(1, config.get("translation_attempts", DEFAULT_TRANSLATION_ATTEMPTS))
+    translations = {}
+    failed = list(langs)
+    for attempt in range(attempts):
+        if not failed:
+            break
+        if attempt:
+            logger.info("retrying translation: %s (attempt %d/%d)", failed, attempt + 1, attempts)
+        results = await asyncio.gather(*[
+            limited(semaphore, translate_ai_summary_async(title, content, lang, config, article_id))
+            for lang in failed
+        ])
+        succeeded = {lang: result for lang, result in zip(failed, results) if result}
+        translations.update(succeeded)
+        if on_result and succeeded:
+            await asyncio.to_thread(_call_each, on_result, succeeded)
+        failed = [lang for lang in failed if lang not in translations]
+    return translations, failed
+
+
+async def persist_article(article, config, stream=None, write_summary=None):
+    """
+    Persist one finished article: coalesced with other finished articles by the stream,
+    or one write each (Firestore client is sync, so use a thread) recorded in write_summary
+    """
+    if stream:
+        stream.add(article)
+        return
+    article_id = article["article_id"]
+    try:
+        await asyncio.to_thread(save_article, article, config)
+    except Exception as e:
+        logger.error("write fail: %s", e)
+        if write_summary is not None:
+            write_summary["failed"].append(article_id)
+        return
+    if write_summary is not None:
+        write_summary["written"].append(article_id)
+    await asyncio.to_thread(record, "persisted", article_ids=[article_id])
+
+
+async def process_article_async(article, config, api_key, semaphore, stream=None, write_summary=None):
+    """Async counterpart of news_pipeline.process_article"""
+    # Each gather() task has its own context, so the ID stays with this article
+    with log_context(article_id=article.get("article_id")):
+        return await _process_article_async(article, config, api_key, semaphore, stream, write_summary)
+
+
+async def _process_article_async(article, config, api_key, semaphore, stream=None, write_summary=None):
+    article_id = article["article_id"]
+    server_ai_summary = article.get("ai_summary")
+    content = prompt_content(article, config)
+    if content is None:
+        return None
+
+    article_config = {**config, "api_key": api_key}
+    # A resumed run reuses the summary and translations its journal already holds
+    ai_summary, translations = restore(article_id)
+
+    # Fused mode: category, summary and every translation in one structured call
+    if not ai_summary and config.get("fused_generation"):
+        fused = await limited(semaphore, generate_fused_summary_async(
+            article["title"], content, article_config, article_id, server_ai_summary))
+        if fused and fused.get("skip"):
+            processing_failed(article)
+            return None
+        ai_summary, translations = accept_fused(fused, translations)
+        if ai_summary:
+            await asyncio.to_thread(record_summary, article_id, ai_summary)
+
+    if not ai_summary:
+        ai_summary = await limited(semaphore, generate_ai_summary_async(content, article_config, article_id))
+        if not ai_summary:
+            processing_failed(article)
+            return None
+        await asyncio.to_thread(record_summary, article_id, ai_summary)
+
+    # Keep what succeeded; languages that still fail are published as pending
+    ai_content, _ = summary_content(article, ai_summary)
+    translated, failed_langs = await translate_languages_async(
+        article["title"], ai_content, missing_languages(config, translations), article_config, article_id,
+        semaphore, on_result=journal_translation(article_id)
+    )
+    translations.update(translated)
+    build_article(article, config, ai_summary, translations, failed_langs)
+
+    # Persist as soon as the article is ready
+    await persist_article(article, config, stream, write_summary)
+    logger.info("processed (category: %s)", article["category"][0])
+    return article
+
+
+async def run_async_pipeline(config, api_key, concurrency=None, crawl_state=None):
+    """
+    Fetch, select, process and persist one country's articles on a single event loop.
+    Returns (processed_articles, total_available, write_summary); write_summary is the
+    save_documents summary of the run's writes ({"written", "skipped", "failed"}).
+    """
+    concurrency = concurrency or config.get("async_concurrency", DEFAULT_ASYNC_CONCURRENCY)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    if config.get("batch_size", 1) > 1:
+        logger.info("micro-batching is thread based and is not used by the async engine")
+
+    # Fetching and selection are single sequential steps; keep them off the loop
+    # A resumed run continues with the journaled selection instead
+    resumed = restored_selection(crawl_state)
+    if resumed:
+        selected_articles, total_available = resumed
+    else:
+        all_articles = await asyncio.to_thread(fetch_all_articles, config["api_url"], config, crawl_state)
+        total_available = len(all_articles)
+        selected_articles = await asyncio.to_thread(select_articles, all_articles, api_key, config)
+        await asyncio.to_thread(record, "fetched", total_available=total_available,
+                                crawl_next=crawl_state["next"] if crawl_state else None)
+        await asyncio.to_thread(record, "selected", articles=selected_articles)
+
+    logger.info("processing %d articles (async, concurrency=%d)", len(selected_articles), concurrency)
+    stream = ArticleStream(config, on_written=record_persisted) if config.get("stream_writes") else None
+    write_summary = {"written": [], "skipped": [], "failed": []}
+    results = await asyncio.gather(
+        *[process_article_async(article, config, api_key, semaphore, stream, write_summary)
+          for article in selected_articles],
+        return_exceptions=True
+    )
+    if stream:
+        write_summary = await asyncio.to_thread(stream.close)
+
+    processed_articles = []
+    for article, result in zip(selected_articles, results):
+        if isinstance(result, Exception):
+            logger.error("article %s async processing error: %s", article.get('article_id'), result)
+            processing_failed(article)
+        elif result is not None:
+            processed_articles.append(result)
+
+    await asyncio.to_thread(update_meta, config)
+    return processed_articles, total_available, write_summary
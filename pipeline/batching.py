@@ -0,0 +1,169 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from pipeline.log import get_logger, log_context
+
+# Config-driven micro-batching: per-article callers submit one item and block on a
+# Future while a background thread packs items from many articles into one request.
+
+DEFAULT_BATCH_SIZE = 1  # 1 = batching disabled
+DEFAULT_BATCH_MAX_WAIT = 2.0  # seconds to wait for a batch to fill
+DEFAULT_BATCH_TOKEN_BUDGET = 24000  # estimated input tokens per batched request
+DEFAULT_BATCH_MAX_ATTEMPTS = 2  # batched attempts before falling back to a single call
+DEFAULT_BATCH_PARALLELISM = 4  # batched requests in flight per batcher
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+logger = get_logger("batching")
+summary_logger = get_logger("summary")
+
+
+def estimate_tokens(text):
+    """Rough token estimate (~4 characters per token) used to size batches"""
+    if not text:
+        return 0
+    return max(1, len(text) // 4)
+
+
+def batching_enabled(config):
+    return config.get("batch_size", DEFAULT_BATCH_SIZE) > 1
+
+
+class MicroBatcher:
+    """
+    Collect submitted items and flush them through handler(items) in batches.
+
+    handler receives a list of (item_id, payload) and returns {item_id: result}.
+    Items missing from the returned dict are treated as parse failures and are
+    re-queued, up to max_attempts; after that fallback(item_id, payload) is called for
+    the single item (or None is returned when no fallback is given).
+    """
+
+    def __init__(self, name, handler, max_batch_size, max_wait, token_budget,
+                 max_attempts=DEFAULT_BATCH_MAX_ATTEMPTS, fallback=None,
+                 parallelism=DEFAULT_BATCH_PARALLELISM):
+        self.name = name
+        self.handler = handler
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.token_budget = token_budget
+        self.max_attempts = max(1, max_attempts)
+        self.fallback = fallback
+        self.executor = ThreadPoolExecutor(max_workers=parallelism)
+        self.cond = threading.Condition()
+        self.queue = []  # [item_id, payload, tokens, future, attempts, enqueued_at]
+        self.stats = {"batches": 0, "items": 0, "requeued": 0, "fallbacks": 0}
+        self.worker = threading.Thread(target=self._run, name=f"batcher-{name}", daemon=True)
+        self.worker.start()
+
+    def submit(self, item_id, payload, tokens=0):
+        future = Future()
+        self._enqueue([item_id, payload, tokens, future, 0, time.monotonic()])
+        return future
+
+    def _enqueue(self, entry):
+        with self.cond:
+            self.queue.append(entry)
+            self.cond.notify()
+
+    def _queued_tokens(self):
+        return sum(entry[2] for entry in self.queue)
+
+    def _ready(self):
+        if not self.queue:
+            return False
+        if len(self.queue) >= self.max_batch_size or self._queued_tokens() >= self.token_budget:
+            return True
+        return time.monotonic() - self.queue[0][5] >= self.max_wait
+
+    def _take_batch(self):
+        """Pop the next batch, bounded by item count and estimated token budget"""
+        batch = []
+        tokens = 0
+        while self.queue and len(batch) < self.max_batch_size:
+            entry = self.queue[0]
+            if batch and tokens + entry[2] > self.token_budget:
+                break
+            batch.append(self.queue.pop(0))
+            tokens += entry[2]
+        return batch
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self._ready():
+                    if self.queue:
+                        remaining = self.max_wait - (time.monotonic() - self.queue[0][5])
+                        self.cond.wait(timeout=max(remaining, 0.01))
+                    else:
+                        self.cond.wait()
+                batch = self._take_batch()
+            self.executor.submit(self._flush, batch)
+
+    def _count(self, stat, n=1):
+        with self.cond:
+            self.stats[stat] += n
+
+    def _flush(self, batch):
+        self._count("batches")
+        self._count("items", len(batch))
+        try:
+            results = self.handler([(entry[0], entry[1]) for entry in batch]) or {}
+        except Exception as e:
+            logger.warning("batcher %s: batch of %d failed: %s", self.name, len(batch), e)
+            results = {}
+
+        for entry in batch:
+            item_id, payload, _, future, attempts, _ = entry
+            if item_id in results:
+                future.set_result(results[item_id])
+                continue
+
+            attempts += 1
+            if attempts < self.max_attempts:
+                # Re-queue only the item that failed to parse
+                self._count("requeued")
+                logger.debug("batcher %s: re-queueing %s (attempt %d)", self.name, item_id, attempts + 1)
+                entry[4] = attempts
+                entry[5] = time.monotonic()
+                self._enqueue(entry)
+                continue
+
+            if self.fallback:
+                self._count("fallbacks")
+                logger.info("batcher %s: %s falling back to single request", self.name, item_id)
+                try:
+                    with log_context(article_id=item_id):
+                        future.set_result(self.fallback(item_id, payload))
+                except Exception as e:
+                    future.set_exception(e)
+            else:
+                future.set_result(None)
+
+
+def get_batcher(name, config, handler, fallback=None):
+    """Return the shared batcher for name + country, creating it on first use"""
+    key = (config.get("country"), name)
+    with _batchers_lock:
+        batcher = _batchers.get(key)
+        if batcher is None:
+            batcher = MicroBatcher(
+                f"{config.get('country', '').lower()}:{name}",
+                handler,
+                max_batch_size=config.get("batch_size", DEFAULT_BATCH_SIZE),
+                max_wait=config.get("batch_max_wait", DEFAULT_BATCH_MAX_WAIT),
+                token_budget=config.get("batch_token_budget", DEFAULT_BATCH_TOKEN_BUDGET),
+                max_attempts=config.get("batch_max_attempts", DEFAULT_BATCH_MAX_ATTEMPTS),
+                fallback=fallback
+            )
+            _batchers[key] = batcher
+        return batcher
+
+
+def print_batch_stats():
+    """Print per-batcher counters at the end of a run"""
+    for batcher in _batchers.values():
+        stats = batcher.stats
+        summary_logger.info("batcher %s: batches=%d items=%d requeued=%d fallbacks=%d", batcher.name,
+                            stats['batches'], stats['items'], stats['requeued'], stats['fallbacks'])
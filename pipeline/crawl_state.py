@@ -0,0 +1,147 @@
+from datetime import datetime
+
+from pipeline.firestore import get_db
+from pipeline.log import get_logger
+
+# Per-country crawl watermark stored in {info_doc}/crawl_state.
+# fetch_all_articles stops paging once a page holds nothing newer than the last
+# committed run, and replays the first page's ETag / Last-Modified so the API can
+# answer 304 when nothing changed. The state is only committed after the run has
+# persisted its articles, so a failed run crawls the same window again. A crawl
+# that stopped on a failing page is marked incomplete and commits nothing, since
+# its watermark would skip the pages that were never fetched. Articles that failed
+# processing stay out of seen_ids and the watermark is held below the oldest of them.
+
+CRAWL_STATE_DOC = "crawl_state"
+MAX_SEEN_IDS = 1000
+
+logger = get_logger("crawl_state")
+
+
+def empty_crawl_state():
+    return {
+        "watermark": None,      # newest pubDate committed by a previous run
+        "seen_ids": [],         # article IDs at/near the watermark (pubDate ties)
+        "etag": None,
+        "last_modified": None,
+        "next": {}              # values observed in this run, committed by save_crawl_state
+    }
+
+
+def load_crawl_state(config, db=None):
+    """Read the country's crawl state (None when crawl_watermark is turned off)"""
+    if not config.get("crawl_watermark", True):
+        return None
+    state = empty_crawl_state()
+    try:
+        db = get_db(db)
+        doc = db.collection(config["info_doc"]).document(CRAWL_STATE_DOC).get()
+        if doc.exists:
+            data = doc.to_dict()
+            state.update({key: data.get(key) for key in ("watermark", "etag", "last_modified")})
+            state["seen_ids"] = data.get("seen_ids") or []
+            logger.info("crawl watermark: %s (%d seen IDs)", state['watermark'], len(state['seen_ids']))
+    except Exception as e:
+        logger.warning("crawl state load fail, crawling without watermark: %s", e)
+    return state
+
+
+def is_stale_page(articles, state):
+    """True when every article on the page is at/older than the watermark or already seen"""
+    if not state or not state.get("watermark") or not articles:
+        return False
+    seen = set(state["seen_ids"])
+    for article in articles:
+        if article.get("article_id") in seen:
+            continue
+        pub_date = article.get("pubDate")
+        if not pub_date or pub_date > state["watermark"]:
+            return False
+    return True
+
+
+def observe_page(articles, state, response_headers=None, first_page=False):
+    """Track the newest pubDate / IDs and the first page validators for the next run"""
+    if state is None:
+        return
+    pending = state["next"]
+    if first_page and response_headers is not None:
+        pending["etag"] = response_headers.get("ETag")
+        pending["last_modified"] = response_headers.get("Last-Modified")
+    for article in articles:
+        pub_date = article.get("pubDate")
+        if pub_date and (not pending.get("watermark") or pub_date > pending["watermark"]):
+            pending["watermark"] = pub_date
+        if article.get("article_id"):
+            pending.setdefault("ids", []).append((pub_date or "", article["article_id"]))
+
+
+def mark_incomplete(state, reason):
+    """Pagination stopped early on an error: this run must not move the watermark"""
+    if state is None:
+        return
+    state["next"]["incomplete"] = reason
+
+
+def mark_failed(state, failed):
+    """failed ({article_id: pubDate}) must be crawled again: keep the watermark below them"""
+    if state is None or not failed:
+        return
+    state["next"]["failed"] = dict(failed)
+
+
+def held_back_watermark(pending):
+    """This run's watermark, capped below the oldest article that failed processing"""
+    failed_dates = [pub_date for pub_date in pending.get("failed", {}).values() if pub_date]
+    if not failed_dates:
+        return pending["watermark"]
+    oldest = min(failed_dates)
+    return max((pub_date for pub_date, article_id in pending.get("ids", [])
+                if pub_date and pub_date < oldest), default=None)
+
+
+def conditional_headers(state):
+    headers = {}
+    if state and state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state and state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+    return headers
+
+
+def save_crawl_state(config, state, db=None):
+    """Commit the watermark observed in this run (call only after articles are persisted)"""
+    if state is None or not state["next"].get("watermark"):
+        return
+    pending = state["next"]
+    if pending.get("incomplete"):
+        logger.warning("crawl incomplete (%s), watermark not saved", pending["incomplete"])
+        return
+
+    # Keep the newest IDs so pubDate ties at the watermark are not re-processed
+    failed = pending.get("failed", {})
+    if failed:
+        logger.info("%d articles failed processing, holding the watermark below them", len(failed))
+    ids = [(pub_date, article_id) for pub_date, article_id in pending.get("ids", []) if article_id not in failed]
+    newest = sorted(ids, reverse=True)[:MAX_SEEN_IDS]
+    seen_ids = [article_id for _, article_id in newest]
+    current = set(seen_ids)
+    seen_ids += [article_id for article_id in state["seen_ids"] if article_id not in current and article_id not in failed]
+
+    watermarks = list(filter(None, [state.get("watermark"), held_back_watermark(pending)]))
+    if not watermarks:
+        logger.info("no article older than the failed ones, watermark not saved")
+        return
+    watermark = max(watermarks)
+    try:
+        db = get_db(db)
+        db.collection(config["info_doc"]).document(CRAWL_STATE_DOC).set({
+            "watermark": watermark,
+            "seen_ids": seen_ids[:MAX_SEEN_IDS],
+            "etag": pending.get("etag"),
+            "last_modified": pending.get("last_modified"),
+            "updated_at": datetime.now()
+        })
+        logger.info("crawl watermark saved: %s", watermark)
+    except Exception as e:
+        logger.warning("crawl state save fail: %s", e)
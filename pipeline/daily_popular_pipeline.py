@@ -1,17 +1,31 @@
+import hashlib
+import heapq
 import importlib
+import json
 import sys
 import os
-import requests
-import json
 from datetime import datetime, timedelta
-import pytz
-import firebase_admin
-from firebase_admin import credentials, firestore
-from google import genai
 
 # Add parent directory to Python path for absolute imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from pipeline.gemini import get_api_key, generate_content
+from pipeline.firestore import get_db, init_firebase, save_documents
+from pipeline.ratelimit import print_limiter_metrics
+from pipeline.llm_cache import print_cache_stats
+from pipeline.usage import print_usage_summary, write_run_report
+from pipeline.log import get_logger, setup_logging
+from pipeline.resilience import (
+    RETRYABLE_STATUS_CODES, RetryableStatusError, call_with_resilience, http_timeout, is_safe_to_resend
+)
+
+DAILY_POPULAR_STATE_DOC = "daily_popular_state"
+DEFAULT_FINALIZE_AFTER_DAYS = 3  # a day's ranking is final (never rescanned or rewritten) this many days back
+GET_ALL_BATCH_SIZE = 100  # document refs per get_all round trip
+
+logger = get_logger("daily_popular")
+summary_logger = get_logger("summary")
+
 def get_local_date_range(local_tz, days_back=1):
     """Return local time range for N days back in the specified timezone"""
     # Use local timezone consistently
@@ -24,91 +38,192 @@ def get_local_date_range(local_tz, days_back=1):
 
     return start_local.strftime("%Y-%m-%d %H:%M:%S"), end_local.strftime("%Y-%m-%d %H:%M:%S")
 
-def get_daily_popular_articles(config, days_back=7, limit=10):
-    """Collect popular articles from the past N days"""
-    db = firestore.client()
+def get_daily_popular_articles(config, days_back=7, limit=10, finalized_through=None):
+    """
+    Collect each day's most clicked articles over the past N days with a single range
+    scan on pubDate, projected onto pubDate / clicked_cnt and bucketed by local date
+    into per-day top-`limit` heaps. Only the winners are then read in full (batched
+    get_all). Days up to finalized_through (YYYY-MM-DD) are not scanned.
+    Returns {date: [articles, most clicked first]} for the scanned days; {} on error.
+    """
+    import pytz
+
+    db = get_db()
     local_tz = pytz.timezone(config["timezone"])
-    result = {}
-    
+    ranges = {}
     for i in range(1, days_back + 1):
         start_str, end_str = get_local_date_range(local_tz, days_back=i)
         date_key = start_str.split(" ")[0]  # YYYY-MM-DD
+        if not finalized_through or date_key > finalized_through:
+            ranges[date_key] = (start_str, end_str)
+    if not ranges:
+        logger.info("every day in the window is finalized, nothing to scan")
+        return {}
 
-        try:
-            snapshot = db.collection(config["firestore_collection"]) \
-                .where("pubDate", ">=", start_str) \
-                .where("pubDate", "<=", end_str) \
-                .order_by("clicked_cnt", direction=firestore.Query.DESCENDING) \
-                .limit(limit) \
-                .stream()
+    window_start = min(start for start, _ in ranges.values())
+    window_end = max(end for _, end in ranges.values())
+    collection = db.collection(config["firestore_collection"])
+    heaps = {date_key: [] for date_key in ranges}
+    scanned = 0
+    try:
+        snapshot = collection \
+            .where("pubDate", ">=", window_start) \
+            .where("pubDate", "<=", window_end) \
+            .select(["pubDate", "clicked_cnt"]) \
+            .stream()
+
+        for doc in snapshot:
+            scanned += 1
+            data = doc.to_dict()
+            heap = heaps.get(str(data.get("pubDate", ""))[:10])
+            clicked_cnt = data.get("clicked_cnt")
+            if heap is None or clicked_cnt is None:
+                continue
+            entry = (clicked_cnt, doc.id)
+            if len(heap) < limit:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+        ranked = {date_key: [doc_id for _, doc_id in sorted(heap, reverse=True)] for date_key, heap in heaps.items()}
+        winners = [doc_id for doc_ids in ranked.values() for doc_id in doc_ids]
+        documents = {}
+        for start in range(0, len(winners), GET_ALL_BATCH_SIZE):
+            refs = [collection.document(doc_id) for doc_id in winners[start:start + GET_ALL_BATCH_SIZE]]
+            for doc in db.get_all(refs):
+                if doc.exists:
+                    documents[doc.id] = doc.to_dict()
+    except Exception as e:
+        logger.error("error scanning popular articles %s ~ %s: %s", window_start, window_end, e)
+        return {}
 
-            articles = []
-            for doc in snapshot:
-                data = doc.to_dict()
-                if 'article_id' not in data:
-                    data['article_id'] = doc.id
-                articles.append(data)
+    result = {}
+    for date_key, doc_ids in ranked.items():
+        articles = []
+        for doc_id in doc_ids:
+            if doc_id not in documents:
+                continue
+            data = documents[doc_id]
+            if 'article_id' not in data:
+                data['article_id'] = doc_id
+            articles.append(data)
+        result[date_key] = articles
+        logger.info("%s: %d popular articles", date_key, len(articles))
+    logger.info("popular article scan: %d days, %d articles scanned, %d read in full", len(ranges), scanned,
+                len(documents))
+    return result
 
-            result[date_key] = articles
-            print(f"{date_key}: {len(articles)} popular articles")
+def load_daily_popular_state(config, db=None):
+    """{"finalized_through": YYYY-MM-DD or None, "hashes": {date: content hash}} from {info_doc}/daily_popular_state"""
+    state = {"finalized_through": None, "hashes": {}}
+    try:
+        db = get_db(db)
+        doc = db.collection(config["info_doc"]).document(DAILY_POPULAR_STATE_DOC).get()
+        if doc.exists:
+            data = doc.to_dict()
+            state["finalized_through"] = data.get("finalized_through")
+            state["hashes"] = data.get("hashes") or {}
+            logger.info("daily popular finalized through %s", state['finalized_through'])
+    except Exception as e:
+        logger.warning("daily popular state load fail, recomputing every day: %s", e)
+    return state
 
-        except Exception as e:
-            print(f"Error fetching articles for {date_key}: {e}")
-            result[date_key] = []
+def save_daily_popular_state(config, state, db=None):
+    try:
+        db = get_db(db)
+        db.collection(config["info_doc"]).document(DAILY_POPULAR_STATE_DOC).set({
+            "finalized_through": state["finalized_through"],
+            "hashes": state["hashes"],
+            "updated_at": datetime.now()
+        })
+    except Exception as e:
+        logger.warning("daily popular state save fail: %s", e)
 
-    return result
+def content_hash(articles):
+    raw = json.dumps(articles, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
-def save_daily_popular_to_firestore(daily_data, config):
-    """Save daily popular articles to Firestore"""
-    db = firestore.client()
+def save_daily_popular_to_firestore(daily_data, config, state=None):
+    """
+    Save daily popular articles to Firestore, skipping days whose articles hash the
+    same as last run's write. Updates state["hashes"]; returns (written, settled dates)
+    where settled dates are stored or unchanged (safe to finalize).
+    """
+    import pytz
+
+    db = get_db()
     local_tz = pytz.timezone(config["timezone"])
     country = config["country"].lower()
     collection_name = f"{country}_daily_popular"
+    hashes = state["hashes"] if state is not None else {}
     
-    count = 0
+    documents = {}
+    new_hashes = {}
+    settled = []
     for date_key, articles in daily_data.items():
         if not articles:
-            print(f"{date_key} 기사 없음")
+            logger.info("%s 기사 없음", date_key)
+            settled.append(date_key)
             continue
 
-        doc = {
+        digest = content_hash(articles)
+        if hashes.get(date_key) == digest:
+            logger.info("%s unchanged, not rewritten", date_key)
+            settled.append(date_key)
+            continue
+
+        new_hashes[date_key] = digest
+        documents[date_key] = {
             'articles': articles,
             'updated_at': datetime.now(local_tz),
             'count': len(articles),
             'date': date_key
         }
 
-        try:
-            db.collection(collection_name).document(date_key).set(doc)
-            print(f"{date_key} 저장 완료 ({len(articles)}개)")
-            count += 1
-        except Exception as e:
-            print(f"{date_key} 저장 오류: {e}")
-    
-    return count
+    summary = save_documents(collection_name, documents, config, db, label="daily popular")
+    for date_key in summary["written"]:
+        logger.info("%s 저장 완료 (%d개)", date_key, documents[date_key]['count'])
+        hashes[date_key] = new_hashes[date_key]
+        settled.append(date_key)
+
+    return len(summary["written"]), settled
+
+def finalize_days(state, daily_data, settled, config):
+    """
+    Advance finalized_through over days at least daily_popular_finalize_after days back
+    whose ranking was settled in this run, and drop hashes of finalized days.
+    A day that failed to save stops the advance so it is recomputed next run.
+    """
+    import pytz
+
+    local_tz = pytz.timezone(config["timezone"])
+    finalize_after = max(2, config.get("daily_popular_finalize_after", DEFAULT_FINALIZE_AFTER_DAYS))
+    threshold = (datetime.now(local_tz) - timedelta(days=finalize_after)).strftime("%Y-%m-%d")
+    settled = set(settled)
+
+    finalized_through = state["finalized_through"]
+    for date_key in sorted(daily_data):
+        if date_key > threshold or date_key not in settled:
+            break
+        finalized_through = date_key
+    state["finalized_through"] = finalized_through
+    if finalized_through:
+        state["hashes"] = {date_key: digest for date_key, digest in state["hashes"].items()
+                           if date_key > finalized_through}
+    return state
 
 def generate_briefing_summary(top_articles, config):
     """Generate a briefing summary from top 3 articles using AI"""
-    print(f"Starting briefing summary generation for {len(top_articles)} articles")
-
-    # Initialize Gemini client
-    api_key = config.get("api_key") or os.getenv("GEMINI_API_KEY")
+    # Check Gemini API key
+    api_key = get_api_key(config)
 
     if not api_key:
-        print("ERROR: GEMINI_API_KEY not found, skipping briefing")
+        logger.error("GEMINI_API_KEY not found, skipping briefing")
         return None
 
-    print(f"API key configured: {'Yes' if api_key else 'No'}")
-
-    # Set up Gemini client (remove duplicate key to avoid warnings)
-    if "GOOGLE_API_KEY" in os.environ and os.environ["GOOGLE_API_KEY"] != api_key:
-        del os.environ["GOOGLE_API_KEY"]
-    os.environ["GOOGLE_API_KEY"] = api_key
-    client = genai.Client()
-
     # Get base language from config
     base_lang = config.get("base_lang", "en")
-    print(f"Generating summary in base language: {base_lang}")
+    logger.info("generating briefing summary for %d articles in %s", len(top_articles), base_lang)
 
     # Create article list with titles
     articles_text = ""
@@ -116,7 +231,7 @@ def generate_briefing_summary(top_articles, config):
         title = article.get('title', 'No title')
         articles_text += f"Article {i}: {title}\n"
 
-    print(f"Top 3 articles to process:\n{articles_text}")
+    logger.debug("briefing articles:\n%s", articles_text)
 
     prompt = f"""
 Here are the top 3 most popular news articles from yesterday. Please shorten each title to a very brief phrase (under 8 words each) in {base_lang}.
@@ -139,23 +254,22 @@ Third article summary
 Return exactly 3 shortened phrases, one per line.
 """
     
-    print("Sending request to Gemini API...")
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-lite",
-            contents=prompt
+        response = generate_content(
+            config,
+            prompt,
+            "briefing"
         )
         
         result = response.text.strip()
-        print(f"AI generated briefing: '{result}'")
-        print(f"Briefing length: {len(result)} characters")
+        logger.debug("AI generated briefing (%d characters): %r", len(result), result)
         
         # Convert to numbered list - expect exactly 3 lines
         events = [event.strip() for event in result.split('\n') if event.strip()]
         
         # Ensure we have exactly 3 events
         if len(events) < 3:
-            print(f"Warning: Expected 3 events but got {len(events)}")
+            logger.warning("expected 3 events but got %d", len(events))
             # Pad with empty if needed
             while len(events) < 3:
                 events.append("news update")
@@ -165,34 +279,26 @@ Return exactly 3 shortened phrases, one per line.
         numbered_events = [f"{i+1}. {event}" for i, event in enumerate(events)]
         final_result = ", ".join(numbered_events)
         
-        print(f"Numbered briefing (3 items): '{final_result}'")
+        logger.info("numbered briefing (3 items): %r", final_result)
         return final_result
     except Exception as e:
-        print(f"ERROR generating briefing summary: {e}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("error generating briefing summary: %s", e)
         return None
 
 def translate_briefing(briefing_text, target_languages, config):
     """Translate briefing summary to multiple languages"""
     if not target_languages:
-        print("No target languages specified, skipping translation")
+        logger.info("no target languages specified, skipping translation")
         return {}
 
-    # Initialize Gemini client
-    api_key = config.get("api_key") or os.getenv("GEMINI_API_KEY")
+    # Check Gemini API key
+    api_key = get_api_key(config)
 
     if not api_key:
-        print("ERROR: GEMINI_API_KEY not found, skipping translation")
+        logger.error("GEMINI_API_KEY not found, skipping translation")
         return {}
 
-    print(f"Translating briefing to {len(target_languages)} languages: {', '.join(target_languages)}")
-
-    # Set up Gemini client
-    if "GOOGLE_API_KEY" in os.environ and os.environ["GOOGLE_API_KEY"] != api_key:
-        del os.environ["GOOGLE_API_KEY"]
-    os.environ["GOOGLE_API_KEY"] = api_key
-    client = genai.Client()
+    logger.info("translating briefing to %d languages: %s", len(target_languages), ", ".join(target_languages))
 
     # Create language list string
     lang_list_str = ", ".join(target_languages)
@@ -218,18 +324,17 @@ Return ONLY a valid JSON object in this exact format:
 Do NOT include any explanation, markdown formatting, or additional text. Only return the JSON object.
 """
 
-    print("Sending translation request to Gemini API...")
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-lite",
-            contents=prompt
+        response = generate_content(
+            config,
+            prompt,
+            "briefing"
         )
 
         result = response.text.strip()
-        print(f"AI translation response: '{result}'")
+        logger.debug("AI translation response: %r", result)
 
         # Parse JSON response
-        import json
         # Remove markdown code blocks if present
         if result.startswith("```"):
             result = result.split("```")[1]
@@ -238,13 +343,11 @@ Do NOT include any explanation, markdown formatting, or additional text. Only re
             result = result.strip()
 
         translations = json.loads(result)
-        print(f"Successfully translated to {len(translations)} languages")
+        logger.info("translated briefing to %d languages", len(translations))
         return translations
 
     except Exception as e:
-        print(f"ERROR translating briefing: {e}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("error translating briefing: %s", e)
         return {}
 
 def send_briefing_push(title, messages, country):
@@ -268,24 +371,34 @@ def send_briefing_push(title, messages, country):
         "Content-Type": "application/json"
     }
 
-    print(f"Sending push notification to {country}")
-    print(f"Payload: title='{title}', messages type={type(messages).__name__}, country='{country}'")
+    logger.info("sending briefing push notification to %s", country)
+    logger.debug("push payload: %s", payload)
 
     try:
-        response = requests.post(function_url, headers=headers, json=payload)
+        import requests
+
+        def post():
+            response = requests.post(function_url, headers=headers, json=payload, timeout=http_timeout())
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                raise RetryableStatusError(response.status_code, response.text[:200])
+            return response
+
+        # Only retry when the push cannot have been delivered (no duplicate notifications)
+        response = call_with_resilience(post, "push_function", retryable=is_safe_to_resend)
         if response.status_code == 200:
-            print(f"Push notification sent successfully to {country}")
+            logger.info("push notification sent successfully to %s", country)
             return True
         else:
-            print(f"Failed to send push notification: {response.status_code}")
-            print(f"Response: {response.text}")
+            logger.error("failed to send push notification: %s %s", response.status_code, response.text)
             return False
     except Exception as e:
-        print(f"Error sending push notification: {e}")
+        logger.error("error sending push notification: %s", e)
         return False
 
 def send_yesterday_briefing(daily_data, config):
     """Send briefing push for yesterday's popular articles"""
+    import pytz
+
     local_tz = pytz.timezone(config["timezone"])
     # Use local timezone consistently
     local_now = datetime.now(local_tz)
@@ -295,25 +408,22 @@ def send_yesterday_briefing(daily_data, config):
     yesterday_articles = daily_data.get(yesterday_key, [])
     
     if not yesterday_articles:
-        print(f"No articles found for yesterday ({yesterday_key}), skipping briefing")
-        print(f"Available dates in daily_data: {list(daily_data.keys())}")
-        print(f"Local timezone: {config['timezone']}, Current local time: {local_now.strftime('%Y-%m-%d %H:%M:%S')}")
+        logger.warning("no articles found for yesterday (%s), skipping briefing (available dates: %s, %s local time %s)",
+                       yesterday_key, list(daily_data.keys()), config['timezone'], local_now.strftime('%Y-%m-%d %H:%M:%S'))
         return
     
     # Extract top 3 articles only
     top_3_articles = yesterday_articles[:3]
     
     if not top_3_articles:
-        print("No articles found, skipping briefing")
+        logger.warning("no articles found, skipping briefing")
         return
     
-    print(f"Processing top {len(top_3_articles)} articles for briefing")
-    
     # Generate briefing summary for top 3 articles in base language
     briefing_message = generate_briefing_summary(top_3_articles, config)
 
     if not briefing_message:
-        print("Failed to generate briefing summary")
+        logger.error("failed to generate briefing summary")
         return
 
     # Get base language and supported languages
@@ -325,21 +435,17 @@ def send_yesterday_briefing(daily_data, config):
         base_lang: briefing_message
     }
 
-    print(f"Base language briefing ({base_lang}): {briefing_message}")
-
     # Translate to other supported languages
     if lang_list:
-        print(f"Translating briefing to {len(lang_list)} additional languages")
         translations = translate_briefing(briefing_message, lang_list, config)
 
         if translations:
             # Merge translations with base language
             multilingual_briefing.update(translations)
-            print(f"Total languages in briefing: {len(multilingual_briefing)}")
         else:
-            print("Translation failed, sending base language only")
+            logger.warning("translation failed, sending base language only")
     else:
-        print("No additional languages to translate, sending base language only")
+        logger.info("no additional languages to translate, sending base language only")
 
     # Send push notification with yesterday's date
     yesterday_date = yesterday.strftime("%B %d") # e.g., "January 15"
@@ -351,24 +457,17 @@ def send_yesterday_briefing(daily_data, config):
         country_code = "sa"  # Convert saudi to sa for country code
 
     # Log data to be sent to server
-    print("\n" + "="*60)
-    print("Data to be sent to server")
-    print("="*60)
-    print(f"Title: {push_title}")
-    print(f"Country code: {country_code}")
-    print(f"\nMultilingual briefing messages:")
-    print("-"*60)
+    logger.info("briefing push %r for %s in %d languages", push_title, country_code, len(multilingual_briefing))
     for lang, msg in multilingual_briefing.items():
-        print(f"  [{lang}]: {msg}")
-    print("="*60 + "\n")
+        logger.info("briefing [%s]: %s", lang, msg)
 
     # Send push notification to server
     success = send_briefing_push(push_title, multilingual_briefing, country_code)
 
     if success:
-        print("Briefing push sent successfully")
+        summary_logger.info("briefing push sent successfully")
     else:
-        print("Failed to send briefing push")
+        summary_logger.error("failed to send briefing push")
 
 def main():
     if len(sys.argv) < 2:
@@ -376,40 +475,46 @@ def main():
         sys.exit(1)
 
     country = sys.argv[1].lower()
+    setup_logging()
 
     # Initialize Firebase
     firebase_cred_path = os.getenv("FIREBASE_CREDENTIAL_PATH")
     if not firebase_cred_path:
         raise ValueError("FIREBASE_CREDENTIAL_PATH is not set.")
     
-    if not firebase_admin._apps:
-        cred = credentials.Certificate(firebase_cred_path)
-        firebase_admin.initialize_app(cred)
+    init_firebase(firebase_cred_path)
 
     # Load country-specific configuration
     config_module = importlib.import_module(f"configs.{country}")
     config = config_module.config
 
-    print(f"Running daily popular pipeline for: {config['country']}")
+    summary_logger.info("running daily popular pipeline for %s", config['country'])
+    import pytz
     local_tz = pytz.timezone(config["timezone"])
-    print(f"START TIME: {datetime.now(local_tz).strftime('%Y-%m-%d %H:%M:%S')} {config['timezone']}")
+    summary_logger.info("start time: %s %s", datetime.now(local_tz).strftime('%Y-%m-%d %H:%M:%S'), config['timezone'])
 
     # Collect popular articles from the past 7 days
     days_back = config.get("daily_popular_days", 7)
     limit_per_day = config.get("daily_popular_limit", 10)
     
-    daily_data = get_daily_popular_articles(config, days_back=days_back, limit=limit_per_day)
+    # Finalized days are neither rescanned nor rewritten
+    state = load_daily_popular_state(config)
+    daily_data = get_daily_popular_articles(config, days_back=days_back, limit=limit_per_day,
+                                            finalized_through=state["finalized_through"])
     
-    # Save to Firestore
-    updated = save_daily_popular_to_firestore(daily_data, config)
+    # Save to Firestore (days whose articles did not change are skipped)
+    updated, settled = save_daily_popular_to_firestore(daily_data, config, state)
+    save_daily_popular_state(config, finalize_days(state, daily_data, settled, config))
     
-    print(f"총 {updated}개 날짜의 문서 업데이트 완료")
+    summary_logger.info("총 %d개 날짜의 문서 업데이트 완료", updated)
     
     # Send briefing push for yesterday's popular articles
-    print("Sending briefing push notification...")
     send_yesterday_briefing(daily_data, config)
+    print_usage_summary(write_run_report(config, extra={"pipeline": "daily_popular"}))
+    print_limiter_metrics()
+    print_cache_stats()
     
-    print("Daily popular pipeline DONE")
+    summary_logger.info("daily popular pipeline done")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,130 @@
+import random
+import re
+import zlib
+
+from pipeline.log import get_logger
+
+# Near-duplicate clustering of fetched articles (MinHash + LSH).
+# Wire stories republished by several outlets differ only in a few words; each
+# cluster is collapsed to one representative before the selection prompt is built.
+# Signatures are computed once per article and candidate pairs come from LSH
+# buckets, so the stage is linear in the number of articles.
+
+DEFAULT_NUM_PERM = 64  # MinHash permutations per signature
+DEFAULT_SHINGLE_SIZE = 2  # words per shingle
+MASK_64 = (1 << 64) - 1
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+logger = get_logger("dedup")
+
+
+def make_permutations(num_perm, seed=1):
+    """Fixed multiply-shift hash parameters (odd a, any b) so signatures are stable across runs"""
+    rng = random.Random(seed)
+    return [(rng.getrandbits(64) | 1, rng.getrandbits(64)) for _ in range(num_perm)]
+
+
+def tokenize(text):
+    """Lower-cased word tokens (Unicode aware, so Arabic and Cyrillic work too)"""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def shingles(text, size=DEFAULT_SHINGLE_SIZE):
+    """Hashed word n-grams of the normalized text (crc32 keeps them deterministic)"""
+    tokens = tokenize(text)
+    if len(tokens) < size:
+        return {zlib.crc32(" ".join(tokens).encode("utf-8"))} if tokens else set()
+    return {zlib.crc32(" ".join(tokens[i:i + size]).encode("utf-8")) for i in range(len(tokens) - size + 1)}
+
+
+def minhash(shingle_hashes, permutations):
+    if not shingle_hashes:
+        return None
+    # Multiply-shift hashing: the top 32 bits are the hash; shifting is monotonic,
+    # so it is applied once to the minimum
+    return tuple(min((a * x + b) & MASK_64 for x in shingle_hashes) >> 32 for a, b in permutations)
+
+
+def similarity(signature_a, signature_b):
+    """Estimated Jaccard similarity of two MinHash signatures"""
+    return sum(1 for a, b in zip(signature_a, signature_b) if a == b) / len(signature_a)
+
+
+def lsh_bands(num_perm, threshold):
+    """(bands, rows) with bands * rows <= num_perm whose S-curve midpoint is closest to threshold"""
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        midpoint = (1 / bands) ** (1 / rows)
+        if best is None or abs(midpoint - threshold) < best[0]:
+            best = (abs(midpoint - threshold), bands, rows)
+    return best[1], best[2]
+
+
+def article_text(article):
+    return f"{article.get('title') or ''} {article.get('description') or ''}"
+
+
+def pick_representative(cluster):
+    """Keep the copy with the most text to summarize"""
+    return max(cluster, key=lambda article: (bool(article.get("content")), len(article.get("content") or ""),
+                                             len(article.get("description") or "")))
+
+
+def cluster_near_duplicates(articles, threshold, num_perm=DEFAULT_NUM_PERM):
+    """
+    Group articles whose title + description MinHash similarity is >= threshold.
+    Returns a list of clusters (lists of articles) in first-seen order.
+    """
+    permutations = make_permutations(num_perm)
+    bands, rows = lsh_bands(num_perm, threshold)
+    signatures = [minhash(shingles(article_text(article)), permutations) for article in articles]
+
+    parent = list(range(len(articles)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Every bucket keeps all its members, so chains (B ~ A, C ~ B) join one cluster
+    # whatever the input order
+    buckets = {}
+    compared = set()
+    for index, signature in enumerate(signatures):
+        if signature is None:
+            continue
+        for band in range(bands):
+            members = buckets.setdefault((band, signature[band * rows:(band + 1) * rows]), [])
+            for other in members:
+                root_a, root_b = find(index), find(other)
+                if root_a == root_b or (other, index) in compared:
+                    continue
+                compared.add((other, index))
+                if similarity(signature, signatures[other]) >= threshold:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+            members.append(index)
+
+    clusters = {}
+    for index, article in enumerate(articles):
+        clusters.setdefault(find(index), []).append(article)
+    return list(clusters.values())
+
+
+def collapse_near_duplicates(articles, config):
+    """
+    Replace every near-duplicate cluster with one representative
+    (near_duplicate_threshold in the country config, None turns it off).
+    """
+    threshold = config.get("near_duplicate_threshold")
+    if not threshold or len(articles) < 2:
+        return articles
+
+    clusters = cluster_near_duplicates(articles, threshold, config.get("near_duplicate_num_perm", DEFAULT_NUM_PERM))
+    representatives = [pick_representative(cluster) for cluster in clusters]
+    duplicates = len(articles) - len(representatives)
+    logger.info("near-duplicate filter: %d articles -> %d (%d near-duplicates in %d clusters, threshold %s)",
+                len(articles), len(representatives), duplicates, sum(1 for cluster in clusters if len(cluster) > 1),
+                threshold)
+    return representatives
@@ -0,0 +1,146 @@
+import html
+import re
+import threading
+
+from pipeline.batching import estimate_tokens
+from pipeline.log import get_logger
+
+# Article body extraction before summarization.
+# Strips markup and boilerplate (share/subscribe lines, credits, repeated bylines),
+# drops duplicate paragraphs and keeps the lead paragraphs up to a token budget,
+# since news bodies put the essentials first. Only the prompt input changes; the
+# stored article keeps its original content.
+
+DEFAULT_TOKEN_BUDGET = 1500  # estimated input tokens of article body per summary prompt
+MIN_PARAGRAPH_CHARS = 25  # shorter paragraphs are kept only if they are not boilerplate-like
+BOILERPLATE_MAX_CHARS = 80  # keyword-led lines ("Read more: ...", "Photo: ...") longer than this are prose
+
+_SCRIPT_PATTERN = re.compile(r"<(script|style|noscript|figure|figcaption)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_BREAK_PATTERN = re.compile(r"<\s*(br|/p|/div|/h[1-6]|/li|/blockquote)\b[^>]*>", re.IGNORECASE)
+_TAG_PATTERN = re.compile(r"<[^>]+>")
+_URL_PATTERN = re.compile(r"https?://\S+")
+_SPACE_PATTERN = re.compile(r"[ \t ]+")
+_DATELINE_PATTERN = re.compile(r"^[A-ZÄÖÜА-ЯЁ][A-ZÄÖÜА-ЯЁ ,.]{2,}\s*[—–-]\s+")
+_SENTENCE_END = re.compile(r"(?<=[.!?。؟।])\s+")
+_ENDS_SENTENCE = re.compile(r"[.!?。؟।][\"'»”)]*$")
+_BOILERPLATE_PATTERN = re.compile(
+    r"^(read more|read also|related|advertisement|sponsored|subscribe|sign up|follow us|click here|share this|"
+    r"copyright|©|all rights reserved|photo|image|video|getty images|source:|lesen sie auch|mehr zum thema|"
+    r"anzeige|werbung|читайте также|подписывайтесь|реклама|فيديو|اقرأ أيضا|اقرأ أيضاً|تابعونا)(?=\W|$)",
+    re.IGNORECASE
+)
+
+_stats = {"articles": 0, "raw_tokens": 0, "extracted_tokens": 0, "truncated": 0}
+_stats_lock = threading.Lock()
+logger = get_logger("extract")
+summary_logger = get_logger("summary")
+
+
+def strip_markup(text):
+    """Remove HTML tags (and script/style/figure blocks), entities and URLs; keep paragraph breaks"""
+    text = _SCRIPT_PATTERN.sub(" ", text)
+    text = _BREAK_PATTERN.sub("\n", text)
+    text = html.unescape(_TAG_PATTERN.sub(" ", text))
+    text = _URL_PATTERN.sub("", text)
+    lines = [_SPACE_PATTERN.sub(" ", line).strip() for line in text.splitlines()]
+    return "\n".join(lines)
+
+
+def is_boilerplate(paragraph):
+    """
+    Short lines without sentence punctuation: bylines, credits and keyword-led lines
+    ("Read more: ...", "Photo: ..."). Anything ending like a sentence is prose
+    ("Video obtained by CBC News shows ...") and always kept.
+    """
+    if _ENDS_SENTENCE.search(paragraph):
+        return False
+    if len(paragraph) < MIN_PARAGRAPH_CHARS:
+        return True
+    return len(paragraph) <= BOILERPLATE_MAX_CHARS and bool(_BOILERPLATE_PATTERN.match(paragraph))
+
+
+def paragraph_key(paragraph):
+    """Comparison key: dateline ("OTTAWA — ") removed, case and punctuation ignored"""
+    return re.sub(r"\W+", " ", _DATELINE_PATTERN.sub("", paragraph).lower()).strip()
+
+
+def hard_cut(text, budget):
+    """Cut text to the budget at the last word boundary (any character when it has no spaces)"""
+    cut = text[:budget * 4 + 3]
+    if len(cut) < len(text) and " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut.strip()
+
+
+def truncate_to_budget(paragraphs, budget):
+    """
+    Keep paragraphs in order until the budget; the last one is cut at a sentence boundary,
+    or hard cut when not even the first sentence of the first paragraph fits
+    """
+    kept, used = [], 0
+    for paragraph in paragraphs:
+        tokens = estimate_tokens(paragraph)
+        if used + tokens <= budget:
+            kept.append(paragraph)
+            used += tokens
+            continue
+        partial = ""
+        for sentence in _SENTENCE_END.split(paragraph):
+            candidate = f"{partial} {sentence}".strip()
+            if used + estimate_tokens(candidate) > budget:
+                break
+            partial = candidate
+        if not partial and not kept:
+            partial = hard_cut(paragraph, budget)
+        if partial:
+            kept.append(partial)
+        return kept, True
+    return kept, False
+
+
+def extract_content(content, config, article_id=None):
+    """Clean, de-duplicated, token-budgeted article body for the summarization prompt"""
+    if not content or not config.get("extract_content", True):
+        return content
+
+    paragraphs, seen = [], set()
+    for paragraph in strip_markup(content).split("\n"):
+        if not paragraph or is_boilerplate(paragraph):
+            continue
+        key = paragraph_key(paragraph)
+        if key in seen:
+            continue
+        seen.add(key)
+        paragraphs.append(paragraph)
+
+    budget = config.get("content_token_budget", DEFAULT_TOKEN_BUDGET)
+    paragraphs, truncated = truncate_to_budget(paragraphs, budget)
+    extracted = "\n\n".join(paragraphs)
+    if not extracted:
+        # Everything looked like boilerplate; better to send the original (within budget) than nothing
+        paragraphs, truncated = truncate_to_budget([content], budget)
+        extracted = "\n\n".join(paragraphs)
+
+    raw_tokens, extracted_tokens = estimate_tokens(content), estimate_tokens(extracted)
+    with _stats_lock:
+        _stats["articles"] += 1
+        _stats["raw_tokens"] += raw_tokens
+        _stats["extracted_tokens"] += extracted_tokens
+        _stats["truncated"] += int(truncated)
+    logger.debug("content tokens: %d -> %d%s", raw_tokens, extracted_tokens, " (truncated)" if truncated else "")
+    return extracted
+
+
+def extraction_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def print_extraction_stats():
+    stats = extraction_stats()
+    if not stats["articles"]:
+        return
+    saved = stats["raw_tokens"] - stats["extracted_tokens"]
+    share = saved / stats["raw_tokens"] * 100 if stats["raw_tokens"] else 0.0
+    summary_logger.info("extract: articles=%d content tokens %d -> %d (-%.1f%%), truncated=%d", stats['articles'],
+                        stats['raw_tokens'], stats['extracted_tokens'], share, stats['truncated'])
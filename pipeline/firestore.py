@@ -1,34 +1,317 @@
-import firebase_admin
 import os
-from firebase_admin import credentials, firestore
 from datetime import datetime, timedelta
-import pytz
+import random
+import threading
+import time
+
+from pipeline.log import get_logger
+
+KNOWN_CHECK_BATCH_SIZE = 100  # document refs per get_all round trip
+DEFAULT_WRITE_BATCH_SIZE = 20  # writes per BatchWrite RPC (BulkWriter default, API max 500)
+MAX_WRITE_BATCH_SIZE = 500
+DEFAULT_WRITE_PARALLELISM = 2  # >1 sends batches concurrently, 1 sends them one by one
+DEFAULT_WRITE_OPS_PER_SECOND = 500  # BulkWriter ramp-up start (500/50/5 rule)
+DEFAULT_WRITE_ATTEMPTS = 5  # per document
+DEFAULT_STREAM_BATCH_SIZE = 5  # articles per streamed write batch
+DEFAULT_STREAM_MAX_WAIT = 1.0  # seconds a finished article waits for companions before it is written
+ALREADY_EXISTS_CODE = 6  # gRPC status codes
+RETRYABLE_WRITE_CODES = (4, 8, 10, 13, 14)  # DEADLINE_EXCEEDED, RESOURCE_EXHAUSTED, ABORTED, INTERNAL, UNAVAILABLE
+STATS_SHARD_COLLECTION = "shards"  # {info_doc}/{date}/shards/{n} when stats_shards > 0
+USAGE_STAT_KEYS = ("calls", "errors", "prompt_tokens", "output_tokens", "cost_usd")
+
+logger = get_logger("firestore")
+summary_logger = get_logger("summary")
+
+
+def init_firebase(cred_path):
+    """Initialize the default Firebase app once per process"""
+    import firebase_admin
+    from firebase_admin import credentials
+
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate(cred_path))
+
+
+def get_db(db=None):
+    """Firestore client (firebase_admin is imported on first use to keep cold starts short)"""
+    if db is not None:
+        return db
+    from firebase_admin import firestore
+    return firestore.client()
 
 def save_to_server(data, config):
-    """Save processed articles to Firestore"""
-    db = firestore.client()
-    collection_name = config["firestore_collection"]
-    
-    for article in data:
-        if not article:
-            continue
-        article_id = article["article_id"]
-        db.collection(collection_name).document(article_id).set(article)
-        print(f"update success: {article_id}")
-    
+    """Save processed articles to Firestore; returns the bulk write summary"""
+    db = get_db()
+
+    documents = {article["article_id"]: article for article in data if article}
+    summary = save_documents(config["firestore_collection"], documents, config, db,
+                             create=config.get("skip_known_articles", True), label="articles")
+
+    update_meta(config, db)
+    return summary
+
+
+def save_documents(collection_name, documents, config, db=None, create=False, label=None):
+    """
+    Write {doc_id: data} through a BulkWriter: batch_size writes per RPC, batches sent
+    in parallel, transient failures retried per document with linear backoff.
+    create=True never overwrites (existing documents are reported as skipped).
+    Returns {"written": [...], "skipped": [...], "failed": {doc_id: message}}.
+    """
+    summary = {"written": [], "skipped": [], "failed": {}}
+    if not documents:
+        return summary
+
+    db = get_db(db)
+    label = label or collection_name
+    parallelism = config.get("firestore_write_parallelism", DEFAULT_WRITE_PARALLELISM)
+    ops_per_second = config.get("firestore_write_ops_per_second", DEFAULT_WRITE_OPS_PER_SECOND)
+    max_attempts = config.get("firestore_write_attempts", DEFAULT_WRITE_ATTEMPTS)
+    lock = threading.Lock()
+
+    def on_result(reference, result, writer):
+        with lock:
+            summary["written"].append(reference.id)
+
+    def on_error(failure, writer):
+        doc_id = failure.operation.reference.id
+        if create and failure.code == ALREADY_EXISTS_CODE:
+            with lock:
+                summary["skipped"].append(doc_id)
+            return False
+        if failure.code in RETRYABLE_WRITE_CODES and failure.attempts < max_attempts - 1:
+            return True
+        with lock:
+            summary["failed"][doc_id] = failure.message
+        return False
+
+    from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions, SendMode
+
+    options = BulkWriterOptions(
+        initial_ops_per_second=ops_per_second,
+        max_ops_per_second=max(ops_per_second, DEFAULT_WRITE_OPS_PER_SECOND),
+        mode=SendMode.parallel if parallelism > 1 else SendMode.serial
+    )
+    writer = db.bulk_writer(options=options)
+    writer.batch_size = max(1, min(config.get("firestore_write_batch_size", DEFAULT_WRITE_BATCH_SIZE),
+                                   MAX_WRITE_BATCH_SIZE))
+    writer.on_write_result(on_result)
+    writer.on_write_error(on_error)
+
+    collection = db.collection(collection_name)
+    error = "no write result"
+    try:
+        for doc_id, data in documents.items():
+            if create:
+                writer.create(collection.document(doc_id), data)
+            else:
+                writer.set(collection.document(doc_id), data)
+        writer.flush()  # waits for pending batches and scheduled retries
+        writer.close()
+    except Exception as e:
+        logger.error("bulk write error (%s): %s", label, e)
+        error = str(e)
+
+    # Anything neither acknowledged nor reported by the writer is unaccounted for
+    accounted = set(summary["written"]) | set(summary["skipped"]) | set(summary["failed"])
+    for doc_id in documents:
+        if doc_id not in accounted:
+            summary["failed"][doc_id] = error
+
+    logger.info("bulk write (%s): %d written, %d already existed, %d failed", label, len(summary['written']),
+                len(summary['skipped']), len(summary['failed']))
+    for doc_id, message in summary["failed"].items():
+        logger.warning("write fail: %s (%s)", doc_id, message)
+    return summary
+
+
+class ArticleStream:
+    """
+    Streaming persistence: articles are written while the run is still processing
+    the rest. add() queues a finished article; a background thread writes whatever
+    has queued up as one save_documents batch once stream_batch_size articles are
+    waiting or the oldest has waited stream_max_wait seconds. close() writes the
+    remainder and returns the combined summary (lastUpdatedAt is left to the caller).
+    on_written(batch_summary) is called after every batch.
+    """
+
+    def __init__(self, config, db=None, on_written=None):
+        self.config = config
+        self.db = get_db(db)
+        self.on_written = on_written
+        self.batch_size = max(1, config.get("stream_batch_size", DEFAULT_STREAM_BATCH_SIZE))
+        self.max_wait = config.get("stream_max_wait", DEFAULT_STREAM_MAX_WAIT)
+        self.queue = []
+        self.closed = False
+        self.cond = threading.Condition()
+        self.summary = {"written": [], "skipped": [], "failed": {}}
+        self.stats = {"batches": 0, "first_write": None}
+        self.started = time.monotonic()
+        self.thread = threading.Thread(target=self._run, name="article-stream", daemon=True)
+        self.thread.start()
+
+    def add(self, article):
+        with self.cond:
+            self.queue.append((time.monotonic(), article))
+            self.cond.notify()
+
+    def _ready(self):
+        if not self.queue:
+            return False
+        return (self.closed or len(self.queue) >= self.batch_size
+                or time.monotonic() - self.queue[0][0] >= self.max_wait)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self._ready():
+                    if self.closed:
+                        return
+                    if self.queue:
+                        remaining = self.max_wait - (time.monotonic() - self.queue[0][0])
+                        self.cond.wait(timeout=max(remaining, 0.01))
+                    else:
+                        self.cond.wait()
+                batch = [article for _, article in self.queue[:self.batch_size]]
+                del self.queue[:self.batch_size]
+            self._write(batch)
+
+    def _write(self, batch):
+        documents = {article["article_id"]: article for article in batch}
+        result = save_documents(self.config["firestore_collection"], documents, self.config, self.db,
+                                create=self.config.get("skip_known_articles", True), label="articles (streamed)")
+        self.stats["batches"] += 1
+        if self.stats["first_write"] is None:
+            self.stats["first_write"] = time.monotonic() - self.started
+        self.summary["written"] += result["written"]
+        self.summary["skipped"] += result["skipped"]
+        self.summary["failed"].update(result["failed"])
+        if self.on_written:
+            self.on_written(result)
+
+    def close(self):
+        """Write everything still queued and stop the writer thread"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
+        if self.stats["first_write"] is not None:
+            summary_logger.info("streamed writes: %d articles in %d batches, first write %.1fs after start",
+                                len(self.summary["written"]), self.stats["batches"], self.stats["first_write"])
+        return self.summary
+
+
+def save_article(article, config, db=None):
+    """Write a single processed article document"""
+    from google.api_core.exceptions import AlreadyExists
+
+    db = get_db(db)
+    article_id = article["article_id"]
+    doc_ref = db.collection(config["firestore_collection"]).document(article_id)
+
+    if not config.get("skip_known_articles", True):
+        doc_ref.set(article)
+        logger.debug("update success: %s", article_id)
+        return
+
+    # Never overwrite a published article (would reset clicked_cnt)
+    try:
+        doc_ref.create(article)
+        logger.debug("update success: %s", article_id)
+    except AlreadyExists:
+        logger.info("already published, not overwritten: %s", article_id)
+
+
+def load_pending_translations(config, limit, db=None):
+    """Published articles that still have "pending" languages (see news_pipeline.backfill_translations)"""
+    db = get_db(db)
+    try:
+        query = db.collection(config["firestore_collection"]).where("translation_pending", "==", True).limit(limit)
+        return [{**snapshot.to_dict(), "article_id": snapshot.id} for snapshot in query.stream()]
+    except Exception as e:
+        logger.warning("pending translation query fail: %s", e)
+        return []
+
+
+def save_backfilled_translations(article_id, translations, status, attempts, config, db=None):
+    """Merge new translations and the per-language status into a published article (clicked_cnt untouched)"""
+    db = get_db(db)
+    try:
+        db.collection(config["firestore_collection"]).document(article_id).set({
+            "translations": translations,
+            "translation_status": status,
+            "translation_pending": "pending" in status.values(),
+            "translation_backfill_attempts": attempts
+        }, merge=True)
+        return True
+    except Exception as e:
+        logger.warning("translation backfill save fail: %s", e)
+        return False
+
+
+def filter_known_articles(articles, config, db=None):
+    """
+    Drop articles whose article_id already exists in the country collection
+    (and duplicates within this fetch) using batched get_all reads.
+    """
+    if not articles or not config.get("skip_known_articles", True):
+        return articles
+
+    db = get_db(db)
+    collection = db.collection(config["firestore_collection"])
+    batch_size = config.get("known_check_batch_size", KNOWN_CHECK_BATCH_SIZE)
+
+    unique_articles = {}
+    for article in articles:
+        article_id = article.get("article_id")
+        if article_id and article_id not in unique_articles:
+            unique_articles[article_id] = article
+
+    known_ids = set()
+    article_ids = list(unique_articles)
+    try:
+        for start in range(0, len(article_ids), batch_size):
+            refs = [collection.document(article_id) for article_id in article_ids[start:start + batch_size]]
+            # Project a single field so only existence crosses the wire
+            for snapshot in db.get_all(refs, field_paths=["article_id"]):
+                if snapshot.exists:
+                    known_ids.add(snapshot.id)
+    except Exception as e:
+        logger.warning("known article check failed, processing all fetched articles: %s", e)
+        return list(unique_articles.values())
+
+    new_articles = [article for article_id, article in unique_articles.items() if article_id not in known_ids]
+    logger.info("known article filter: %d fetched, %d duplicate, %d already published, %d new", len(articles),
+                len(articles) - len(unique_articles), len(known_ids), len(new_articles))
+    return new_articles
+
+
+def update_meta(config, db=None):
+    """Stamp lastUpdatedAt on the country meta document"""
+    db = get_db(db)
     try:
         meta_collection = config["info_doc"]
         db.collection(meta_collection).document("meta").set({
             "lastUpdatedAt": datetime.now()
         }, merge=True)
-        print("meta data updated")
+        logger.info("meta data updated")
     except Exception as e:
-        print(f"metadata update fail: {e}")
+        logger.warning("metadata update fail: %s", e)
 
 
-def save_article_stats(total_articles, uploaded_articles, config):
-    """Save article statistics to Firestore with local timezone and update daily totals"""
-    db = firestore.client()
+def save_article_stats(total_articles, uploaded_articles, config, db=None, usage=None):
+    """
+    Save this run's hourly stats and add it to the daily totals in one write.
+    Totals use server-side increments, so overlapping runs never lose updates.
+    With stats_shards > 0 the write goes to a random shard document instead
+    (see read_sharded_stats), so concurrent runs do not contend on one document.
+    usage (a usage.build_run_report report) adds per-stage Gemini calls, tokens
+    and cost to both the hourly entry and the daily totals.
+    """
+    import pytz
+    from firebase_admin import firestore
+
+    db = get_db(db)
     info_collection = config["info_doc"]
     
     # Get local time based on config timezone
@@ -41,61 +324,60 @@ def save_article_stats(total_articles, uploaded_articles, config):
     
     # Document structure: {date}/{hour}
     doc_ref = db.collection(info_collection).document(date_str)
-    
-    # Update hourly stats
-    doc_ref.set({
-        f"hours.{hour_str}": {
-            "total_articles": total_articles,
-            "uploaded_articles": uploaded_articles,
-            "timestamp": local_time
-        }
-    }, merge=True)
-    
-    print(f"Stats saved: {date_str} {hour_str}:00 - Total: {total_articles}, Uploaded: {uploaded_articles}")
-    
-    # Update daily totals based on current result folder values
-    update_daily_totals(db, info_collection, date_str, total_articles, uploaded_articles)
+    shards = config.get("stats_shards", 0)
 
+    hourly = {
+        "total_articles": total_articles,
+        "uploaded_articles": uploaded_articles,
+        "timestamp": local_time
+    }
+    result = {
+        "total_articles": firestore.Increment(total_articles),
+        "uploaded_articles": firestore.Increment(uploaded_articles),
+        "date": date_str,
+        "last_updated": datetime.now()
+    }
+    if usage:
+        hourly["usage"] = {
+            stage: {**{key: stats[key] for key in USAGE_STAT_KEYS}, "p95_ms": stats["latency_ms"]["p95"]}
+            for stage, stats in usage["stages"].items()
+        }
+        result["usage"] = {
+            stage: {key: firestore.Increment(stats[key]) for key in USAGE_STAT_KEYS}
+            for stage, stats in usage["stages"].items()
+        }
 
-def update_daily_totals(db, info_collection, date_str, new_total_articles, new_uploaded_articles):
-    """Update daily totals by reading existing result and adding new values"""
     try:
-        doc_ref = db.collection(info_collection).document(date_str)
-        doc = doc_ref.get()
-        
-        # Initialize totals
-        current_total = 0
-        current_uploaded = 0
-        
-        # If document exists and has result data, read existing totals
-        if doc.exists:
-            data = doc.to_dict()
-            result_data = data.get('result', {})
-            
-            if result_data:
-                current_total = result_data.get('total_articles', 0)
-                current_uploaded = result_data.get('uploaded_articles', 0)
-                print(f"Found existing totals for {date_str}: Total: {current_total}, Uploaded: {current_uploaded}")
-        
-        # Add new values to existing totals
-        updated_total = current_total + new_total_articles
-        updated_uploaded = current_uploaded + new_uploaded_articles
-        
-        # Save updated totals to result
-        result_data = {
-            "total_articles": updated_total,
-            "uploaded_articles": updated_uploaded,
-            "date": date_str,
-            "last_updated": datetime.now()
-        }
-        
-        doc_ref.set({
-            "result": result_data
-        }, merge=True)
-        
-        print(f"Daily totals updated for {date_str}: Total: {updated_total} (+{new_total_articles}), Uploaded: {updated_uploaded} (+{new_uploaded_articles})")
-        
+        if shards:
+            hourly.update({
+                "total_articles": firestore.Increment(total_articles),
+                "uploaded_articles": firestore.Increment(uploaded_articles),
+                "runs": firestore.Increment(1)
+            })
+            shard_ref = doc_ref.collection(STATS_SHARD_COLLECTION).document(str(random.randrange(shards)))
+            shard_ref.set({"hours": {hour_str: hourly}, "result": result}, merge=True)
+        else:
+            doc_ref.set({f"hours.{hour_str}": hourly, "result": result}, merge=True)
     except Exception as e:
-        print(f"Error updating daily totals: {e}")
-        import traceback
-        print(f"DEBUG: Full traceback: {traceback.format_exc()}")
\ No newline at end of file
+        logger.warning("stats save fail: %s", e)
+        return
+
+    summary_logger.info("stats saved: %s %s:00 - total: %d, uploaded: %d%s", date_str, hour_str, total_articles,
+                        uploaded_articles, f" (shard of {shards})" if shards else "")
+
+
+def read_sharded_stats(config, date_str, db=None):
+    """Sum a day's stat shards into {"hours": {HH: {...}}, "result": {...}}"""
+    db = get_db(db)
+    shards = db.collection(config["info_doc"]).document(date_str).collection(STATS_SHARD_COLLECTION)
+    hours = {}
+    result = {"total_articles": 0, "uploaded_articles": 0, "date": date_str}
+    for snapshot in shards.stream():
+        data = snapshot.to_dict()
+        for hour, stats in (data.get("hours") or {}).items():
+            totals = hours.setdefault(hour, {"total_articles": 0, "uploaded_articles": 0, "runs": 0})
+            for key in totals:
+                totals[key] += stats.get(key, 0)
+        for key in ("total_articles", "uploaded_articles"):
+            result[key] += (data.get("result") or {}).get(key, 0)
+    return {"hours": hours, "result": result}
@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+import time
+
+from pipeline.ratelimit import LimiterSlot, get_limiter
+from pipeline.resilience import call_with_resilience, call_with_resilience_async
+from pipeline.llm_cache import cache_key, get_cache
+from pipeline.usage import record_call
+
+# Process-wide Gemini clients, one per API key, shared by every pipeline module.
+# Reusing the client keeps HTTP keep-alive connections and TLS sessions warm and
+# avoids mutating os.environ["GOOGLE_API_KEY"] from worker threads.
+# google.genai and httpx are imported on first use to keep cold starts short.
+
+DEFAULT_MODEL = "gemini-2.5-flash-lite"
+DEFAULT_MAX_CONNECTIONS = 64
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 32
+DEFAULT_KEEPALIVE_EXPIRY = 60.0  # seconds an idle connection stays in the pool
+DEFAULT_TIMEOUT = 90.0  # seconds per Gemini request
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_api_key(config):
+    """Gemini API key from config, falling back to GEMINI_API_KEY"""
+    return config.get("api_key") or os.getenv("GEMINI_API_KEY")
+
+
+def build_http_options(config=None):
+    """HTTP options with a tunable connection pool for both sync and async clients"""
+    import httpx
+    from google.genai import types
+
+    config = config or {}
+    max_connections = int(config.get("gemini_max_connections")
+                          or os.getenv("GEMINI_MAX_CONNECTIONS") or DEFAULT_MAX_CONNECTIONS)
+    max_keepalive = int(config.get("gemini_max_keepalive_connections")
+                        or os.getenv("GEMINI_MAX_KEEPALIVE_CONNECTIONS") or DEFAULT_MAX_KEEPALIVE_CONNECTIONS)
+    pool_args = {
+        "limits": httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY
+        )
+    }
+    timeout = float(config.get("gemini_timeout", DEFAULT_TIMEOUT))
+    options = {
+        "timeout": int(timeout * 1000),  # HttpOptions.timeout is in milliseconds
+        "client_args": pool_args,
+        "async_client_args": dict(pool_args)
+    }
+    if config.get("gemini_base_url"):
+        options["base_url"] = config["gemini_base_url"]
+    return types.HttpOptions(**options)
+
+
+def get_client(api_key, config=None):
+    """Return the shared genai.Client for api_key, creating it on first use (thread-safe)"""
+    client = _clients.get(api_key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            from google import genai
+            client = genai.Client(api_key=api_key, http_options=build_http_options(config))
+            _clients[api_key] = client
+        return client
+
+
+def generate_content(config, contents, stage, generation_config=None, model=DEFAULT_MODEL, cache_check=None,
+                     lang=None):
+    """
+    Send one generate_content request through the shared client and rate limiter.
+    stage ("select", "summarize", "translate", "briefing") is the fair-queuing flow
+    together with the config's country. Retryable failures are retried with backoff
+    behind the "gemini" circuit breaker, and slow calls are hedged past their p95.
+    Responses are served from / stored in the LLM cache; cache_check(text) decides
+    whether a response is well-formed enough to keep. Tokens and wall time are
+    recorded per stage (and lang, for translations) for the run report.
+    """
+    api_key = get_api_key(config)
+    client = get_client(api_key, config)
+    limiter = get_limiter(api_key, config)
+
+    # The limiter slot is taken outside the timed / hedged request (see LimiterSlot)
+    slot = LimiterSlot(limiter, (config.get("country"), stage))
+
+    def attempt():
+        return client.models.generate_content(model=model, contents=contents, config=generation_config)
+
+    def call():
+        return call_with_resilience(attempt, "gemini", config, hedge=True, latency_key=f"gemini:{stage}", slot=slot)
+
+    cache = get_cache(config)
+    start = time.monotonic()
+    try:
+        if cache is None:
+            response = call()
+        else:
+            response = cache.get_or_compute(cache_key(model, contents, generation_config), call, cache_check)
+    except Exception as e:
+        record_call(config, stage, model, time.monotonic() - start, error=e, lang=lang)
+        raise
+    record_call(config, stage, model, time.monotonic() - start, response, lang=lang)
+    return response
+
+
+async def generate_content_async(config, contents, stage, generation_config=None, model=DEFAULT_MODEL,
+                                 cache_check=None, lang=None):
+    """Async variant of generate_content using the shared client's aio surface"""
+    api_key = get_api_key(config)
+    client = get_client(api_key, config)
+    limiter = get_limiter(api_key, config)
+
+    slot = LimiterSlot(limiter, (config.get("country"), stage))
+
+    def attempt():
+        return client.aio.models.generate_content(model=model, contents=contents, config=generation_config)
+
+    def call():
+        return call_with_resilience_async(attempt, "gemini", config, hedge=True, latency_key=f"gemini:{stage}",
+                                          slot=slot)
+
+    cache = get_cache(config)
+    start = time.monotonic()
+    try:
+        if cache is None:
+            response = await call()
+        else:
+            response = await cache.get_or_compute_async(cache_key(model, contents, generation_config), call,
+                                                        cache_check)
+    except Exception as e:
+        record_call(config, stage, model, time.monotonic() - start, error=e, lang=lang)
+        raise
+    record_call(config, stage, model, time.monotonic() - start, response, lang=lang)
+    return response
+
+
+def json_config(schema):
+    """GenerateContentConfig for a JSON response constrained to schema"""
+    from google.genai import types
+    return types.GenerateContentConfig(response_mime_type="application/json", response_json_schema=schema)
+
+
+def is_json(text):
+    """cache_check for schema-constrained JSON responses"""
+    try:
+        json.loads(text)
+        return True
+    except ValueError:
+        return False
+
+
+def has_fields(*fields):
+    """cache_check factory for "Field: value" text responses (SKIP is also kept)"""
+    def check(text):
+        return text.strip().upper() == "SKIP" or all(field in text for field in fields)
+    return check
+
+
+def reset_clients():
+    """Drop every cached client (used by benchmarks and after fork)"""
+    with _clients_lock:
+        _clients.clear()
@@ -0,0 +1,200 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+from pipeline.log import get_logger
+
+# Crash-safe write-ahead journal of one news pipeline run (.cache/journal/<country>.jsonl).
+# Each completed stage is appended and fsynced as one JSON line: fetched, selected,
+# summarized, translated (per language) and persisted. `news_pipeline.py <country> --resume`
+# replays the journal of an unfinished run: fetching and selection are skipped, journaled
+# summaries and translations are reused and persisted articles are not processed again.
+# The file is removed once every processed article is persisted. The workflows save
+# .cache/ even when a job fails or times out, so the next job can resume from it.
+
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   ".cache", "journal")
+
+_active = None
+logger = get_logger("journal")
+summary_logger = get_logger("summary")
+
+
+def empty_journal_state():
+    return {
+        "fetched": None,        # {"total_available": n, "crawl_next": {...}} once fetching finished
+        "selected": None,       # article dicts chosen for processing
+        "summaries": {},        # article_id -> ai_summary
+        "translations": {},     # article_id -> {lang: translation}
+        "persisted": set()
+    }
+
+
+class RunJournal:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.state = empty_journal_state()
+        self.resumed_persisted = 0
+        self.file = None
+
+    def replay(self):
+        """Rebuild the state from the journal file; a torn last line (crash mid-write) is ignored"""
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning("ignoring torn journal line")
+                    continue
+                self.apply(entry)
+
+    def apply(self, entry):
+        state = self.state
+        stage = entry.get("stage")
+        article_id = entry.get("article_id")
+        if stage == "fetched":
+            state["fetched"] = {"total_available": entry["total_available"], "crawl_next": entry.get("crawl_next")}
+        elif stage == "selected":
+            state["selected"] = state["selected"] or []
+            state["selected"].extend(entry["articles"])
+        elif stage == "summarized":
+            state["summaries"][article_id] = entry["summary"]
+        elif stage == "translated":
+            state["translations"].setdefault(article_id, {})[entry["lang"]] = entry["translation"]
+        elif stage == "persisted":
+            state["persisted"].update(entry["article_ids"])
+
+    def open(self, resume):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.file = open(self.path, "a" if resume else "w", encoding="utf-8")
+
+    def append(self, entry):
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        with self.lock:
+            self.apply(json.loads(line))
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def unpersisted(self):
+        """Articles that finished processing but were never written"""
+        return [article_id for article_id in self.state["summaries"] if article_id not in self.state["persisted"]]
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+def journal_path(config):
+    directory = os.getenv("RUN_JOURNAL_DIR", DEFAULT_JOURNAL_DIR)
+    return os.path.join(directory, f"{config['country'].lower()}.jsonl")
+
+
+def open_journal(config, resume=False):
+    """Start this run's journal; with resume, continue the unfinished run's journal if there is one"""
+    global _active
+    if not config.get("run_journal", True):
+        return None
+    journal = RunJournal(journal_path(config))
+    exists = os.path.exists(journal.path) and os.path.getsize(journal.path) > 0
+    if resume and exists:
+        journal.replay()
+        state = journal.state
+        journal.resumed_persisted = len(state["persisted"])
+        summary_logger.info("resuming unfinished run: %s selected, %d summarized, %d translations, %d persisted",
+                            len(state["selected"]) if state["selected"] is not None else "not yet",
+                            len(state["summaries"]), sum(map(len, state["translations"].values())),
+                            len(state["persisted"]))
+    elif resume:
+        summary_logger.info("no unfinished run to resume, starting fresh")
+    elif exists:
+        logger.warning("discarding the journal of an unfinished run (use --resume to continue it)")
+    try:
+        journal.open(resume and exists)
+    except OSError as e:
+        logger.warning("run journal unavailable, running without it: %s", e)
+        return None
+    if not (resume and exists):
+        journal.append({"stage": "started", "at": datetime.now().isoformat()})
+    _active = journal
+    return journal
+
+
+def close_journal():
+    """Remove the journal when every processed article is persisted; otherwise keep it for --resume"""
+    global _active
+    journal, _active = _active, None
+    if journal is None:
+        return
+    journal.close()
+    unpersisted = journal.unpersisted()
+    if unpersisted:
+        summary_logger.info("run journal kept (%d processed articles not persisted): rerun with --resume",
+                            len(unpersisted))
+        return
+    try:
+        os.remove(journal.path)
+    except OSError as e:
+        logger.warning("run journal cleanup fail: %s", e)
+
+
+def record(stage, article_id=None, **data):
+    """Append one completed stage to the active journal (no-op without one)"""
+    journal = _active
+    if journal is None:
+        return
+    entry = {"stage": stage, **data}
+    if article_id is not None:
+        entry["article_id"] = article_id
+    try:
+        journal.append(entry)
+    except Exception as e:
+        logger.warning("journal write fail (%s): %s", stage, e)
+
+
+def record_summary(article_id, ai_summary):
+    """Journal a summary; fused translations are journaled per language like the others"""
+    record("summarized", article_id, summary={key: value for key, value in ai_summary.items() if key != "translations"})
+    for lang, translation in (ai_summary.get("translations") or {}).items():
+        record("translated", article_id, lang=lang, translation=translation)
+
+
+def record_persisted(write_summary):
+    """Journal the articles of a save_documents summary that are now in Firestore"""
+    record("persisted", article_ids=write_summary["written"] + write_summary["skipped"])
+
+
+def restored_article(article_id):
+    """(summary, {lang: translation}) journaled for article_id by the resumed run"""
+    journal = _active
+    if journal is None:
+        return None, {}
+    with journal.lock:
+        return (journal.state["summaries"].get(article_id),
+                dict(journal.state["translations"].get(article_id, {})))
+
+
+def restored_selection(crawl_state=None):
+    """
+    (articles still to process, total_available) when the resumed run had finished
+    fetching and selection, else None. Restores the run's crawl watermark into crawl_state.
+    """
+    journal = _active
+    if journal is None or journal.state["fetched"] is None or journal.state["selected"] is None:
+        return None
+    fetched = journal.state["fetched"]
+    if crawl_state is not None and fetched.get("crawl_next"):
+        crawl_state["next"] = fetched["crawl_next"]
+    selected = {article["article_id"]: article for article in journal.state["selected"]}
+    articles = [article for article_id, article in selected.items() if article_id not in journal.state["persisted"]]
+    logger.info("resumed selection: %d articles left (%d already persisted)", len(articles),
+                len(selected) - len(articles))
+    return articles, fetched["total_available"]
+
+
+def previously_persisted():
+    """Articles the resumed run had already written"""
+    return _active.resumed_persisted if _active else 0
@@ -0,0 +1,205 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from pipeline.log import get_logger
+
+# On-disk, content-addressed cache for Gemini responses (SQLite).
+# Keys are sha256(model + prompt + generation config), entries expire after a TTL and
+# the least recently used ones are evicted past a size budget. Concurrent identical
+# requests are coalesced so only one of them reaches the API (single flight).
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                  ".cache", "llm_cache.sqlite3")
+DEFAULT_TTL = 2 * 24 * 3600  # seconds
+DEFAULT_MAX_MB = 200
+
+_caches = {}
+_caches_lock = threading.Lock()
+logger = get_logger("llm_cache")
+summary_logger = get_logger("summary")
+
+
+class CachedResponse:
+    """Stand-in for a GenerateContentResponse served from the cache"""
+
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+        self.cached = True
+
+
+def cache_key(model, contents, generation_config=None):
+    payload = {"model": model, "contents": contents}
+    if generation_config is not None:
+        payload["config"] = generation_config.model_dump(mode="json", exclude_none=True)
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "stored": 0, "evicted": 0}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed_at)")
+        self.evict()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            self.db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key, value):
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now)
+            )
+            self.stats["stored"] += 1
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes"""
+        with self.lock:
+            cursor = self.db.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl,))
+            evicted = cursor.rowcount
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                for key, size in self.db.execute("SELECT key, size FROM entries ORDER BY accessed_at").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    total -= size
+                    evicted += 1
+            self.stats["evicted"] += evicted
+
+    def _join_or_lead(self, key):
+        """Return (future, is_leader) for key, registering a new in-flight call if needed"""
+        with self.lock:
+            future = self.inflight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                return future, False
+            future = Future()
+            self.inflight[key] = future
+            self.stats["misses"] += 1
+            return future, True
+
+    def _finish(self, key, future, response=None, error=None, cache_check=None):
+        with self.lock:
+            self.inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+            return
+        future.set_result(response)
+        text = getattr(response, "text", None)
+        if text and (cache_check is None or cache_check(text)):
+            self.set(key, text)
+
+    def _lookup(self, key):
+        text = self.get(key)
+        if text is None:
+            return None
+        with self.lock:
+            self.stats["hits"] += 1
+        return CachedResponse(text)
+
+    @staticmethod
+    def _shared(response):
+        """Coalesced callers get a copy without usage, so the tokens are accounted once"""
+        text = getattr(response, "text", None)
+        return CachedResponse(text) if text is not None else response
+
+    def get_or_compute(self, key, compute, cache_check=None):
+        """Serve key from disk, join an identical in-flight call, or run compute()"""
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+
+        future, leader = self._join_or_lead(key)
+        if not leader:
+            return self._shared(future.result())
+
+        try:
+            response = compute()
+        except Exception as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, response, cache_check=cache_check)
+        return response
+
+    async def get_or_compute_async(self, key, compute, cache_check=None):
+        """Async variant of get_or_compute; compute() returns a coroutine"""
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+
+        future, leader = self._join_or_lead(key)
+        if not leader:
+            return self._shared(await asyncio.wrap_future(future))
+
+        try:
+            response = await compute()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, response, cache_check=cache_check)
+        return response
+
+
+def get_cache(config):
+    """Shared cache for the configured path, or None when llm_cache is disabled"""
+    if not config.get("llm_cache", True) or os.getenv("LLM_CACHE_DISABLED"):
+        return None
+    path = config.get("llm_cache_path") or os.getenv("LLM_CACHE_PATH") or DEFAULT_CACHE_PATH
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            try:
+                cache = LLMCache(
+                    path,
+                    ttl=config.get("llm_cache_ttl", DEFAULT_TTL),
+                    max_bytes=int(config.get("llm_cache_max_mb", DEFAULT_MAX_MB) * 1024 * 1024)
+                )
+            except sqlite3.Error as e:
+                logger.warning("llm_cache disabled, cannot open %s: %s", path, e)
+                return None
+            _caches[path] = cache
+        return cache
+
+
+def print_cache_stats():
+    """Print hit/miss counters for every cache used in this run"""
+    for path, cache in _caches.items():
+        cache.evict()
+        stats = cache.stats
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        hit_rate = (stats["hits"] + stats["coalesced"]) / lookups * 100 if lookups else 0.0
+        summary_logger.info("llm_cache %s: hits=%d misses=%d coalesced=%d stored=%d evicted=%d hit_rate=%.1f%%",
+                            path, stats['hits'], stats['misses'], stats['coalesced'], stats['stored'],
+                            stats['evicted'], hit_rate)
@@ -0,0 +1,118 @@
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+
+# Structured logging for the pipelines.
+# Records carry the current article / stage / language context (log_context),
+# DEBUG records from hot loops are sampled per message template, and quiet mode
+# (LOG_QUIET=1 or --quiet) keeps only warnings plus the end-of-run summaries.
+# LOG_LEVEL overrides the level and LOG_FORMAT=json emits one JSON object per line.
+
+DEFAULT_LEVEL = "INFO"
+DEFAULT_DEBUG_SAMPLE_EVERY = 20  # emit 1 in N DEBUG records per message template (1 = all)
+ROOT_LOGGER = "pipeline"
+SUMMARY_LOGGER = "pipeline.summary"
+
+_context = contextvars.ContextVar("log_context", default={})
+_setup_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def log_context(**fields):
+    """Attach fields (article_id, stage, lang, ...) to every record logged inside the block"""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        record.context = _context.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Pass the first DEBUG record of each message template, then one in every `every`"""
+
+    def __init__(self, every=DEFAULT_DEBUG_SAMPLE_EVERY):
+        super().__init__()
+        self.every = every
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.every <= 1:
+            return True
+        key = (record.name, record.msg)
+        with self.lock:
+            count = self.counts.get(key, 0)
+            self.counts[key] = count + 1
+        return count % self.every == 0
+
+
+class KeyValueFormatter(logging.Formatter):
+    """`HH:MM:SS LEVEL module key=value ... message`"""
+
+    def format(self, record):
+        context = " ".join(f"{key}={value}" for key, value in getattr(record, "context", {}).items())
+        name = record.name[len(ROOT_LOGGER) + 1:] if record.name.startswith(ROOT_LOGGER + ".") else record.name
+        line = f"{self.formatTime(record, '%H:%M:%S')} {record.levelname:<7} {name} "
+        line += f"{context} {record.getMessage()}" if context else record.getMessage()
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            **getattr(record, "context", {}),
+            "msg": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(quiet=None, level=None, fmt=None, sample_every=None):
+    """Configure the `pipeline` logger tree (called by each entry point, safe to repeat)"""
+    quiet = bool(os.getenv("LOG_QUIET")) if quiet is None else quiet
+    level = (level or os.getenv("LOG_LEVEL") or ("WARNING" if quiet else DEFAULT_LEVEL)).upper()
+    fmt = fmt or os.getenv("LOG_FORMAT", "text")
+    if sample_every is None:
+        sample_every = int(os.getenv("LOG_DEBUG_SAMPLE_EVERY", DEFAULT_DEBUG_SAMPLE_EVERY))
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else KeyValueFormatter())
+    handler.addFilter(ContextFilter())
+    handler.addFilter(SamplingFilter(sample_every))
+
+    with _setup_lock:
+        root = logging.getLogger(ROOT_LOGGER)
+        root.handlers = [handler]
+        root.setLevel(level)
+        root.propagate = False
+        # Run summaries stay visible in quiet mode
+        logging.getLogger(SUMMARY_LOGGER).setLevel(logging.INFO if quiet else logging.NOTSET)
+
+
+def get_logger(name):
+    """Logger under `pipeline.`; installs the default setup if no entry point has yet"""
+    root = logging.getLogger(ROOT_LOGGER)
+    if not root.handlers:
+        setup_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def submit_with_context(executor, fn, *args, **kwargs):
+    """executor.submit that carries the caller's log context into the worker thread"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
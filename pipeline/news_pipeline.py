@@ -1,93 +1,154 @@
+import argparse
+import asyncio
 import importlib
 import sys
 import os
 from datetime import datetime
-import pytz
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Add parent directory to Python path for absolute imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Initialize Firebase first before importing other modules
-import firebase_admin
-from firebase_admin import credentials, firestore
-
-from pipeline.summarize import generate_ai_summary
-from pipeline.translate import translate_ai_summary
-from pipeline.firestore import save_to_server, save_article_stats
-from pipeline.util import get_page_articles, fetch_articles, select_top_articles
+from pipeline.summarize import generate_ai_summary, generate_fused_summary
+from pipeline.translate import translate_languages
+from pipeline.firestore import (ArticleStream, init_firebase, save_to_server, save_article_stats, update_meta,
+                                load_pending_translations, save_backfilled_translations)
+from pipeline.crawl_state import load_crawl_state, mark_failed, save_crawl_state
+from pipeline.batching import batching_enabled, print_batch_stats
+from pipeline.extract import extraction_stats, print_extraction_stats
+from pipeline.ratelimit import print_limiter_metrics
+from pipeline.llm_cache import print_cache_stats
+from pipeline.usage import print_usage_summary, write_run_report
+from pipeline.journal import open_journal, close_journal, record_persisted, record_summary, previously_persisted
+from pipeline.processing import (prompt_content, restore, accept_fused, missing_languages, journal_translation,
+                                 summary_content, build_article, processing_failed, failed_articles)
+from pipeline.log import get_logger, log_context, setup_logging
+from pipeline.util import fetch_articles
+
+logger = get_logger("news")
+summary_logger = get_logger("summary")
+
+DEFAULT_BACKFILL_LIMIT = 20  # articles with pending languages revisited per run
+DEFAULT_BACKFILL_ATTEMPTS = 3  # runs before a pending language is marked "failed"
 
 def process_article(article, config, api_key):
-    print(f"=== PROCESS_ARTICLE CALLED: {article.get('article_id')} ===")
-    content = article.get("content")
-    title = article.get("title")
-    server_ai_summary = article.get("ai_summary")
-    print(f"Article data: title={bool(title)}, content={bool(content)}, server_ai_summary={bool(server_ai_summary)}")
+    # Every log record of this article (translation threads included) carries its ID
+    with log_context(article_id=article.get("article_id")):
+        return _process_article(article, config, api_key)
 
-    if not title:
-        print(f"no title: article ID {article['article_id']}")
-        return None
-    
-    # Always generate AI category, regardless of server ai_summary
-    print(f"article ID {article['article_id']} content check: {bool(content)}")
-    if not content:
-        print(f"no content: article ID {article['article_id']}")
-        return None
-    
-    print(f"article ID {article['article_id']} generating AI category and summary")
-    ai_summary = generate_ai_summary(content, {**config, "api_key": api_key}, article['article_id'])
-    if not ai_summary:
-        print(f"article ID {article['article_id']} AI processing fail")
+
+def _process_article(article, config, api_key):
+    article_id = article["article_id"]
+    server_ai_summary = article.get("ai_summary")
+    logger.debug("processing: title=%s content=%s server_ai_summary=%s",
+                 bool(article.get("title")), bool(article.get("content")), bool(server_ai_summary))
+    content = prompt_content(article, config)
+    if content is None:
         return None
-    
-    ai_content = ai_summary["ai_content"]
-    ai_category = ai_summary["category_ai"]
-    
-    # Use server ai_summary if available, otherwise use AI generated summary
-    if server_ai_summary:
-        print(f"article ID {article['article_id']} using server summary but AI category")
-        ai_content = server_ai_summary
-
-    translations = {}
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = {
-            lang: executor.submit(
-                translate_ai_summary,
-                title,
-                ai_content,
-                lang,
-                {**config, "api_key": api_key},
-                article['article_id']
-            ) for lang in config["lang_list"]
-        }
-        for lang, future in futures.items():
-            result = future.result()
-            if not result:
-                print(f"article ID {article['article_id']} -> {lang} translation fail")
-                return None
-            translations[lang] = result
-
-    translations[config["base_lang"]] = {
-        "ai_title": title,
-        "ai_content": ai_content
-    }
-    article["translations"] = translations
-    article["clicked_cnt"] = 0
-    
-    # Add AI category to article as list (overriding server category)
-    article["category"] = [ai_category]
-    print(f"article ID {article['article_id']} AI category: {ai_category}")
 
-    print(f"article ID {article['article_id']} processed")
+    article_config = {**config, "api_key": api_key}
+    # A resumed run reuses the summary and translations its journal already holds
+    ai_summary, translations = restore(article_id)
+
+    # Fused mode: category, summary and every translation in one structured call
+    if not ai_summary and config.get("fused_generation"):
+        logger.debug("generating fused category, summary and translations")
+        fused = generate_fused_summary(article["title"], content, article_config, article_id, server_ai_summary)
+        if fused and fused.get("skip"):
+            processing_failed(article)
+            return None
+        ai_summary, translations = accept_fused(fused, translations)
+        if ai_summary:
+            record_summary(article_id, ai_summary)
+
+    if not ai_summary:
+        logger.debug("generating AI category and summary")
+        ai_summary = generate_ai_summary(content, article_config, article_id)
+        if not ai_summary:
+            processing_failed(article)
+            return None
+        record_summary(article_id, ai_summary)
+
+    # Keep what succeeded; languages that still fail are published as pending
+    # and filled in by backfill_translations on a later run
+    ai_content, _ = summary_content(article, ai_summary)
+    translated, failed_langs = translate_languages(
+        article["title"], ai_content, missing_languages(config, translations), article_config, article_id,
+        on_result=journal_translation(article_id)
+    )
+    translations.update(translated)
+
+    build_article(article, config, ai_summary, translations, failed_langs)
+    logger.info("processed (category: %s)", article["category"][0])
     return article
 
 
+def backfill_translations(config, api_key):
+    """
+    Translate the languages earlier runs published as "pending". A language still
+    failing after translation_backfill_attempts runs is marked "failed" and dropped.
+    Returns the number of languages filled in.
+    """
+    limit = config.get("translation_backfill_limit", DEFAULT_BACKFILL_LIMIT)
+    if not limit:
+        return 0
+    max_attempts = config.get("translation_backfill_attempts", DEFAULT_BACKFILL_ATTEMPTS)
+    article_config = {**config, "api_key": api_key}
+
+    filled = 0
+    for article in load_pending_translations(config, limit):
+        article_id = article["article_id"]
+        with log_context(article_id=article_id):
+            source = (article.get("translations") or {}).get(config["base_lang"])
+            status = article.get("translation_status") or {}
+            pending = [lang for lang, state in status.items() if state == "pending"]
+            if not source or not pending:
+                status = {lang: "failed" if state == "pending" else state for lang, state in status.items()}
+                save_backfilled_translations(article_id, {}, status, max_attempts, config)
+                continue
+
+            translations, failed = translate_languages(source["ai_title"], source["ai_content"], pending,
+                                                       article_config, article_id)
+            attempts = article.get("translation_backfill_attempts", 0) + 1
+            give_up = attempts >= max_attempts
+            for lang in pending:
+                status[lang] = "ok" if lang in translations else ("failed" if give_up else "pending")
+            if save_backfilled_translations(article_id, translations, status, attempts, config):
+                filled += len(translations)
+            if failed:
+                logger.warning("backfill %s translation fail (run %d/%d)", failed, attempts, max_attempts)
+
+    if filled:
+        summary_logger.info("backfilled %d pending translations", filled)
+    return filled
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="news_pipeline.py",
+        usage="python news_pipeline.py <country> [--engine thread|async] [--concurrency N] [--resume] [--quiet] [--log-level LEVEL]"
+    )
+    parser.add_argument("country")
+    parser.add_argument("--engine", choices=["thread", "async"], default="thread",
+                        help="thread: ThreadPoolExecutor per article (default); async: asyncio engine")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="global limit on in-flight Gemini requests for the async engine")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the unfinished previous run from its journal instead of starting over")
+    parser.add_argument("--quiet", action="store_true", default=None,
+                        help="production mode: warnings and the end-of-run summaries only (or LOG_QUIET=1)")
+    parser.add_argument("--log-level", default=None,
+                        help="DEBUG, INFO, WARNING, ... (or LOG_LEVEL; default INFO)")
+    return parser.parse_args(argv)
+
+
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python news_pipeline.py <country>")
+        print("Usage: python news_pipeline.py <country> [--engine thread|async] [--concurrency N] [--resume] [--quiet] [--log-level LEVEL]")
         sys.exit(1)
 
-    country = sys.argv[1].lower()
+    args = parse_args(sys.argv[1:])
+    setup_logging(quiet=args.quiet, level=args.log_level)
+    country = args.country.lower()
 
     # Load security keys from environment variables
     api_key = os.getenv("GEMINI_API_KEY")
@@ -99,9 +160,7 @@ def main():
         raise ValueError("FIREBASE_CREDENTIAL_PATH is not set.")
     
     # Initialize Firebase Admin SDK
-    if not firebase_admin._apps:
-        cred = credentials.Certificate(firebase_cred_path)
-        firebase_admin.initialize_app(cred)
+    init_firebase(firebase_cred_path)
     
     os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = firebase_cred_path
 
@@ -109,26 +168,85 @@ def main():
     config_module = importlib.import_module(f"configs.{country}")
     config = config_module.config
 
-    print(f"Running pipeline for: {config['country']}")
+    summary_logger.info("running pipeline for %s (engine: %s)", config['country'], args.engine)
     
     # Get local time based on config timezone
+    import pytz
     local_tz = pytz.timezone(config['timezone'])
     local_time = datetime.now(local_tz)
-    print(f"START TIME: {local_time.strftime('%Y-%m-%d %H:%M:%S')} {config['timezone']}")
-
-    results, total_available = fetch_articles(config["api_url"], api_key, config)
-    print(f"Processed {len(results)} articles")
-
-    # Filter out None results (failed processing)
-    valid_results = [article for article in results if article is not None]
-    uploaded_articles = len(valid_results)
-    
-    save_to_server(valid_results, config)
+    summary_logger.info("start time: %s %s", local_time.strftime('%Y-%m-%d %H:%M:%S'), config['timezone'])
+
+    # Incremental crawl: stop paging at the previous run's watermark
+    crawl_state = load_crawl_state(config)
+
+    # Write-ahead journal of this run's completed stages (--resume continues an unfinished one)
+    open_journal(config, resume=args.resume)
+
+    # Fill in languages that failed in earlier runs before translating new articles
+    backfilled = backfill_translations(config, api_key)
+
+    if args.engine == "async":
+        # Async engine persists each article as it finishes
+        from pipeline.async_engine import run_async_pipeline
+        valid_results, total_available, write_summary = asyncio.run(
+            run_async_pipeline(config, api_key, args.concurrency, crawl_state))
+        summary_logger.info("processed %d articles", len(valid_results))
+        uploaded_articles = len(valid_results)
+    else:
+        # Streaming persistence writes each article in small batches as soon as it is processed
+        stream = ArticleStream(config, on_written=record_persisted) if config.get("stream_writes") else None
+        results, total_available = fetch_articles(config["api_url"], api_key, config, crawl_state,
+                                                  on_article=stream.add if stream else None)
+        summary_logger.info("processed %d articles", len(results))
+
+        # Filter out None results (failed processing)
+        valid_results = [article for article in results if article is not None]
+        uploaded_articles = len(valid_results)
+
+        if stream:
+            write_summary = stream.close()
+            update_meta(config)
+        else:
+            write_summary = save_to_server(valid_results, config)
+            record_persisted(write_summary)
+
+    if write_summary["failed"]:
+        # Crawl the same window again next run so the failed articles are retried
+        crawl_state = None
+
+    # Articles that failed processing are crawled again next run
+    mark_failed(crawl_state, failed_articles())
+
+    # Articles written by the interrupted run this one resumed count towards its stats
+    uploaded_articles += previously_persisted()
+
+    # Articles are persisted, so the next run may start from this watermark
+    save_crawl_state(config, crawl_state)
+    close_journal()
     
+    # Per-stage Gemini tokens, cost and latency for this run
+    report = write_run_report(config, extra={
+        "engine": args.engine,
+        "articles": {"available": total_available, "uploaded": uploaded_articles},
+        "translations": {
+            "partial": sum(1 for article in valid_results if article.get("translation_pending")),
+            "backfilled": backfilled
+        },
+        "extraction": extraction_stats()
+    })
+    print_usage_summary(report)
+
     # Save statistics
-    save_article_stats(total_available, uploaded_articles, config)
+    save_article_stats(total_available, uploaded_articles, config,
+                       usage=report if config.get("usage_stats_to_firestore") else None)
+
+    print_extraction_stats()
+    if batching_enabled(config):
+        print_batch_stats()
+    print_limiter_metrics()
+    print_cache_stats()
     
-    print("DONE")
+    summary_logger.info("done")
 
 
 if __name__ == "__main__":
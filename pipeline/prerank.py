@@ -0,0 +1,143 @@
+import functools
+import math
+from datetime import datetime
+
+from pipeline.dedup import article_text, tokenize
+from pipeline.log import get_logger
+
+# Local, deterministic pre-ranking of selection candidates.
+# Articles are scored by TF-IDF cosine similarity to the country's relevance_terms
+# (the preferences its top_prompt describes) plus an exponential recency bonus.
+# Relevance terms are stems matched as token prefixes ("immigra" matches
+# "immigration"); a term ending in "$" must match a whole token ("eu$").
+# Only the top K go to the LLM selector, and when the selector fails the same
+# ranking picks the articles instead.
+# The TF-IDF matrix is kept sparse (one entry per document/term pair) and is
+# vectorized with NumPy when it is installed (imported on first use, so cold starts
+# do not pay for it); otherwise a pure Python loop does the same arithmetic.
+
+DEFAULT_TOP_K = 150  # candidates sent to the selector (never fewer than 2x the picks)
+DEFAULT_RECENCY_WEIGHT = 0.3  # relevance gets the rest
+DEFAULT_HALF_LIFE_HOURS = 6.0
+PUB_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+logger = get_logger("prerank")
+
+
+@functools.lru_cache(maxsize=None)
+def _numpy():
+    """The numpy module, or None when it is not installed"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def build_sparse_tfidf(articles):
+    """
+    Tokenize articles into a sparse TF-IDF matrix.
+    Returns (vocabulary {term: column}, entries [(row, column, weight)], idf list).
+    """
+    vocabulary = {}
+    counts = []
+    document_frequency = []
+    for row, article in enumerate(articles):
+        term_counts = {}
+        for token in tokenize(article_text(article)):
+            column = vocabulary.setdefault(token, len(vocabulary))
+            term_counts[column] = term_counts.get(column, 0) + 1
+        for column, count in term_counts.items():
+            if column == len(document_frequency):
+                document_frequency.append(0)
+            document_frequency[column] += 1
+            counts.append((row, column, count))
+
+    n = len(articles)
+    idf = [math.log((1 + n) / (1 + df)) + 1 for df in document_frequency]
+    entries = [(row, column, (1 + math.log(count)) * idf[column]) for row, column, count in counts]
+    return vocabulary, entries, idf
+
+
+def query_weights(vocabulary, idf, terms):
+    """IDF weight for every vocabulary token starting with a relevance stem or equal to an exact ("...$") term"""
+    stems = tuple(stem for term in terms if not term.endswith("$") for stem in tokenize(term))
+    exact = {token for term in terms if term.endswith("$") for token in tokenize(term[:-1])}
+    if not stems and not exact:
+        return {}
+    return {column: idf[column] for token, column in vocabulary.items()
+            if token in exact or (stems and token.startswith(stems))}
+
+
+def relevance_scores(articles, terms):
+    """Cosine similarity of each article's TF-IDF vector to the relevance query"""
+    vocabulary, entries, idf = build_sparse_tfidf(articles)
+    weights = query_weights(vocabulary, idf, terms)
+    if not weights or not entries:
+        return [0.0] * len(articles)
+    query_norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+
+    np = _numpy()
+    if np is not None:
+        rows = np.fromiter((row for row, _, _ in entries), dtype=np.int64, count=len(entries))
+        columns = np.fromiter((column for _, column, _ in entries), dtype=np.int64, count=len(entries))
+        values = np.fromiter((value for _, _, value in entries), dtype=np.float64, count=len(entries))
+        query = np.zeros(len(vocabulary))
+        query[list(weights)] = list(weights.values())
+        norms = np.sqrt(np.bincount(rows, weights=values * values, minlength=len(articles)))
+        dots = np.bincount(rows, weights=values * query[columns], minlength=len(articles))
+        scores = np.divide(dots, norms * query_norm, out=np.zeros(len(articles)), where=norms > 0)
+        return scores.tolist()
+
+    norms = [0.0] * len(articles)
+    dots = [0.0] * len(articles)
+    for row, column, value in entries:
+        norms[row] += value * value
+        dots[row] += value * weights.get(column, 0.0)
+    return [dot / (math.sqrt(norm) * query_norm) if norm else 0.0 for dot, norm in zip(dots, norms)]
+
+
+def recency_scores(articles, half_life_hours):
+    """0.5 ** (hours older than the newest article / half_life); 0 without a pubDate"""
+    dates = []
+    for article in articles:
+        try:
+            dates.append(datetime.strptime(article.get("pubDate") or "", PUB_DATE_FORMAT))
+        except ValueError:
+            dates.append(None)
+    newest = max((date for date in dates if date), default=None)
+    if newest is None:
+        return [0.0] * len(articles)
+    return [0.5 ** ((newest - date).total_seconds() / 3600 / half_life_hours) if date else 0.0 for date in dates]
+
+
+def rank_articles(articles, config):
+    """Articles sorted by relevance + recency score (ties keep feed order)"""
+    if not articles:
+        return []
+    recency_weight = config.get("prerank_recency_weight", DEFAULT_RECENCY_WEIGHT)
+    relevance = relevance_scores(articles, config.get("relevance_terms", []))
+    recency = recency_scores(articles, config.get("prerank_half_life_hours", DEFAULT_HALF_LIFE_HOURS))
+    scores = [(1 - recency_weight) * rel + recency_weight * rec for rel, rec in zip(relevance, recency)]
+    order = sorted(range(len(articles)), key=lambda index: (-scores[index], index))
+    return [articles[index] for index in order]
+
+
+def prerank(articles, top_article_count, config):
+    """
+    Return (candidates, ranked): candidates are the top K ranked articles in feed
+    order (all of them when prerank_top_k is None), ranked is the full ranking.
+    """
+    ranked = rank_articles(articles, config)
+    top_k = config.get("prerank_top_k", DEFAULT_TOP_K)
+    if not top_k:
+        return articles, ranked
+    top_k = max(top_k, 2 * top_article_count)
+    if len(articles) <= top_k:
+        return articles, ranked
+
+    keep = {article["article_id"] for article in ranked[:top_k]}
+    candidates = [article for article in articles if article["article_id"] in keep]
+    logger.info("pre-ranking: %d candidates -> top %d sent to the selector (%s)", len(articles), len(candidates),
+                "numpy" if _numpy() is not None else "pure python")
+    return candidates, ranked
@@ -0,0 +1,96 @@
+import threading
+
+from pipeline.translate import translation_status
+from pipeline.extract import extract_content
+from pipeline.journal import record, restored_article
+from pipeline.log import get_logger
+
+# Pure per-article steps shared by the thread engine (news_pipeline.process_article)
+# and the async engine (async_engine.process_article_async). Only the Gemini calls
+# differ between the engines; everything around them lives here.
+
+logger = get_logger("process")
+
+_failed = {}  # article_id -> pubDate of articles whose AI processing failed this run
+_failed_lock = threading.Lock()
+
+
+def prompt_content(article, config):
+    """Extracted prompt input of the article, or None when it must be skipped"""
+    if not article.get("title"):
+        logger.warning("skipped: no title")
+        return None
+    # Always generate AI category, regardless of server ai_summary
+    if not article.get("content"):
+        logger.warning("skipped: no content")
+        return None
+    # Only the prompt input is trimmed; the stored article keeps its full content
+    return extract_content(article["content"], config, article["article_id"])
+
+
+def processing_failed(article):
+    """Remember an article whose AI processing failed, so the crawl watermark stays below it"""
+    logger.info("AI processing fail")
+    with _failed_lock:
+        _failed[article["article_id"]] = article.get("pubDate")
+
+
+def failed_articles():
+    """{article_id: pubDate} of the articles that failed processing in this run"""
+    with _failed_lock:
+        return dict(_failed)
+
+
+def restore(article_id):
+    """(ai_summary, translations) a resumed run already journaled for the article"""
+    ai_summary, translations = restored_article(article_id)
+    if ai_summary:
+        logger.info("resumed from the run journal (%d translations)", len(translations))
+    return ai_summary, translations
+
+
+def accept_fused(fused, translations):
+    """
+    (ai_summary, translations) after a fused response: the response and its translations
+    when it succeeded, else (None, translations) to fall back to the per-call path
+    """
+    if not fused:
+        logger.warning("fused generation fail, falling back to per-call path")
+        return None, translations
+    return fused, dict(fused["translations"])
+
+
+def missing_languages(config, translations):
+    """Languages the fused response or the journal did not cover"""
+    missing = [lang for lang in config["lang_list"] if lang not in translations]
+    if missing and translations:
+        logger.info("translating missing languages: %s", missing)
+    return missing
+
+
+def journal_translation(article_id):
+    """on_result callback journaling each translation as it arrives"""
+    return lambda lang, result: record("translated", article_id, lang=lang, translation=result)
+
+
+def summary_content(article, ai_summary):
+    """(ai_content, ai_category): the server ai_summary is used when present, the category is always AI"""
+    return article.get("ai_summary") or ai_summary["ai_content"], ai_summary["category_ai"]
+
+
+def build_article(article, config, ai_summary, translations, failed_langs):
+    """Fill the article document with its translations, status and AI category"""
+    ai_content, ai_category = summary_content(article, ai_summary)
+    if failed_langs:
+        logger.warning("%s translation fail, publishing without them", failed_langs)
+    translations[config["base_lang"]] = {
+        "ai_title": article["title"],
+        "ai_content": ai_content
+    }
+    article["translations"] = translations
+    article["translation_status"] = translation_status(config["lang_list"], failed_langs)
+    article["translation_pending"] = bool(failed_langs)
+    article["clicked_cnt"] = 0
+    # Add AI category to article as list (overriding server category)
+    article["category"] = [ai_category]
+    return article
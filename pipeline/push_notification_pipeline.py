@@ -1,20 +1,24 @@
 import importlib
 import sys
 import os
-import requests
-import json
 from datetime import datetime, timedelta
-import pytz
-import firebase_admin
-from firebase_admin import credentials, firestore
 
 # Add parent directory to Python path for absolute imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from pipeline.firestore import get_db, init_firebase
+from pipeline.log import get_logger, log_context, setup_logging
+from pipeline.resilience import (
+    RETRYABLE_STATUS_CODES, RetryableStatusError, call_with_resilience, http_timeout, is_safe_to_resend
+)
+
 # Configuration constants
 DEFAULT_HOURS_BACK = 5  # Hours to look back for popular articles
 FIREBASE_FUNCTION_URL = os.getenv("FIREBASE_FUNCTION_URL") or "https://us-central1-the-north-news.cloudfunctions.net/sendArticlePushByLanguage"
 
+logger = get_logger("push")
+summary_logger = get_logger("summary")
+
 def get_time_range(local_tz, hours_back=DEFAULT_HOURS_BACK):
     """Return local time range for N hours back in the specified timezone"""
     now_local = datetime.now(local_tz)
@@ -27,12 +31,15 @@ def get_time_range(local_tz, hours_back=DEFAULT_HOURS_BACK):
 
 def get_most_popular_article(config, hours_back=DEFAULT_HOURS_BACK):
     """Get the most popular article from the past N hours based on click count"""
-    db = firestore.client()
+    import pytz
+    from firebase_admin import firestore
+
+    db = get_db()
     local_tz = pytz.timezone(config["timezone"])
 
     start_str, end_str = get_time_range(local_tz, hours_back)
 
-    print(f"Searching for articles between {start_str} and {end_str} in {config['timezone']}")
+    logger.info("searching for articles between %s and %s in %s", start_str, end_str, config['timezone'])
 
     try:
         # Query articles from the specified time range, ordered by click count descending
@@ -55,21 +62,17 @@ def get_most_popular_article(config, hours_back=DEFAULT_HOURS_BACK):
         if articles:
             article = articles[0]
             doc_id = doc_ids[0]
-            print(f"Found most popular article: {article.get('title', 'No title')} (clicks: {article.get('clicked_cnt', 0)})")
-            print(f"📊 Article debug info:")
-            print(f"   - Collection: {config['firestore_collection']}")
-            print(f"   - Document ID: {doc_id}")
-            print(f"   - article_id field: {article.get('article_id', 'MISSING')}")
-            print(f"   - id field: {article.get('id', 'MISSING')}")
-            print(f"   - pubDate: {article.get('pubDate', 'MISSING')}")
-            print(f"   - All keys in article: {list(article.keys())}")
+            logger.info("most popular article: %r (clicks: %s)", article.get('title', 'No title'), article.get('clicked_cnt', 0))
+            logger.debug("article document: collection=%s doc_id=%s article_id=%s id=%s pubDate=%s keys=%s",
+                         config['firestore_collection'], doc_id, article.get('article_id', 'MISSING'),
+                         article.get('id', 'MISSING'), article.get('pubDate', 'MISSING'), list(article.keys()))
             return article
         else:
-            print(f"No articles found in the specified time range for {config['country']}")
+            logger.info("no articles found in the specified time range for %s", config['country'])
             return None
 
     except Exception as e:
-        print(f"Error fetching articles for {config['country']}: {e}")
+        logger.error("error fetching articles for %s: %s", config['country'], e)
         return None
 
 def send_push_notification(article_id, country_code):
@@ -90,34 +93,32 @@ def send_push_notification(article_id, country_code):
     }
 
     try:
-        print(f"🚀 Sending push notification:")
-        print(f"   - Firebase Function URL: {FIREBASE_FUNCTION_URL}")
-        print(f"   - Article ID: {article_id}")
-        print(f"   - Country Code: {final_country_code}")
-        print(f"   - Original Country: {country_code}")
-        print(f"   - Headers: {json.dumps(headers, indent=2)}")
-        print(f"   - Payload: {json.dumps(payload, indent=2)}")
+        import requests
+
+        logger.info("sending push notification (country: %s)", final_country_code)
+        logger.debug("push request: url=%s headers=%s payload=%s", FIREBASE_FUNCTION_URL, headers, payload)
+
+        def post():
+            response = requests.post(FIREBASE_FUNCTION_URL, headers=headers, json=payload, timeout=http_timeout())
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                raise RetryableStatusError(response.status_code, response.text[:200])
+            return response
 
-        response = requests.post(FIREBASE_FUNCTION_URL, headers=headers, json=payload)
+        # Only retry when the push cannot have been delivered (no duplicate notifications)
+        response = call_with_resilience(post, "push_function", retryable=is_safe_to_resend)
 
-        print(f"📡 Firebase Function Response:")
-        print(f"   - Status Code: {response.status_code}")
-        print(f"   - Response Headers: {dict(response.headers)}")
-        print(f"   - Response Text: {response.text}")
+        logger.debug("push response: status=%s headers=%s body=%s", response.status_code, response.headers, response.text)
 
         if response.status_code == 200:
             result = response.json()
-            print(f"✅ Push notification sent successfully!")
-            print(f"   - Success count: {result.get('successCount', 0)}")
-            print(f"   - Failure count: {result.get('failureCount', 0)}")
-            print(f"   - Ignored users: {result.get('ignoredUsers', 0)}")
+            summary_logger.info("push notification sent: success=%s failure=%s ignored=%s",
+                                result.get('successCount', 0), result.get('failureCount', 0), result.get('ignoredUsers', 0))
             return True
         else:
-            print(f"❌ Failed to send push notification: {response.status_code}")
-            print(f"   - Error response: {response.text}")
+            logger.error("failed to send push notification: %s %s", response.status_code, response.text)
             return False
     except Exception as e:
-        print(f"Error sending push notification: {e}")
+        logger.error("error sending push notification: %s", e)
         return False
 
 def main():
@@ -127,61 +128,61 @@ def main():
         sys.exit(1)
 
     country = sys.argv[1].lower()
+    setup_logging()
 
     # Optional hours_back parameter
     hours_back = DEFAULT_HOURS_BACK
     if len(sys.argv) >= 3:
         try:
             hours_back = int(sys.argv[2])
-            print(f"Using custom hours_back: {hours_back}")
+            logger.info("using custom hours_back: %d", hours_back)
         except ValueError:
-            print(f"Invalid hours_back parameter. Using default: {DEFAULT_HOURS_BACK}")
+            logger.warning("invalid hours_back parameter, using default: %d", DEFAULT_HOURS_BACK)
 
     # Initialize Firebase
     firebase_cred_path = os.getenv("FIREBASE_CREDENTIAL_PATH")
     if not firebase_cred_path:
         raise ValueError("FIREBASE_CREDENTIAL_PATH is not set.")
 
-    if not firebase_admin._apps:
-        cred = credentials.Certificate(firebase_cred_path)
-        firebase_admin.initialize_app(cred)
+    init_firebase(firebase_cred_path)
 
     # Load country-specific configuration
     try:
         config_module = importlib.import_module(f"configs.{country}")
         config = config_module.config
     except ImportError:
-        print(f"Configuration for country '{country}' not found.")
-        print("Available countries: uae, saudi, canada, germany, russia")
+        logger.error("configuration for country '%s' not found (available: uae, saudi, canada, germany, russia)", country)
         sys.exit(1)
 
-    print(f"Running push notification pipeline for: {config['country']}")
+    summary_logger.info("running push notification pipeline for %s", config['country'])
+    import pytz
     local_tz = pytz.timezone(config["timezone"])
-    print(f"START TIME: {datetime.now(local_tz).strftime('%Y-%m-%d %H:%M:%S')} {config['timezone']}")
-    print(f"Looking back {hours_back} hours for most popular article")
+    summary_logger.info("start time: %s %s", datetime.now(local_tz).strftime('%Y-%m-%d %H:%M:%S'), config['timezone'])
+    logger.info("looking back %d hours for most popular article", hours_back)
 
     # Get the most popular article from the specified time range
     article = get_most_popular_article(config, hours_back)
 
     if not article:
-        print("No article found to send push notification for.")
+        summary_logger.info("no article found to send push notification for")
         return
 
     # Extract article ID
     article_id = article.get('article_id') or article.get('id')
     if not article_id:
-        print("Article ID not found in article data.")
+        logger.error("article ID not found in article data")
         return
 
     # Send push notification
-    success = send_push_notification(article_id, country)
+    with log_context(article_id=article_id):
+        success = send_push_notification(article_id, country)
 
     if success:
-        print("Push notification pipeline completed successfully!")
+        summary_logger.info("push notification pipeline completed successfully")
     else:
-        print("Push notification pipeline failed!")
+        summary_logger.error("push notification pipeline failed")
 
-    print("Push notification pipeline DONE")
+    summary_logger.info("push notification pipeline done")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
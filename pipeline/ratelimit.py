@@ -0,0 +1,271 @@
+import asyncio
+import collections
+import heapq
+import itertools
+import threading
+import time
+
+from pipeline.log import get_logger
+
+# Shared limiter for all Gemini traffic in the process.
+# - token bucket caps the request rate (gemini_rpm)
+# - AIMD concurrency: +1 slot per window of successes, halve on 429/503
+# - weighted fair queuing across (country, stage) flows, so summarization is not
+#   starved by translation fan-out and countries sharing a key get equal turns
+
+DEFAULT_RPM = 2000
+DEFAULT_INITIAL_CONCURRENCY = 32
+DEFAULT_MAX_CONCURRENCY = 256
+DEFAULT_MIN_CONCURRENCY = 1
+DECREASE_COOLDOWN = 1.0  # seconds between multiplicative decreases
+RATE_WINDOW = 60.0  # seconds of grants behind the current_rpm metric
+
+# Higher weight = larger share of dispatch slots when queues are contended
+DEFAULT_STAGE_WEIGHTS = {
+    "select": 4,
+    "summarize": 4,
+    "briefing": 2,
+    "translate": 1
+}
+
+THROTTLE_STATUS_CODES = (429, 503)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+logger = get_logger("ratelimit")
+summary_logger = get_logger("summary")
+
+
+def is_throttle_error(error):
+    """True for Gemini 429 / 503 responses"""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return code in THROTTLE_STATUS_CODES
+
+
+class _Waiter:
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+        self.granted = False
+        self.cancelled = False
+        self.enqueued_at = time.monotonic()
+
+    def grant(self):
+        self.granted = True
+        if self.loop:
+            self.loop.call_soon_threadsafe(self._resolve)
+        else:
+            self.event.set()
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class AdaptiveLimiter:
+    """Token bucket + AIMD concurrency + weighted fair queue, usable from threads and asyncio"""
+
+    def __init__(self, rpm=DEFAULT_RPM, initial_concurrency=DEFAULT_INITIAL_CONCURRENCY,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, min_concurrency=DEFAULT_MIN_CONCURRENCY,
+                 stage_weights=None):
+        self.rate = rpm / 60.0
+        self.burst = max(1.0, self.rate)
+        self.tokens = self.burst
+        self.last_refill = time.monotonic()
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max(min_concurrency, max_concurrency)
+        self.concurrency = float(min(max(initial_concurrency, min_concurrency), self.max_concurrency))
+        self.stage_weights = {**DEFAULT_STAGE_WEIGHTS, **(stage_weights or {})}
+
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.queue = []  # heap of (finish_tag, seq, waiter)
+        self.seq = itertools.count()
+        self.virtual_time = 0.0
+        self.flow_finish = {}
+        self.timer = None
+        self.last_decrease = 0.0
+        self.started_at = time.monotonic()
+
+        self.granted_total = 0
+        self.recent_grants = collections.deque()  # monotonic grant times within RATE_WINDOW
+        self.throttle_events = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+
+    # --- queueing -------------------------------------------------------
+
+    def _enqueue(self, flow, waiter):
+        weight = self.stage_weights.get(flow[1], 1)
+        start = max(self.virtual_time, self.flow_finish.get(flow, 0.0))
+        finish = start + 1.0 / weight
+        self.flow_finish[flow] = finish
+        heapq.heappush(self.queue, (finish, next(self.seq), waiter))
+        self.max_queue_depth = max(self.max_queue_depth, len(self.queue))
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def _dispatch(self):
+        """Grant queued waiters while concurrency slots and rate tokens are available (lock held)"""
+        while self.queue and self.in_flight < int(self.concurrency):
+            finish, _, waiter = self.queue[0]
+            if waiter.cancelled:
+                heapq.heappop(self.queue)
+                continue
+            self._refill()
+            if self.tokens < 1:
+                self._schedule((1 - self.tokens) / self.rate)
+                return
+            heapq.heappop(self.queue)
+            self.tokens -= 1
+            self.in_flight += 1
+            self.virtual_time = finish
+            self._count_grant()
+            self.total_wait += time.monotonic() - waiter.enqueued_at
+            waiter.grant()
+
+    def _count_grant(self):
+        """Record one granted request for the rate metrics (lock held)"""
+        now = time.monotonic()
+        self.granted_total += 1
+        self.recent_grants.append(now)
+        while self.recent_grants[0] < now - RATE_WINDOW:
+            self.recent_grants.popleft()
+
+    def _schedule(self, delay):
+        if self.timer is not None:
+            return
+
+        def fire():
+            with self.lock:
+                self.timer = None
+                self._dispatch()
+
+        self.timer = threading.Timer(delay, fire)
+        self.timer.daemon = True
+        self.timer.start()
+
+    # --- public API -----------------------------------------------------
+
+    def acquire(self, flow):
+        """Block the calling thread until flow=(country, stage) may send one request"""
+        waiter = _Waiter()
+        with self.lock:
+            self._enqueue(flow, waiter)
+            self._dispatch()
+        waiter.event.wait()
+
+    async def acquire_async(self, flow):
+        """Await a dispatch slot without tying up a thread"""
+        waiter = _Waiter(asyncio.get_running_loop())
+        with self.lock:
+            self._enqueue(flow, waiter)
+            self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self.lock:
+                waiter.cancelled = True
+                granted = waiter.granted
+            if granted:
+                self.release()
+            raise
+
+    def try_acquire(self, flow):
+        """Take a slot only if one is free right now and nobody is queued (used for hedged duplicates)"""
+        with self.lock:
+            if any(not waiter.cancelled for _, _, waiter in self.queue) or self.in_flight >= int(self.concurrency):
+                return False
+            self._refill()
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            self.in_flight += 1
+            self._count_grant()
+            return True
+
+    def release(self, throttled=False):
+        """Return a slot; throttled=True signals a 429/503 and halves the concurrency limit"""
+        with self.lock:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                self.throttle_events += 1
+                if now - self.last_decrease >= DECREASE_COOLDOWN:
+                    self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+                    self.last_decrease = now
+                    logger.warning("throttled -> concurrency limit %d", int(self.concurrency))
+            else:
+                # Additive increase: roughly +1 slot per full window of successes
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.concurrency)
+            self._dispatch()
+
+    def metrics(self):
+        with self.lock:
+            now = time.monotonic()
+            elapsed = max(now - self.started_at, 1e-9)
+            recent = sum(1 for granted_at in self.recent_grants if granted_at >= now - RATE_WINDOW)
+            return {
+                "configured_rpm": round(self.rate * 60),
+                # Grants over the last RATE_WINDOW seconds (the whole run when it is shorter)
+                "current_rpm": round(recent / min(elapsed, RATE_WINDOW) * 60, 1),
+                "average_rpm": round(self.granted_total / elapsed * 60, 1),
+                "concurrency_limit": int(self.concurrency),
+                "in_flight": self.in_flight,
+                "queue_depth": len(self.queue),
+                "max_queue_depth": self.max_queue_depth,
+                "throttle_events": self.throttle_events,
+                "granted": self.granted_total,
+                "avg_wait_ms": round(self.total_wait / self.granted_total * 1000, 1) if self.granted_total else 0.0
+            }
+
+
+class LimiterSlot:
+    """
+    One flow's dispatch slot as used by resilience.call_with_resilience(slot=...):
+    acquired before the timed / hedged section, so queueing time is neither counted
+    as latency nor able to trigger a hedge.
+    """
+
+    def __init__(self, limiter, flow):
+        self.limiter = limiter
+        self.flow = flow
+
+    def acquire(self):
+        self.limiter.acquire(self.flow)
+
+    async def acquire_async(self):
+        await self.limiter.acquire_async(self.flow)
+
+    def try_acquire(self):
+        return self.limiter.try_acquire(self.flow)
+
+    def release(self, error=None):
+        self.limiter.release(error is not None and is_throttle_error(error))
+
+
+def get_limiter(api_key, config=None):
+    """Return the process-wide limiter for api_key, creating it on first use"""
+    with _limiters_lock:
+        limiter = _limiters.get(api_key)
+        if limiter is None:
+            config = config or {}
+            limiter = AdaptiveLimiter(
+                rpm=config.get("gemini_rpm", DEFAULT_RPM),
+                initial_concurrency=config.get("gemini_initial_concurrency", DEFAULT_INITIAL_CONCURRENCY),
+                max_concurrency=config.get("gemini_max_concurrency", DEFAULT_MAX_CONCURRENCY),
+                stage_weights=config.get("llm_stage_weights")
+            )
+            _limiters[api_key] = limiter
+        return limiter
+
+
+def print_limiter_metrics():
+    """Print rate, queue depth and throttle counters for every limiter at the end of a run"""
+    for index, limiter in enumerate(_limiters.values(), 1):
+        metrics = limiter.metrics()
+        summary_logger.info("ratelimit limiter %d: %s", index, ", ".join(f"{key}={value}" for key, value in metrics.items()))
@@ -0,0 +1,344 @@
+import asyncio
+import random
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from pipeline.log import get_logger
+
+# Resilience helpers for every external call (Gemini, news API, push functions):
+# jittered exponential retry on retryable errors, a circuit breaker per dependency
+# that fails fast while it is down, and hedged duplicates for idempotent calls
+# that run past the observed p95 latency.
+
+DEFAULT_ATTEMPTS = 3
+DEFAULT_BASE_DELAY = 1.0  # seconds, first backoff ceiling
+DEFAULT_MAX_DELAY = 20.0  # seconds, backoff ceiling cap
+DEFAULT_HTTP_TIMEOUT = (5, 30)  # (connect, read) seconds for requests calls
+DEFAULT_FAILURE_THRESHOLD = 5  # consecutive retryable failures before opening
+DEFAULT_RESET_TIMEOUT = 30.0  # seconds a breaker stays open before a trial call
+HEDGE_MIN_SAMPLES = 20  # latency samples needed before hedging starts
+HEDGE_MIN_DELAY = 1.0  # never hedge sooner than this, seconds
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+_breakers = {}
+_trackers = {}
+_registry_lock = threading.Lock()
+_hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+logger = get_logger("resilience")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit breaker is open"""
+
+
+class RetryableStatusError(Exception):
+    """HTTP response with a retryable status code (raised so the retry loop sees it)"""
+
+    def __init__(self, status_code, message=""):
+        super().__init__(f"HTTP {status_code} {message}".strip())
+        self.status_code = status_code
+
+
+def transport_errors():
+    """
+    Timeout / connection exception types of the HTTP libraries loaded so far.
+    requests and httpx are not imported here: an error can only come from a
+    library that some caller has already imported.
+    """
+    errors = [asyncio.TimeoutError, TimeoutError, ConnectionError]
+    requests = sys.modules.get("requests")
+    if requests is not None:
+        errors += [requests.Timeout, requests.ConnectionError]
+    httpx = sys.modules.get("httpx")
+    if httpx is not None:
+        errors += [httpx.TimeoutException, httpx.NetworkError]
+    return tuple(errors)
+
+
+def is_retryable(error):
+    """Timeouts, connection errors and 408/429/5xx responses are worth retrying"""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, transport_errors()):
+        return True
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return code in RETRYABLE_STATUS_CODES
+
+
+def backoff_delay(attempt, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+    """Full-jitter exponential backoff for the given 1-based retry attempt"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** (attempt - 1))))
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open trial after reset_timeout"""
+
+    def __init__(self, name, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+
+    def before_call(self):
+        with self.lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError(f"{self.name} circuit open")
+                self.state = "half-open"
+                self.trial_in_flight = False
+            if self.state == "half-open":
+                if self.trial_in_flight:
+                    raise CircuitOpenError(f"{self.name} circuit half-open, trial in flight")
+                self.trial_in_flight = True
+
+    def record_success(self):
+        with self.lock:
+            if self.state != "closed":
+                logger.info("%s circuit closed", self.name)
+            self.state = "closed"
+            self.failures = 0
+            self.trial_in_flight = False
+
+    def record_failure(self, error):
+        with self.lock:
+            self.trial_in_flight = False
+            code = getattr(error, "code", None) or getattr(error, "status_code", None)
+            if not is_retryable(error) or code == 429:
+                # Bad request or rate limiting: the dependency is up, so do not count it
+                if self.state == "half-open":
+                    self.state = "closed"
+                return
+            self.failures += 1
+            if self.state == "half-open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.error("%s circuit OPEN after %d failures: %s", self.name, self.failures, error)
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Rolling window of call latencies used to pick the hedge delay"""
+
+    def __init__(self, size=200):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def p95(self):
+        with self.lock:
+            if len(self.samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    def hedge_delay(self):
+        p95 = self.p95()
+        return None if p95 is None else max(p95, HEDGE_MIN_DELAY)
+
+
+def get_breaker(name, config=None):
+    config = config or {}
+    with _registry_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(
+                name,
+                failure_threshold=config.get("breaker_failure_threshold", DEFAULT_FAILURE_THRESHOLD),
+                reset_timeout=config.get("breaker_reset_timeout", DEFAULT_RESET_TIMEOUT)
+            )
+        return _breakers[name]
+
+
+def get_tracker(name):
+    with _registry_lock:
+        if name not in _trackers:
+            _trackers[name] = LatencyTracker()
+        return _trackers[name]
+
+
+def _timed(fn, tracker, slot=None):
+    """Run fn, releasing slot (acquired by the caller) afterwards; only fn itself is timed"""
+    error = None
+    start = time.monotonic()
+    try:
+        result = fn()
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        if slot is not None:
+            slot.release(error)
+    tracker.record(time.monotonic() - start)
+    return result
+
+
+def _hedged(fn, tracker, slot=None):
+    """Run fn; if it is still running past the p95 latency, race one duplicate"""
+    delay = tracker.hedge_delay()
+    if slot is not None:
+        slot.acquire()
+    if delay is None:
+        return _timed(fn, tracker, slot)
+
+    primary = _hedge_executor.submit(_timed, fn, tracker, slot)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+
+    # A duplicate would only queue behind other requests while the limiter is busy
+    if slot is not None and not slot.try_acquire():
+        logger.debug("call exceeded p95 (%.1fs), limiter busy, not hedging", delay)
+        return primary.result()
+
+    logger.info("call exceeded p95 (%.1fs), sending hedged request", delay)
+    pending = {primary, _hedge_executor.submit(_timed, fn, tracker, slot)}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def call_with_resilience(fn, name, config=None, attempts=None, hedge=False, retryable=is_retryable,
+                         latency_key=None, slot=None):
+    """
+    Call fn() behind the `name` circuit breaker with jittered exponential retry.
+    hedge=True (idempotent calls only) races a duplicate once fn runs past the p95
+    latency recorded under latency_key (defaults to name).
+    slot (ratelimit.LimiterSlot) is acquired for every request, outside the timed
+    and hedged section; hedges are skipped while it has no free capacity.
+    """
+    config = config or {}
+    attempts = attempts or config.get("retry_attempts", DEFAULT_ATTEMPTS)
+    breaker = get_breaker(name, config)
+    tracker = get_tracker(latency_key or name)
+    hedge = hedge and config.get("hedge_requests", True)
+
+    for attempt in range(1, attempts + 1):
+        breaker.before_call()
+        try:
+            if hedge:
+                result = _hedged(fn, tracker, slot)
+            else:
+                if slot is not None:
+                    slot.acquire()
+                result = _timed(fn, tracker, slot)
+        except Exception as e:
+            breaker.record_failure(e)
+            if attempt == attempts or not retryable(e):
+                raise
+            delay = backoff_delay(attempt, config.get("retry_base_delay", DEFAULT_BASE_DELAY),
+                                  config.get("retry_max_delay", DEFAULT_MAX_DELAY))
+            logger.warning("%s attempt %d/%d failed (%s), retrying in %.1fs", name, attempt, attempts, e, delay)
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+
+async def _timed_async(coro_factory, tracker, slot=None):
+    error = None
+    start = time.monotonic()
+    try:
+        result = await coro_factory()
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        if slot is not None:
+            slot.release(error if isinstance(error, Exception) else None)
+    tracker.record(time.monotonic() - start)
+    return result
+
+
+async def _hedged_async(coro_factory, tracker, slot=None):
+    delay = tracker.hedge_delay()
+    if slot is not None:
+        await slot.acquire_async()
+    primary = asyncio.ensure_future(_timed_async(coro_factory, tracker, slot))
+    if delay is None:
+        return await primary
+
+    done, _ = await asyncio.wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+
+    if slot is not None and not slot.try_acquire():
+        logger.debug("call exceeded p95 (%.1fs), limiter busy, not hedging", delay)
+        return await primary
+
+    logger.info("call exceeded p95 (%.1fs), sending hedged request", delay)
+    pending = {primary, asyncio.ensure_future(_timed_async(coro_factory, tracker, slot))}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def call_with_resilience_async(coro_factory, name, config=None, attempts=None, hedge=False,
+                                     retryable=is_retryable, latency_key=None, slot=None):
+    """Async variant of call_with_resilience; coro_factory() must return a fresh coroutine"""
+    config = config or {}
+    attempts = attempts or config.get("retry_attempts", DEFAULT_ATTEMPTS)
+    breaker = get_breaker(name, config)
+    tracker = get_tracker(latency_key or name)
+    hedge = hedge and config.get("hedge_requests", True)
+
+    for attempt in range(1, attempts + 1):
+        breaker.before_call()
+        try:
+            if hedge:
+                result = await _hedged_async(coro_factory, tracker, slot)
+            else:
+                if slot is not None:
+                    await slot.acquire_async()
+                result = await _timed_async(coro_factory, tracker, slot)
+        except Exception as e:
+            breaker.record_failure(e)
+            if attempt == attempts or not retryable(e):
+                raise
+            delay = backoff_delay(attempt, config.get("retry_base_delay", DEFAULT_BASE_DELAY),
+                                  config.get("retry_max_delay", DEFAULT_MAX_DELAY))
+            logger.warning("%s attempt %d/%d failed (%s), retrying in %.1fs", name, attempt, attempts, e, delay)
+            await asyncio.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+
+def is_safe_to_resend(error):
+    """
+    Retry test for non-idempotent POSTs (push sends): only retry when the request
+    cannot have been processed - connection failures and 429/502/503/504.
+    A read timeout may mean the push already went out, so it is not retried.
+    """
+    requests = sys.modules.get("requests")
+    if requests is not None and isinstance(error, requests.ConnectionError):
+        return True
+    code = getattr(error, "status_code", None)
+    return code in (429, 502, 503, 504)
+
+
+def http_timeout(config=None):
+    """(connect, read) timeout for requests calls"""
+    return tuple((config or {}).get("http_timeout", DEFAULT_HTTP_TIMEOUT))
@@ -1,54 +1,318 @@
-import os
-from google import genai
+import json
+
+from configs.common_prompts import CATEGORIES
+from pipeline.translate import clean_duplicate_parentheses
+from pipeline.gemini import get_api_key, generate_content, generate_content_async, has_fields, is_json, json_config
+from pipeline.batching import batching_enabled, estimate_tokens, get_batcher
+from pipeline.log import get_logger
+
+logger = get_logger("summarize")
 
 def generate_ai_summary(content, config, article_id=None):
-    # Initialize Gemini client
-    api_key = config.get("api_key") or os.getenv("GEMINI_API_KEY")
+    # Cross-article micro-batching: hand the article to the shared batcher and wait
+    if batching_enabled(config):
+        batcher = get_batcher(
+            "summarize",
+            config,
+            lambda items: summarize_batch(items, config),
+            fallback=lambda item_id, item_content: generate_ai_summary(item_content, {**config, "batch_size": 1}, item_id)
+        )
+        item_id = article_id or f"item-{id(content)}"
+        return batcher.submit(item_id, content, estimate_tokens(content)).result()
+
+    # Check Gemini API key
+    api_key = get_api_key(config)
     if not api_key:
-        print(f"[{article_id}] ERROR: GEMINI_API_KEY is missing for summarization")
+        logger.error("GEMINI_API_KEY is missing for summarization")
         return None
-    
-    # Set up Gemini client (remove duplicate key to avoid warnings)
-    if "GOOGLE_API_KEY" in os.environ and os.environ["GOOGLE_API_KEY"] != api_key:
-        del os.environ["GOOGLE_API_KEY"]
-    os.environ["GOOGLE_API_KEY"] = api_key
-    client = genai.Client()
 
     prompt = config["summarization_prompt"].format(content=content)
 
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-lite",
-            contents=prompt
+        response = generate_content(
+            config,
+            prompt,
+            "summarize",
+            cache_check=has_fields("Category:", "Content:")
         )
         
-        text = response.text.strip()
+        return parse_summary_text(response.text, article_id)
+    except Exception as e:
+        logger.warning("generate_ai_summary error: %s", e)
+    return None
 
-        # Handle SKIP response
-        if text.upper() == "SKIP":
-            print(f"[{article_id}] Gemini resp: SKIP -> failed to summarize article")
-            return None
 
-        print(f"\n[{article_id}] AI summary result:\n", text[:500])
+async def generate_ai_summary_async(content, config, article_id=None):
+    """Async variant of generate_ai_summary using the shared client's aio surface"""
+    api_key = get_api_key(config)
+    if not api_key:
+        logger.error("GEMINI_API_KEY is missing for summarization")
+        return None
 
-        # Parse results for category and content
-        category, summary = None, None
-        if "Category:" in text and "Content:" in text:
-            category = text.split("Category:")[1].split("Content:")[0].strip()
-            summary = text.split("Content:")[1].strip()
+    prompt = config["summarization_prompt"].format(content=content)
 
-        if not (category and summary):
-            print(f"[{article_id}] summary/category parsing fail")
-            return None
+    try:
+        response = await generate_content_async(
+            config,
+            prompt,
+            "summarize",
+            cache_check=has_fields("Category:", "Content:")
+        )
+        return parse_summary_text(response.text, article_id)
+    except Exception as e:
+        logger.warning("generate_ai_summary_async error: %s", e)
+    return None
+
+
+def parse_summary_text(text, article_id=None):
+    """Parse a "Category: / Content:" summary response (None on SKIP or format error)"""
+    text = text.strip()
+
+    # Handle SKIP response
+    if text.upper() == "SKIP":
+        logger.info("Gemini resp: SKIP -> failed to summarize article")
+        return None
+
+    logger.debug("AI summary result: %r", text[:500])
 
-        return {
+    # Parse results for category and content
+    category, summary = None, None
+    if "Category:" in text and "Content:" in text:
+        category = text.split("Category:")[1].split("Content:")[0].strip()
+        summary = text.split("Content:")[1].strip()
+
+    if not (category and summary):
+        logger.warning("summary/category parsing fail")
+        return None
+
+    return {
+        "category_ai": category,
+        "ai_content": summary
+    }
+
+
+def summarize_batch(items, config):
+    """
+    Summarize several articles in one Gemini call.
+    items: list of (article_id, content). Returns {article_id: result} where result
+    matches generate_ai_summary (None for SKIP); articles whose entry is missing or
+    malformed are left out so the batcher can re-queue them.
+    """
+    # Check Gemini API key
+    api_key = get_api_key(config)
+    if not api_key:
+        logger.error("GEMINI_API_KEY is missing for batch summarization")
+        return {}
+
+    instructions = config["summarization_prompt"].format(content="(the articles are listed below, each under its Article ID)")
+    prompt = f"""Apply the instructions below to EACH article separately and return a JSON array with one object per article.
+Each object must contain the article's exact "id", "skip", "category" and "ai_content".
+The JSON schema replaces the "Respond in the exact format" and "return: SKIP" instructions: set "skip" to true for unsuitable articles.
+
+{instructions}
+""" + "\n".join(f"\n=== Article ID: {item_id} ===\n{content}" for item_id, content in items)
+
+    schema = {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {
+                "id": {"type": "string"},
+                "skip": {"type": "boolean"},
+                "category": {"type": "string", "enum": CATEGORIES},
+                "ai_content": {"type": "string"}
+            },
+            "required": ["id", "skip", "category", "ai_content"]
+        }
+    }
+
+    try:
+        response = generate_content(
+            config,
+            prompt,
+            "summarize",
+            cache_check=is_json,
+            generation_config=json_config(schema)
+        )
+        data = json.loads(response.text)
+    except Exception as e:
+        logger.warning("summarize_batch error (%d articles): %s", len(items), e)
+        return {}
+
+    requested = {item_id for item_id, _ in items}
+    results = {}
+    for entry in data if isinstance(data, list) else []:
+        if not isinstance(entry, dict) or entry.get("id") not in requested:
+            continue
+        item_id = entry["id"]
+        if entry.get("skip"):
+            logger.info("Gemini batch resp: SKIP -> failed to summarize article %s", item_id)
+            results[item_id] = None
+            continue
+        category = str(entry.get("category") or "").strip()
+        summary = str(entry.get("ai_content") or "").strip()
+        if not (category and summary):
+            logger.warning("batch summary/category parsing fail for %s", item_id)
+            continue
+        results[item_id] = {
             "category_ai": category,
             "ai_content": summary
         }
+
+    logger.info("summarize_batch: %d/%d articles parsed", len(results), len(items))
+    return results
+
+
+def build_fused_prompt(title, content, config, provided_summary=None):
+    """Build one prompt asking for category, base summary and every translation"""
+    summarization_prompt = config["summarization_prompt"].format(content=content)
+
+    prompt = f"""Complete ALL of the tasks below for a single news article and return ONE JSON object matching the response schema.
+The JSON schema replaces every "Respond in the exact format" / "Return your response in this format" / "return: SKIP" instruction that follows:
+- put the category in "category" and the base-language summary in "ai_content"
+- put each translation in "translations.<language code>" with "ai_title" and "ai_content"
+- if the article is not suitable for summarization, set "skip" to true and leave "ai_content" and the translations empty
+
+=== TASK 1: SUMMARY AND CATEGORY ===
+Article title: {title}
+{summarization_prompt}
+"""
+    if provided_summary:
+        prompt += f"""
+Use the following summary VERBATIM as "ai_content" instead of writing your own (still choose the category from the article):
+{provided_summary}
+"""
+
+    prompt += "\n=== TASK 2: TRANSLATIONS ===\nTranslate the article title and the TASK 1 summary into each language below, following that language's translator instructions.\n"
+    for lang in config["lang_list"]:
+        prompt += f"\n--- Language: {lang} ---\n{config['translation_prompt'](lang)}\n"
+
+    return prompt
+
+
+def build_fused_schema(lang_list):
+    """JSON schema for the fused summary/translation response"""
+    translation_schema = {
+        "type": "object",
+        "properties": {
+            "ai_title": {"type": "string"},
+            "ai_content": {"type": "string"}
+        },
+        "required": ["ai_title", "ai_content"]
+    }
+    return {
+        "type": "object",
+        "properties": {
+            "skip": {"type": "boolean"},
+            "category": {"type": "string", "enum": CATEGORIES},
+            "ai_content": {"type": "string"},
+            "translations": {
+                "type": "object",
+                "properties": {lang: translation_schema for lang in lang_list},
+                "required": list(lang_list)
+            }
+        },
+        "required": ["skip", "category", "ai_content", "translations"]
+    }
+
+
+def generate_fused_summary(title, content, config, article_id=None, provided_summary=None):
+    """
+    Generate category, base-language summary and all translations in one Gemini call.
+    Returns {"category_ai", "ai_content", "translations"} where translations only holds
+    languages that came back well-formed, {"skip": True} when the model declined the
+    article, or None if the call or summary parsing failed.
+    """
+    # Check Gemini API key
+    api_key = get_api_key(config)
+    if not api_key:
+        logger.error("GEMINI_API_KEY is missing for fused summarization")
+        return None
+
+    prompt = build_fused_prompt(title, content, config, provided_summary)
+
+    try:
+        response = generate_content(
+            config,
+            prompt,
+            "summarize",
+            cache_check=is_json,
+            generation_config=json_config(build_fused_schema(config["lang_list"]))
+        )
+        return parse_fused_response(response.text, config, article_id)
     except Exception as e:
-        print(f"[{article_id}] generate_ai_summary error: {e}")
-    return None
+        logger.warning("generate_fused_summary error: %s", e)
+        return None
+
+
+async def generate_fused_summary_async(title, content, config, article_id=None, provided_summary=None):
+    """Async variant of generate_fused_summary"""
+    api_key = get_api_key(config)
+    if not api_key:
+        logger.error("GEMINI_API_KEY is missing for fused summarization")
+        return None
+
+    prompt = build_fused_prompt(title, content, config, provided_summary)
+
+    try:
+        response = await generate_content_async(
+            config,
+            prompt,
+            "summarize",
+            cache_check=is_json,
+            generation_config=json_config(build_fused_schema(config["lang_list"]))
+        )
+        return parse_fused_response(response.text, config, article_id)
+    except Exception as e:
+        logger.warning("generate_fused_summary_async error: %s", e)
+        return None
 
 
+def parse_fused_response(text, config, article_id=None):
+    """Parse the fused JSON response; see generate_fused_summary for the return shape"""
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        logger.warning("fused response JSON error: %s", e)
+        return None
+
+    if not isinstance(data, dict):
+        logger.warning("fused response is not a JSON object")
+        return None
+
+    if data.get("skip"):
+        logger.info("Gemini fused resp: SKIP -> failed to summarize article")
+        return {"skip": True}
 
+    category = str(data.get("category") or "").strip()
+    summary = str(data.get("ai_content") or "").strip()
+    if not (category and summary):
+        logger.warning("fused summary/category parsing fail")
+        return None
+
+    logger.debug("AI fused summary result: %r", summary[:500])
+
+    translations = {}
+    raw_translations = data.get("translations")
+    if not isinstance(raw_translations, dict):
+        raw_translations = {}
+    for lang in config["lang_list"]:
+        item = raw_translations.get(lang)
+        if not isinstance(item, dict):
+            logger.warning("fused '%s' translation missing", lang)
+            continue
+        lang_title = str(item.get("ai_title") or "").strip()
+        lang_content = str(item.get("ai_content") or "").strip()
+        if not (lang_title and lang_content):
+            logger.warning("fused '%s' translation malformed", lang)
+            continue
+        translations[lang] = {
+            "ai_title": clean_duplicate_parentheses(lang_title, article_id),
+            "ai_content": clean_duplicate_parentheses(lang_content, article_id)
+        }
 
+    return {
+        "category_ai": category,
+        "ai_content": summary,
+        "translations": translations
+    }
@@ -1,114 +1,287 @@
-import os
 import re
-from google import genai
+import json
+from concurrent.futures import ThreadPoolExecutor
 
-def clean_duplicate_parentheses(text, article_id=None):
-    """
-    Remove duplicate parentheses patterns from translated text.
-    1. ABC(ABC) → ABC (same content in parentheses)
-    2. (ABC(ABC)) → (ABC) (nested duplicates)
-    3. Keep only first occurrence of each unique parenthetical term
-    """
-    if not text:
-        return text
+from pipeline.gemini import get_api_key, generate_content, generate_content_async, has_fields, is_json, json_config
+from pipeline.batching import batching_enabled, estimate_tokens, get_batcher
+from pipeline.log import get_logger, log_context, submit_with_context
+
+DEFAULT_TRANSLATION_ATTEMPTS = 2  # rounds per article; each round retries only the languages that failed
 
-    # Log input
-    print(f"\n[{article_id}] [clean_duplicate_parentheses] Input: {text}")
-    original_text = text
+logger = get_logger("translate")
 
-    # Step 1: Remove nested duplicate parentheses like (SPD(SPD)) → (SPD)
-    # First, handle the pattern where the same text appears nested: (TEXT(TEXT))
-    nested_pattern = r'\((\w+)\(\1\)\)'
-    text = re.sub(nested_pattern, r'(\1)', text)
-    print(f"[{article_id}] [clean_duplicate_parentheses] After nested removal: {text}")
+_WORD_PATTERN = re.compile(r"\w+")
+_PAREN_PATTERN = re.compile(r"[()]")
 
-    # Step 2: Remove identical parentheses like "Iris Stalzer(Iris Stalzer)" → "Iris Stalzer"
-    # Look for cases where the same words appear just before and inside parentheses
-    # Match one or more words followed by parentheses containing the same text
-    def remove_identical_simple(text):
-        """Remove cases where text is immediately followed by itself in parentheses"""
-        # Pattern to match any text (excluding parentheses) followed by identical text in parentheses
-        # This handles names with special chars like "Elsässer", "Putin'in", etc.
-        pattern = r'([^\s()]+(?:\s+[^\s()]+)*)\s*\(\1\)'
 
-        def replace_match(match):
-            word = match.group(1)
-            print(f"[{article_id}] [clean_duplicate_parentheses] Found duplicate: {word}({word}) → {word}")
-            return word
+def _collapse_nested(text):
+    """(TEXT(TEXT)) → (TEXT) for a single word TEXT"""
+    out, emitted = [], 0
+    start = text.find("(")
+    while start != -1:
+        word = _WORD_PATTERN.match(text, start + 1)
+        if word and text.startswith("(" + word.group() + "))", word.end()):
+            out.append(text[emitted:word.end()] + ")")
+            emitted = word.end() + len(word.group()) + 3
+            start = text.find("(", emitted)
+        else:
+            start = text.find("(", word.end() if word else start + 1)
+    out.append(text[emitted:])
+    return "".join(out)
 
-        return re.sub(pattern, replace_match, text)
 
-    text = remove_identical_simple(text)
-    print(f"[{article_id}] [clean_duplicate_parentheses] After identical removal: {text}")
+def _collapse_identical(text):
+    """
+    TEXT(TEXT) → TEXT, where TEXT is one or more words right before the parenthesis
+    (whitespace in between is dropped). Only the words directly before each "("
+    can match, so every paren-free segment is compared once.
+    """
+    parens = [match.start() for match in _PAREN_PATTERN.finditer(text)]
+    out, emitted, segment_start = [], 0, 0
+    index = 0
+    while index < len(parens):
+        opening = parens[index]
+        if text[opening] == "(" and index + 1 < len(parens) and text[parens[index + 1]] == ")":
+            closing = parens[index + 1]
+            inner = text[opening + 1:closing]
+            group_end = segment_start + len(text[segment_start:opening].rstrip())
+            group_start = group_end - len(inner)
+            if (inner and not inner[0].isspace() and not inner[-1].isspace()
+                    and group_start >= segment_start and text.startswith(inner, group_start)):
+                out.append(text[emitted:group_end])
+                emitted = segment_start = closing + 1
+                index += 2
+                continue
+        segment_start = opening + 1
+        index += 1
+    out.append(text[emitted:])
+    return "".join(out)
 
-    # Step 3: Track and remove repeated parenthetical terms
-    seen_terms = set()
 
-    def track_duplicates(match):
-        term = match.group(1).strip().lower()
+def _drop_repeated(text):
+    """Keep only the first occurrence of each parenthetical term (case-insensitive)"""
+    seen_terms = set()
+    out, emitted = [], 0
+    start = text.find("(")
+    while start != -1:
+        end = text.find(")", start + 1)
+        if end == -1:
+            break
+        if end == start + 1:
+            start = text.find("(", end)
+            continue
+        term = text[start + 1:end].strip().lower()
         if term in seen_terms:
-            print(f"[{article_id}] [clean_duplicate_parentheses] Removing duplicate parenthetical: ({match.group(1)})")
-            return ''  # Remove duplicate parenthetical
-        seen_terms.add(term)
-        return match.group(0)  # Keep first occurrence
+            out.append(text[emitted:start])
+            emitted = end + 1
+        else:
+            seen_terms.add(term)
+        start = text.find("(", end + 1)
+    out.append(text[emitted:])
+    return "".join(out)
 
-    # Match any parenthetical content
-    parenthetical_pattern = r'\(([^\)]+)\)'
-    text = re.sub(parenthetical_pattern, track_duplicates, text)
 
-    # Log output
-    print(f"[{article_id}] [clean_duplicate_parentheses] Output: {text}")
-    if original_text != text:
-        print(f"[{article_id}] [clean_duplicate_parentheses] Changed: {original_text} → {text}")
+def clean_duplicate_parentheses(text, article_id=None):
+    """
+    Remove duplicate parentheses patterns from translated text.
+    1. (ABC(ABC)) → (ABC) (nested duplicates)
+    2. ABC(ABC) → ABC (same content in parentheses)
+    3. Keep only first occurrence of each unique parenthetical term
+    Each step is a linear scan over the parenthesis positions (no backtracking
+    regex), applied in this order because one step's output feeds the next.
+    """
+    if not text or "(" not in text:
+        return text
 
-    return text
+    cleaned = _drop_repeated(_collapse_identical(_collapse_nested(text)))
+    if cleaned != text:
+        logger.debug("clean_duplicate_parentheses: %r -> %r", text, cleaned)
+    return cleaned
 
 def translate_ai_summary(ai_title, ai_content, lang, config, article_id=None):
-    # Initialize Gemini client
-    api_key = config.get("api_key") or os.getenv("GEMINI_API_KEY")
+    # Cross-article micro-batching: one shared batcher per target language
+    if batching_enabled(config):
+        batcher = get_batcher(
+            f"translate-{lang}",
+            config,
+            lambda items: translate_batch(items, lang, config),
+            fallback=lambda item_id, item: translate_ai_summary(item[0], item[1], lang, {**config, "batch_size": 1}, item_id)
+        )
+        item_id = article_id or f"item-{id(ai_content)}"
+        tokens = estimate_tokens(ai_title) + estimate_tokens(ai_content)
+        return batcher.submit(item_id, (ai_title, ai_content), tokens).result()
+
+    # Check Gemini API key
+    api_key = get_api_key(config)
     if not api_key:
-        print(f"[{article_id}] ERROR: GEMINI_API_KEY is missing for translation to {lang}")
+        logger.error("GEMINI_API_KEY is missing for translation to %s", lang)
         return None
     
-    # Set up Gemini client (remove duplicate key to avoid warnings)
-    if "GOOGLE_API_KEY" in os.environ and os.environ["GOOGLE_API_KEY"] != api_key:
-        del os.environ["GOOGLE_API_KEY"]
-    os.environ["GOOGLE_API_KEY"] = api_key
-    client = genai.Client()
-    
     system_prompt = config["translation_prompt"](lang)
     user_prompt = f"Title: {ai_title}\nContent: {ai_content}"
     
     full_prompt = system_prompt + "\n\n" + user_prompt
 
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-lite",
-            contents=full_prompt
+        response = generate_content(
+            config,
+            full_prompt,
+            "translate",
+            cache_check=has_fields("Title:", "Content:"),
+            lang=lang
         )
         
-        result = response.text.strip()
-        print(f"\n[{article_id}] [{lang.upper()} translation result] {result}")
+        return parse_translation_text(response.text, lang, article_id)
+    except Exception as e:
+        logger.warning("translation to %s failed: %s", lang, e)
+    return None
 
-        if "Title:" in result and "Content:" in result:
-            title = result.split("Title:")[1].split("Content:")[0].strip()
-            content = result.split("Content:")[1].strip()
 
-            # Clean duplicate parentheses
-            title = clean_duplicate_parentheses(title, article_id)
-            content = clean_duplicate_parentheses(content, article_id)
+async def translate_ai_summary_async(ai_title, ai_content, lang, config, article_id=None):
+    """Async variant of translate_ai_summary using the shared client's aio surface"""
+    api_key = get_api_key(config)
+    if not api_key:
+        logger.error("GEMINI_API_KEY is missing for translation to %s", lang)
+        return None
 
-            return {
-                "ai_title": title,
-                "ai_content": content
-            }
-        else:
-            print(f"[{article_id}] '{lang}' translation result format error")
+    full_prompt = config["translation_prompt"](lang) + "\n\n" + f"Title: {ai_title}\nContent: {ai_content}"
+
+    try:
+        response = await generate_content_async(
+            config,
+            full_prompt,
+            "translate",
+            cache_check=has_fields("Title:", "Content:"),
+            lang=lang
+        )
+        return parse_translation_text(response.text, lang, article_id)
     except Exception as e:
-        print(f"[{article_id}] error on translation ({lang}): {e}")
+        logger.warning("translation to %s failed: %s", lang, e)
     return None
 
 
+def translate_languages(ai_title, ai_content, langs, config, article_id=None, on_result=None):
+    """
+    Translate into every language in langs in parallel, then retry only the failed
+    ones for up to translation_attempts rounds. on_result(lang, translation) is called
+    for each success as it arrives.
+    Returns ({lang: translation}, [languages that still failed]).
+    """
+    attempts = max(1, config.get("translation_attempts", DEFAULT_TRANSLATION_ATTEMPTS))
+    translations = {}
+    failed = list(langs)
+    for attempt in range(attempts):
+        if not failed:
+            break
+        if attempt:
+            logger.info("retrying translation: %s (attempt %d/%d)", failed, attempt + 1, attempts)
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            futures = {
+                lang: submit_with_context(executor, translate_ai_summary, ai_title, ai_content, lang, config,
+                                          article_id)
+                for lang in failed
+            }
+            for lang, future in futures.items():
+                result = future.result()
+                if result:
+                    translations[lang] = result
+                    if on_result:
+                        on_result(lang, result)
+        failed = [lang for lang in failed if lang not in translations]
+    return translations, failed
+
+
+def translation_status(langs, failed):
+    """Per-language status stored with the article: "ok", or "pending" until a later run fills it in"""
+    return {lang: "pending" if lang in failed else "ok" for lang in langs}
+
+
+def parse_translation_text(result, lang, article_id=None):
+    """Parse a "Title: / Content:" translation response (None on format error)"""
+    result = result.strip()
+    logger.debug("%s translation result: %r", lang, result)
 
+    if "Title:" in result and "Content:" in result:
+        title = result.split("Title:")[1].split("Content:")[0].strip()
+        content = result.split("Content:")[1].strip()
 
+        # Clean duplicate parentheses
+        title = clean_duplicate_parentheses(title, article_id)
+        content = clean_duplicate_parentheses(content, article_id)
+
+        return {
+            "ai_title": title,
+            "ai_content": content
+        }
+
+    logger.warning("'%s' translation result format error", lang)
+    return None
+
+def translate_batch(items, lang, config):
+    """
+    Translate several articles into one language in one Gemini call.
+    items: list of (article_id, (ai_title, ai_content)). Returns {article_id: translation};
+    articles whose entry is missing or malformed are left out so the batcher can re-queue them.
+    """
+    # Check Gemini API key
+    api_key = get_api_key(config)
+    if not api_key:
+        logger.error("GEMINI_API_KEY is missing for batch translation to %s", lang)
+        return {}
+
+    system_prompt = config["translation_prompt"](lang)
+    prompt = system_prompt + """
+Translate EACH item below separately and return a JSON array with one object per item.
+Each object must contain the item's exact "id", "ai_title" and "ai_content".
+The JSON schema replaces the "Return your response in this format" instruction above.
+""" + "\n".join(
+        f"\n=== Item ID: {item_id} ===\nTitle: {title}\nContent: {content}"
+        for item_id, (title, content) in items
+    )
+
+    schema = {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {
+                "id": {"type": "string"},
+                "ai_title": {"type": "string"},
+                "ai_content": {"type": "string"}
+            },
+            "required": ["id", "ai_title", "ai_content"]
+        }
+    }
+
+    try:
+        response = generate_content(
+            config,
+            prompt,
+            "translate",
+            cache_check=is_json,
+            generation_config=json_config(schema),
+            lang=lang
+        )
+        data = json.loads(response.text)
+    except Exception as e:
+        logger.warning("batch translation to %s (%d articles) failed: %s", lang, len(items), e)
+        return {}
+
+    requested = {item_id for item_id, _ in items}
+    results = {}
+    for entry in data if isinstance(data, list) else []:
+        if not isinstance(entry, dict) or entry.get("id") not in requested:
+            continue
+        item_id = entry["id"]
+        title = str(entry.get("ai_title") or "").strip()
+        content = str(entry.get("ai_content") or "").strip()
+        with log_context(article_id=item_id):
+            if not (title and content):
+                logger.warning("'%s' batch translation result format error", lang)
+                continue
+            results[item_id] = {
+                "ai_title": clean_duplicate_parentheses(title, item_id),
+                "ai_content": clean_duplicate_parentheses(content, item_id)
+            }
 
+    logger.info("translate_batch (%s): %d/%d articles parsed", lang, len(results), len(items))
+    return results
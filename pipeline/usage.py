@@ -0,0 +1,131 @@
+import json
+import math
+import os
+import threading
+from datetime import datetime, timezone
+
+from pipeline.log import get_logger
+
+# Token, cost and latency accounting for every Gemini call.
+# gemini.generate_content records one entry per logical call (retries and hedges
+# included in its wall time), keyed by stage, country and language. At the end of
+# a run the entries are aggregated into a JSON run report with p50/p95/p99
+# latencies and, optionally, into the country's info_doc stats document.
+
+DEFAULT_REPORT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "run_reports")
+# USD per 1M tokens (input, output); thinking tokens are billed as output
+MODEL_PRICES = {
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+}
+
+_records = []
+_records_lock = threading.Lock()
+_started_at = datetime.now(timezone.utc)
+summary_logger = get_logger("summary")
+
+
+def record_call(config, stage, model, seconds, response=None, error=None, lang=None):
+    """Store one Gemini call; cached responses carry no usage_metadata and cost nothing"""
+    usage = getattr(response, "usage_metadata", None)
+    entry = {
+        "country": (config or {}).get("country"),
+        "stage": stage,
+        "lang": lang,
+        "model": model,
+        "seconds": seconds,
+        "ok": error is None,
+        "cached": bool(getattr(response, "cached", False)),
+        "prompt_tokens": getattr(usage, "prompt_token_count", None) or 0,
+        "output_tokens": (getattr(usage, "candidates_token_count", None) or 0)
+                         + (getattr(usage, "thoughts_token_count", None) or 0),
+        "cached_tokens": getattr(usage, "cached_content_token_count", None) or 0,
+    }
+    with _records_lock:
+        _records.append(entry)
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def cost_usd(entry):
+    input_price, output_price = MODEL_PRICES.get(entry["model"], MODEL_PRICES["gemini-2.5-flash-lite"])
+    return (entry["prompt_tokens"] * input_price + entry["output_tokens"] * output_price) / 1_000_000
+
+
+def summarize(entries):
+    latencies = sorted(entry["seconds"] for entry in entries if not entry["cached"])
+    return {
+        "calls": len(entries),
+        "errors": sum(1 for entry in entries if not entry["ok"]),
+        "cache_hits": sum(1 for entry in entries if entry["cached"]),
+        "prompt_tokens": sum(entry["prompt_tokens"] for entry in entries),
+        "output_tokens": sum(entry["output_tokens"] for entry in entries),
+        "cached_tokens": sum(entry["cached_tokens"] for entry in entries),
+        "cost_usd": round(sum(cost_usd(entry) for entry in entries), 6),
+        "seconds_total": round(sum(entry["seconds"] for entry in entries), 3),
+        "latency_ms": {
+            name: None if value is None else round(value * 1000, 1)
+            for name, value in (("p50", percentile(latencies, 0.50)), ("p95", percentile(latencies, 0.95)),
+                                ("p99", percentile(latencies, 0.99)), ("max", latencies[-1] if latencies else None))
+        },
+    }
+
+
+def group(entries, *keys):
+    groups = {}
+    for entry in entries:
+        name = ":".join(str(entry[key]) for key in keys)
+        groups.setdefault(name, []).append(entry)
+    return {name: summarize(members) for name, members in sorted(groups.items())}
+
+
+def build_run_report(extra=None):
+    """Aggregate every recorded call by stage, country and language"""
+    with _records_lock:
+        entries = list(_records)
+    report = {
+        "started_at": _started_at.isoformat(),
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "totals": summarize(entries),
+        "stages": group(entries, "stage"),
+        "countries": group(entries, "country"),
+        "country_stages": group(entries, "country", "stage"),
+        "languages": group([entry for entry in entries if entry["lang"]], "lang"),
+    }
+    report.update(extra or {})
+    return report
+
+
+def write_run_report(config, extra=None, path=None):
+    """Write the run report as JSON (run_report_path / RUN_REPORT_PATH / run_reports/) and return it"""
+    report = build_run_report(extra)
+    path = path or config.get("run_report_path") or os.getenv("RUN_REPORT_PATH")
+    if not path:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(DEFAULT_REPORT_DIR, f"{str(config.get('country', 'run')).lower()}-{stamp}.json")
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        summary_logger.info("usage: run report written to %s", path)
+    except OSError as e:
+        summary_logger.warning("usage: run report write fail: %s", e)
+    return report
+
+
+def print_usage_summary(report=None):
+    report = report or build_run_report()
+    for stage, stats in report["stages"].items():
+        latency = stats["latency_ms"]
+        summary_logger.info("usage %s: calls=%d errors=%d cache_hits=%d tokens in/out=%d/%d cost=$%.4f "
+                            "p50/p95/p99=%s/%s/%sms", stage, stats['calls'], stats['errors'], stats['cache_hits'],
+                            stats['prompt_tokens'], stats['output_tokens'], stats['cost_usd'], latency['p50'],
+                            latency['p95'], latency['p99'])
+    totals = report["totals"]
+    summary_logger.info("usage total: calls=%d tokens in/out=%d/%d cost=$%.4f", totals['calls'],
+                        totals['prompt_tokens'], totals['output_tokens'], totals['cost_usd'])
@@ -1,16 +1,27 @@
-import requests
+import itertools
+import logging
+import math
+import threading
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import firebase_admin
-import os
-import re
-from firebase_admin import credentials, firestore
-from enum import Enum
 from datetime import datetime
-import importlib
-from google import genai
+from pipeline.gemini import get_api_key, generate_content
+from pipeline.firestore import filter_known_articles
+from pipeline.dedup import collapse_near_duplicates
+from pipeline.prerank import prerank
+from pipeline.crawl_state import conditional_headers, is_stale_page, mark_incomplete, observe_page
+from pipeline.journal import record, restored_selection
+from pipeline.resilience import RETRYABLE_STATUS_CODES, RetryableStatusError, call_with_resilience, http_timeout
+from pipeline.log import get_logger
 
 # Config-driven approach - no hardcoded values
+NEWS_API_POOL_SIZE = 4
+SELECTION_CHUNK_SIZE = 200  # candidates per selection prompt before switching to the tournament
+SELECTION_FAN_OUT = 8  # chunk selections in flight at once
+SELECTION_OVERSAMPLE = 2.0  # each chunk keeps this multiple of its share of the picks
+_news_session = None
+_news_session_lock = threading.Lock()
+logger = get_logger("util")
         
 
 
@@ -20,41 +31,29 @@ from google import genai
 
 
 def select_top_articles(articles, top_article_count, config):
-    print(f"\n**=== DEBUG: Starting article selection ===**")
-    print(f"**Total articles to choose from:** {len(articles)}")
-    print(f"**Target selection count:** {top_article_count}")
-    
-    # Initialize Gemini client
-    api_key = config.get("api_key") or os.getenv("GEMINI_API_KEY")
-    print(f"**API key exists:** {bool(api_key)}")
-    print(f"**API key length:** {len(api_key) if api_key else 0}")
-    
+    logger.info("selection: choosing %d of %d articles", top_article_count, len(articles))
+
+    # Check Gemini API key
+    api_key = get_api_key(config)
     if not api_key:
-        print("**ERROR: GEMINI_API_KEY is missing from config or environment!**")
+        logger.error("selection: GEMINI_API_KEY is missing from config or environment")
         return []
-    
-    # Set up Gemini client (remove duplicate key to avoid warnings)
-    if "GOOGLE_API_KEY" in os.environ and os.environ["GOOGLE_API_KEY"] != api_key:
-        del os.environ["GOOGLE_API_KEY"]
-    os.environ["GOOGLE_API_KEY"] = api_key
-    client = genai.Client()
-
-    print(f"\n**Available articles for selection:**")
-    for article in articles:
-        print(f"  - ID: {article['article_id']}, Title: {article.get('title', 'No title')}")
-    
+
+    if logger.isEnabledFor(logging.DEBUG):
+        for article in articles:
+            logger.debug("candidate id=%s title=%r", article['article_id'], article.get('title', 'No title'))
+
     # Check if top_prompt function exists
     if "top_prompt" not in config:
-        print("**ERROR: top_prompt function not found in config!**")
+        logger.error("selection: top_prompt function not found in config")
         return []
-    
+
     try:
         base_prompt = config["top_prompt"](top_article_count)
-        print(f"**Base prompt generated successfully, length:** {len(base_prompt)}")
     except Exception as e:
-        print(f"**ERROR: Failed to generate base prompt: {e}**")
+        logger.error("selection: failed to generate base prompt: %s", e)
         return []
-    
+
     prompt = base_prompt + "\n\nHere are the articles:\n\n" + \
         "\n".join([
             f"Article ID: {article['article_id']}\n"
@@ -62,121 +61,311 @@ def select_top_articles(articles, top_article_count, config):
             "---"
             for article in articles
         ]) + "\n\nReturn ONLY the article IDs of the selected articles, one per line."
-    
-    print(f"**Final prompt length:** {len(prompt)}")
-    print(f"**Final prompt preview (first 500 chars):**\n{prompt[:500]}...")
+    logger.debug("selection prompt: %d chars, preview %r", len(prompt), prompt[:500])
 
     try:
-        print(f"\n**Making API request to Gemini**")
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-lite",
-            contents=prompt
+        response = generate_content(
+            config,
+            prompt,
+            "select"
         )
-        
+
         ai_response = response.text.strip()
-        print(f"**Raw AI Response:** '{ai_response}'")
-        print(f"**AI Response length:** {len(ai_response)}")
-        print(f"**AI Response type:** {type(ai_response)}")
-        
+        logger.debug("selection response: %r", ai_response)
+
         if not ai_response:
-            print("**ERROR: AI returned empty response**")
+            logger.warning("selection: AI returned an empty response")
             return []
-        
+
         if ai_response.lower() == "none":
-            print("**ERROR: AI explicitly returned 'none'**")
+            logger.warning("selection: AI explicitly returned 'none'")
             return []
-        
-        print(f"\n**AI Response for article selection:**\n{ai_response}")
-        
+
         # Parse response
         content_lines = ai_response.split("\n")
-        print(f"**Split into {len(content_lines)} lines:**")
-        for i, line in enumerate(content_lines):
-            print(f"  Line {i+1}: '{line.strip()}'")
-        
         selected_articles = [article_id.strip() for article_id in content_lines if article_id.strip()][:top_article_count]
-        
-        print(f"**After filtering, {len(selected_articles)} articles selected:**")
-        for i, article_id in enumerate(selected_articles):
-            print(f"  {i+1}. '{article_id}'")
-        
+
         # Validate selected articles exist in original list
-        valid_ids = [article['article_id'] for article in articles]
-        print(f"**Valid article IDs:** {valid_ids}")
-        
+        valid_ids = {article['article_id'] for article in articles}
         validated_articles = []
         for article_id in selected_articles:
             if article_id in valid_ids:
                 validated_articles.append(article_id)
-                print(f"  ✓ '{article_id}' is valid")
             else:
-                print(f"  ✗ '{article_id}' is NOT in original list")
-        
-        print("\n**AI selected TOP article list (validated):**")
-        for idx, article_id in enumerate(validated_articles):
-            print(f"  {idx+1}. {article_id}")
+                logger.debug("selection: %r is not in the candidate list", article_id)
 
+        logger.info("selection: %d valid of %d returned IDs", len(validated_articles), len(selected_articles))
         return validated_articles
-                
+
     except Exception as e:
-        print(f"Gemini API error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("selection: Gemini API error: %s", e)
         return []
 
 
-def get_page_articles(url):
+def select_top_articles_tournament(articles, top_article_count, config):
+    """
+    Map-reduce selection for large pools: split the candidates into chunks of
+    selection_chunk_size, select from up to selection_fan_out chunks in parallel
+    (each keeps its share of the picks times selection_oversample), then select
+    the final top_article_count from the shard winners. Rounds repeat until the
+    winners fit in one chunk. When the oversampled picks alone exceed a chunk, the
+    last round's shards pick exactly their share and together form the result, so
+    no prompt holds more than selection_chunk_size candidates.
+    Returns [] when the shards return nothing (callers fall back to the local ranking).
+    """
+    chunk_size = config.get("selection_chunk_size", SELECTION_CHUNK_SIZE)
+    fan_out = config.get("selection_fan_out", SELECTION_FAN_OUT)
+    oversample = config.get("selection_oversample", SELECTION_OVERSAMPLE)
+
+    candidates = articles
+    round_number = 1
+    while len(candidates) > chunk_size:
+        # Oversampling no longer shrinks the pool: shards pick their exact share instead
+        last_round = len(candidates) <= math.ceil(top_article_count * oversample)
+        factor = 1 if last_round else oversample
+        chunks = [candidates[start:start + chunk_size] for start in range(0, len(candidates), chunk_size)]
+        picks = [max(1, math.ceil(top_article_count * len(chunk) / len(candidates) * factor)) for chunk in chunks]
+        logger.info("tournament round %d: %d candidates in %d chunks", round_number, len(candidates), len(chunks))
+
+        with ThreadPoolExecutor(max_workers=fan_out) as executor:
+            results = list(executor.map(lambda args: select_top_articles(*args, config), zip(chunks, picks)))
+
+        winner_ids = set()
+        for chunk, selected_ids in zip(chunks, results):
+            if not selected_ids:
+                logger.warning("tournament chunk of %d returned no picks, its candidates are dropped", len(chunk))
+            winner_ids.update(selected_ids)
+        if not winner_ids:
+            logger.warning("tournament round %d returned no picks", round_number)
+            return []
+        if last_round:
+            # Interleave the shards' ranked picks so the cap trims evenly across chunks
+            ranked = [article_id for picked in itertools.zip_longest(*results) for article_id in picked if article_id]
+            logger.info("tournament final: %d picks from %d shards", min(top_article_count, len(ranked)), len(chunks))
+            return list(dict.fromkeys(ranked))[:top_article_count]
+        winners = [article for article in candidates if article["article_id"] in winner_ids]
+        if len(winners) >= len(candidates):
+            logger.warning("tournament round %d did not reduce the pool (%d candidates)", round_number,
+                           len(candidates))
+            return []
+        candidates = winners
+        round_number += 1
+
+    logger.info("tournament final: selecting %d from %d shard winners", top_article_count, len(candidates))
+    selected_ids = select_top_articles(candidates, min(top_article_count, len(candidates)), config)
+    if not selected_ids and candidates is not articles:
+        logger.warning("tournament final round failed, keeping shard winners in feed order")
+        selected_ids = [article["article_id"] for article in candidates[:top_article_count]]
+    return selected_ids
+
+
+def get_news_session(config=None):
+    """Shared requests.Session with a connection pool and gzip for the news API"""
+    import requests
+    import requests.adapters
+
+    global _news_session
+    with _news_session_lock:
+        if _news_session is not None:
+            return _news_session
+        pool_size = (config or {}).get("news_api_pool_size", NEWS_API_POOL_SIZE)
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({"Accept-Encoding": "gzip, deflate"})
+        _news_session = session
+        return _news_session
+
+def fetch_page(url, config=None, headers=None):
+    """
+    Fetch one news API page over the pooled session.
+    Returns (data, response headers, stats); data is None on 304 Not Modified and
+    stats holds the page latency and decoded / on-the-wire byte counts.
+    """
+    def fetch():
+        start = time.perf_counter()
+        response = get_news_session(config).get(url, headers=headers, timeout=http_timeout(config))
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            raise RetryableStatusError(response.status_code, "from news API")
+        body = response.content
+        stats = {
+            "seconds": time.perf_counter() - start,
+            "bytes": len(body),
+            "wire_bytes": int(response.headers.get("Content-Length") or len(body)),
+            "encoding": response.headers.get("Content-Encoding", "identity")
+        }
+        if response.status_code == 304:
+            return None, response.headers, stats
+        return response.json(), response.headers, stats
+
+    return call_with_resilience(fetch, "news_api", config, hedge=True)
+
+def get_page_articles(url, config=None):
     """fetching single page"""
-    response = requests.get(url)
-    data = response.json()
+    data, _, _ = fetch_page(url, config)
     if data["status"] == "success":
         return data.get("results", []), data.get("nextPage")
     return [], None
 
-def fetch_articles(api_url, api_key, config):
-    all_articles = []
-    next_page = None
+def iter_article_pages(api_url, config=None, crawl_state=None):
+    """
+    Yield each page's articles as soon as it arrives, while the next page is already
+    being fetched in the background. Stops at the end of the feed, at the crawl
+    watermark, or at the first failing page after page 1.
+    """
     page_count = 0
-    
-    # Get first page
-    first_page_articles, next_page = get_page_articles(api_url)
-    all_articles.extend(first_page_articles)
-    page_count += 1
-    print(f"\n**Page {page_count} article number:**", len(first_page_articles))
-    
-    # Get remaining pages if nextPage exists
-    while next_page:
-        page_url = f"{api_url}&page={next_page}"
-        page_articles, next_page = get_page_articles(page_url)
+    totals = {"seconds": 0.0, "bytes": 0, "wire_bytes": 0}
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="news-prefetch") as prefetcher:
+        # First page is conditional when the previous run recorded validators
+        future = prefetcher.submit(fetch_page, api_url, config, conditional_headers(crawl_state))
+        while future is not None:
+            try:
+                data, response_headers, stats = future.result()
+            except Exception as e:
+                if page_count == 0:
+                    raise
+                # Keep what we already have instead of failing the whole run, but the
+                # unfetched pages must be crawled again next run
+                logger.warning("page %d fetch failed, stopping pagination: %s", page_count + 1, e)
+                mark_incomplete(crawl_state, f"page {page_count + 1} fetch failed")
+                break
+
+            if data is None:
+                logger.info("news API: 304 Not Modified, nothing new since the last run")
+                break
+
+            page_count += 1
+            if data["status"] == "success":
+                page_articles, next_page = data.get("results", []), data.get("nextPage")
+            else:
+                page_articles, next_page = [], None
+                logger.warning("page %d: news API status %s, stopping pagination", page_count, data.get("status"))
+                mark_incomplete(crawl_state, f"page {page_count} status {data.get('status')}")
+            observe_page(page_articles, crawl_state, response_headers, first_page=page_count == 1)
+
+            # Prefetch page N+1 before handing page N downstream
+            future = None
+            if next_page and is_stale_page(page_articles, crawl_state):
+                logger.info("page %d reached the crawl watermark, stopping pagination", page_count)
+            elif next_page:
+                future = prefetcher.submit(fetch_page, f"{api_url}&page={next_page}", config)
+
+            for key in totals:
+                totals[key] += stats[key]
+            logger.info("page %d: %d articles (%.0f ms, %d bytes, %d on the wire, %s)", page_count,
+                        len(page_articles), stats['seconds'] * 1000, stats['bytes'], stats['wire_bytes'],
+                        stats['encoding'])
+            yield page_articles
+
+    logger.info("pages fetched: %d in %.2fs (fetch time %.2fs, %d bytes, %d on the wire)", page_count,
+                time.perf_counter() - started, totals['seconds'], totals['bytes'], totals['wire_bytes'])
+
+def fetch_all_articles(api_url, config=None, crawl_state=None):
+    """Collect every streamed page into one list (selection needs the whole pool)"""
+    all_articles = []
+    for page_articles in iter_article_pages(api_url, config, crawl_state):
         all_articles.extend(page_articles)
-        page_count += 1
-        print(f"**Page {page_count} article number:**", len(page_articles))
-    
-    print(f"\n**Total pages fetched:** {page_count}")
-    print("**AI target article numbers (description included):**", len(all_articles))
-    
+    logger.info("articles fetched for selection: %d", len(all_articles))
+    return all_articles
+
+def select_articles(all_articles, api_key, config):
+    """Apply select_all or AI top selection to the fetched articles"""
+    # Drop already-published articles before any LLM work
+    all_articles = filter_known_articles(all_articles, config)
+
     if config["select_all"]:
         selected_articles = all_articles
-        print("\n**ALL articles selected for translation.**")
+        logger.info("select_all: all %d articles selected for translation", len(all_articles))
     else:
+        # One representative per wire story keeps the selection prompt short
+        candidates = collapse_near_duplicates(all_articles, config)
+        if not candidates:
+            # Nothing new since the last run: no ranking and no selection call
+            logger.info("no new articles to select")
+            return []
         top_article_count = max(1, round(len(all_articles) * config["top_article_ratio"]))
-        selected_article_ids = select_top_articles(all_articles, top_article_count, {**config, "api_key": api_key})
-        selected_articles = [article for article in all_articles if article["article_id"] in selected_article_ids]
-        print("\n**Selected articles for translation:**")
+        top_article_count = min(top_article_count, len(candidates))
+        # Local TF-IDF ranking caps what the selector sees and backs it up when it fails
+        candidates, ranked = prerank(candidates, top_article_count, config)
+        selection_config = {**config, "api_key": api_key}
+        if len(candidates) > config.get("selection_chunk_size", SELECTION_CHUNK_SIZE):
+            selected_article_ids = select_top_articles_tournament(candidates, top_article_count, selection_config)
+        else:
+            selected_article_ids = select_top_articles(candidates, top_article_count, selection_config)
+        if not selected_article_ids:
+            logger.warning("AI selection returned nothing, using the local ranking for the top %d", top_article_count)
+            selected_article_ids = [article["article_id"] for article in ranked[:top_article_count]]
+            candidates = ranked
+        selected_articles = [article for article in candidates if article["article_id"] in selected_article_ids]
+        logger.info("selected %d articles for translation", len(selected_articles))
         for article in selected_articles:
-            print(f"  - {article['title']} (ID: {article['article_id']})")
-
-    print("\n**Translating and storing to Firebase...**")
-    # Force reload the news_pipeline module to get latest changes
-    from . import news_pipeline
-    importlib.reload(news_pipeline)
-    from .news_pipeline import process_article
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = [executor.submit(process_article, article, config, api_key) for article in selected_articles]
+            logger.debug("selected id=%s title=%r", article['article_id'], article['title'])
+    return selected_articles
+
+def fetch_articles(api_url, api_key, config, crawl_state=None, on_article=None):
+    """
+    Fetch, select and process one country's articles; returns (processed_articles, total_available).
+    on_article(article) is called from the worker thread as soon as each article is processed
+    (used for streaming persistence).
+    """
+    # Imported here: news_pipeline imports this module at load time
+    from pipeline.news_pipeline import process_article
+
+    def forward(future):
+        if not future.exception() and future.result() is not None:
+            on_article(future.result())
+
+    def submit(article):
+        future = executor.submit(process_article, article, config, api_key)
+        if on_article:
+            future.add_done_callback(forward)
+        return future
+
+    # With micro-batching enabled, keep at least a full batch of articles in flight
+    max_workers = max(5, config.get("batch_size", 1))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # A resumed run continues with the journaled selection instead of fetching again
+        resumed = restored_selection(crawl_state)
+        if resumed:
+            selected_articles, total_available = resumed
+            futures = [submit(article) for article in selected_articles]
+        elif config["select_all"]:
+            # No selection step: hand each page to processing as soon as it arrives
+            logger.info("select_all: streaming pages into processing")
+            total_available = 0
+            seen_ids = set()
+            futures = []
+            for page_articles in iter_article_pages(api_url, config, crawl_state):
+                total_available += len(page_articles)
+                new_articles = []
+                for article in filter_known_articles(page_articles, config):
+                    if article["article_id"] in seen_ids:
+                        continue
+                    seen_ids.add(article["article_id"])
+                    new_articles.append(article)
+                # Journal before processing starts mutating the article dicts
+                record("selected", articles=new_articles)
+                futures += [submit(article) for article in new_articles]
+            record("fetched", total_available=total_available,
+                   crawl_next=crawl_state["next"] if crawl_state else None)
+        else:
+            all_articles = fetch_all_articles(api_url, config, crawl_state)
+            total_available = len(all_articles)
+            selected_articles = select_articles(all_articles, api_key, config)
+            record("fetched", total_available=total_available,
+                   crawl_next=crawl_state["next"] if crawl_state else None)
+            record("selected", articles=selected_articles)
+
+            logger.info("translating and storing %d articles", len(selected_articles))
+            futures = [submit(article) for article in selected_articles]
+
         processed_articles = [future.result() for future in as_completed(futures)]
         processed_articles = [article for article in processed_articles if article is not None]
 
-    return processed_articles, len(all_articles)
+    return processed_articles, total_available
 
 def save_to_firestore(data):
     collection_name = "saudi_articles"